@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: plain dict documents vs. CompactDocuments for Verträge and Kunden.
+
+Usage (from the repository root):
+    python backend/benchmark_storage.py            # 100,000 records per collection
+    python backend/benchmark_storage.py 1000000
+"""
+
+import asyncio
+import gc
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from server import (  # noqa: E402
+    CompactDocuments,
+    Kunde,
+    KUNDE_INTERNED_FIELDS,
+    SimpleCollection,
+    Vertrag,
+    VERTRAG_INTERNED_FIELDS,
+    generate_kunde_id,
+    prepare_for_mongo,
+)
+
+GESELLSCHAFTEN = ["Allianz Versicherung AG", "Alte Leipziger", "Dialog Versicherung AG", "Itzehoer Versicherung"]
+SPARTEN = ["KFZ", "Haftpflicht", "Hausrat", "Leben", "Unfall"]
+ZAHLUNGSWEISEN = ["monatlich", "vierteljährlich", "halbjährlich", "jährlich"]
+ORTE = [("10115", "Berlin"), ("20095", "Hamburg"), ("80331", "München"), ("50667", "Köln")]
+
+
+def make_vertrag(i: int) -> dict:
+    beginn = date(2015, 1, 1) + timedelta(days=i % 3000)
+    vertrag = Vertrag(
+        vertragsnummer=f"V-{i:08d}",
+        kunde_id=f"kunde-{i % 50000}",
+        gesellschaft=random.choice(GESELLSCHAFTEN),
+        kfz_kennzeichen=f"B-AB {i % 9999}" if i % 3 == 0 else None,
+        produkt_sparte=random.choice(SPARTEN),
+        tarif="Komfort",
+        zahlungsweise=random.choice(ZAHLUNGSWEISEN),
+        beitrag_brutto=round(random.uniform(5, 500), 2),
+        beitrag_netto=round(random.uniform(5, 400), 2),
+        vertragsstatus="aktiv",
+        beginn=beginn,
+        ablauf=beginn + timedelta(days=365 * 3),
+    )
+    # Build fresh strings per record, as JSON parsing or form input would
+    doc = prepare_for_mongo(vertrag.dict())
+    return {key: ("".join(value) if isinstance(value, str) else value) for key, value in doc.items()}
+
+
+def make_kunde(i: int) -> dict:
+    plz, ort = random.choice(ORTE)
+    kunde = Kunde(
+        vorname=f"Vorname{i % 997}",
+        name=f"Name{i}",
+        kunde_id=generate_kunde_id(),
+        strasse=f"Hauptstraße {i % 200}",
+        plz=plz,
+        ort=ort,
+        status="aktiv",
+        anrede="Herr" if i % 2 else "Frau",
+    )
+    doc = prepare_for_mongo(kunde.dict())
+    return {key: ("".join(value) if isinstance(value, str) else value) for key, value in doc.items()}
+
+
+def measure(factory, count: int, compact_fields=None):
+    gc.collect()
+    tracemalloc.start()
+    collection = SimpleCollection()
+    if compact_fields is not None:
+        collection.use_compact_storage(compact_fields)
+
+    async def load():
+        for i in range(count):
+            await collection.insert_one(factory(i))
+
+    random.seed(42)
+    asyncio.run(load())
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    scanned = sum(1 for _ in collection._docs.values())
+    scan_seconds = time.perf_counter() - start
+    assert scanned == count
+    return current, scan_seconds
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(f"{count:,} records per collection\n")
+    print(f"{'collection':<12} {'storage':<10} {'memory':>12} {'per record':>12} {'full scan':>10}")
+    for name, factory, fields in (
+        ("vertraege", make_vertrag, VERTRAG_INTERNED_FIELDS),
+        ("kunden", make_kunde, KUNDE_INTERNED_FIELDS),
+    ):
+        results = {}
+        for storage, compact_fields in (("dict", None), ("compact", fields)):
+            memory, scan_seconds = measure(factory, count, compact_fields)
+            results[storage] = memory
+            print(f"{name:<12} {storage:<10} {memory / 1e6:>10.1f}MB {memory / count:>11.0f}B {scan_seconds:>9.2f}s")
+        print(f"{'':<12} {'saving':<10} {1 - results['compact'] / results['dict']:>11.0%}\n")
+
+
+if __name__ == "__main__":
+    assert CompactDocuments  # imported for discoverability of the storage under test
+    main()
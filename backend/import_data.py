@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Import a customer or contract portfolio from CSV/NDJSON into the durable store.
+
+Usage (from the repository root, with the server stopped):
+    DB_DATA_DIR=/var/lib/deg-mvp python backend/import_data.py kunden kunden.csv
+    DB_DATA_DIR=/var/lib/deg-mvp python backend/import_data.py vertraege vertraege.ndjson --batch-size 5000
+
+Import customers first: contract rows reference them via `kunde_id` (customer id or
+customer number). Without DB_DATA_DIR (or DB_ENGINE=sqlite) nothing is persisted,
+so the run only validates the file.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from server import IMPORT_BATCH_SIZE, db, guess_import_format, import_portfolio  # noqa: E402
+
+
+def print_progress(summary):
+    print(
+        f"\r{summary['processed']:>10,} rows  {summary['created']:>10,} created  {summary['failed']:>8,} failed",
+        end="",
+        file=sys.stderr,
+        flush=True,
+    )
+
+
+async def run(args) -> dict:
+    await db.open()
+    try:
+        with open(args.path, "rb") as source:
+            return await import_portfolio(
+                args.collection,
+                source,
+                args.format,
+                args.batch_size,
+                progress=print_progress,
+            )
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Kunden or Verträge from CSV/NDJSON")
+    parser.add_argument("collection", choices=["kunden", "vertraege"])
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    try:
+        args.format = guess_import_format(args.path, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if not os.environ.get("DB_DATA_DIR") and os.environ.get("DB_ENGINE", "memory") == "memory":
+        print("DB_DATA_DIR is not set: validating only, nothing will be stored", file=sys.stderr)
+    summary = asyncio.run(run(args))
+    print(file=sys.stderr)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
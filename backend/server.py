@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form, Request, Body
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import re
@@ -6,14 +7,38 @@ import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, BinaryIO, Protocol, AsyncIterator
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from enum import Enum
+from collections import OrderedDict, deque
+from itertools import count, islice
+import heapq
+import math
+import operator
+from bisect import bisect_left, bisect_right, insort
 import random
 import base64
 from typing import Union
 import tempfile
+import functools
+from contextlib import asynccontextmanager
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import io
+import inspect
+import zlib
+import hashlib
+import binascii
+import mimetypes
+import unicodedata
+import json
+import asyncio
+import array
+import mmap
+import sys
 try:
     import aiofiles  # type: ignore
 except Exception:
@@ -49,150 +74,3471 @@ api_router = APIRouter(prefix="/api")
 # ------------------------------
 
 class SimpleResult:
-    def __init__(self, matched_count: int = 0, modified_count: int = 0, deleted_count: int = 0):
+    def __init__(self, matched_count: int = 0, modified_count: int = 0, deleted_count: int = 0, inserted_count: int = 0):
         self.matched_count = matched_count
         self.modified_count = modified_count
         self.deleted_count = deleted_count
+        self.inserted_count = inserted_count
+
+
+class DuplicateKeyError(Exception):
+    """Raised when a write would violate a unique index (mirrors pymongo's error)."""
+
+
+class BulkWriteError(Exception):
+    """
+    Raised by insert_many/bulk_write when operations failed (mirrors pymongo's error).
+    `details` holds `writeErrors` ([{"index", "op", "errmsg"}]) and the counts of the
+    operations that did succeed.
+    """
+
+    def __init__(self, details: Dict[str, Any]):
+        super().__init__(f"batch op errors occurred ({len(details['writeErrors'])})")
+        self.details = details
+
+
+def _resolve_path(doc, parts):
+    """Walk a pre-split dot path like ["persoenliche_daten", "geburtsdatum"]; missing -> None."""
+    current = doc
+    for part in parts:
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        else:
+            return None
+    return current
+
+
+def _copy_nested(value):
+    """Copy of the dicts and lists in a value; scalars are shared."""
+    if isinstance(value, dict):
+        return {key: _copy_nested(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_nested(item) for item in value]
+    return value
+
+
+_RANGE_OPERATORS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+
+def _compile_regex(condition):
+    """Return the bound `search` of the compiled `$regex`, or None if the pattern is invalid."""
+    pattern = condition.get("$regex", "")
+    options = condition.get("$options", "")
+    flags = re.IGNORECASE if "i" in str(options) else 0
+    try:
+        return re.compile(pattern, flags).search
+    except re.error:
+        return None
+
+
+def _compile_condition(condition):
+    """
+    Compile one field condition into a `value -> bool` closure. Every operator in the
+    dict has to hold ($regex with its $options, $exists, $ne, $in, $gt, $gte, $lt,
+    $lte), so `{"$ne": None, "$gte": x}` checks both; a dict without any of them is
+    compared for equality. Operands are copied (`$in` values into a tuple): compiled
+    closures are cached, and must not change when the caller mutates its filter.
+    """
+    if isinstance(condition, dict):
+        tests = []
+        if "$regex" in condition:
+            search = _compile_regex(condition)
+            if search is None:
+                # Fallback to substring check if regex fails
+                needle = str(condition.get("$regex", "")).lower()
+                tests.append(lambda value: needle in (str(value) if value is not None else "").lower())
+            else:
+                def regex_test(value):
+                    if value.__class__ is not str:
+                        value = str(value) if value is not None else ""
+                    return search(value) is not None
+                tests.append(regex_test)
+        if "$exists" in condition:
+            exists = bool(condition["$exists"])
+            tests.append(lambda value: (value is not None) == exists)
+        if "$ne" in condition:
+            unexpected = _copy_nested(condition["$ne"])
+            tests.append(lambda value: value != unexpected)
+        if "$in" in condition and isinstance(condition["$in"], list):
+            choices = tuple(_copy_nested(choice) for choice in condition["$in"])
+            tests.append(lambda value: value in choices)
+        comparisons = [(_RANGE_OPERATORS[op], condition[op]) for op in _RANGE_OPERATORS if op in condition]
+        if comparisons:
+            def range_test(value):
+                if value is None:
+                    return False
+                try:
+                    return all(compare(value, bound) for compare, bound in comparisons)
+                except TypeError:
+                    # e.g. comparing an ISO date string with a number
+                    return False
+            tests.append(range_test)
+        if len(tests) == 1:
+            return tests[0]
+        if tests:
+            return lambda value: all(test(value) for test in tests)
+    condition = _copy_nested(condition)
+    return lambda value: value == condition
+
+
+def _compile_field(key: str, expected):
+    """Compile `key: expected` into a `doc -> bool` closure with the dot path pre-split."""
+    parts = key.split(".")
+    if len(parts) == 1:
+        if not isinstance(expected, dict):
+            expected = _copy_nested(expected)
+            return lambda doc: doc.get(key) == expected
+        search = _compile_regex(expected) if "$regex" in expected and expected.keys() <= {"$regex", "$options"} else None
+        if search is not None:
+            # Hot path for /kunden/search: fused field lookup + regex, no intermediate call
+            def field_regex(doc):
+                value = doc.get(key)
+                if value.__class__ is not str:
+                    value = str(value) if value is not None else ""
+                return search(value) is not None
+            return field_regex
+        test = _compile_condition(expected)
+        return lambda doc: test(doc.get(key))
+    test = _compile_condition(expected)
+    # Nested field support like "persoenliche_daten.geburtsdatum"
+    return lambda doc: test(_resolve_path(doc, parts))
+
+
+def _compile_filter_uncached(filter_dict):
+    predicates = []
+    for key, expected in filter_dict.items():
+        if key == "$or" and isinstance(expected, list):
+            branches = [_compile_filter_uncached(sub or {}) for sub in expected]
+            predicates.append(lambda doc, branches=branches: any(branch(doc) for branch in branches))
+        elif key == "$and" and isinstance(expected, list):
+            branches = [_compile_filter_uncached(sub or {}) for sub in expected]
+            predicates.append(lambda doc, branches=branches: all(branch(doc) for branch in branches))
+        else:
+            predicates.append(_compile_field(key, expected))
+    if not predicates:
+        return lambda doc: True
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def match_all(doc):
+        for predicate in predicates:
+            if not predicate(doc):
+                return False
+        return True
+    return match_all
+
+
+def _freeze(value):
+    """Hashable, type-tagged form of a filter used as the compiled-filter cache key."""
+    if isinstance(value, dict):
+        return ("dict", tuple((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("list", tuple(_freeze(v) for v in value))
+    hash(value)
+    return (type(value).__name__, value)
+
+
+_FILTER_CACHE_SIZE = 256
+_filter_cache: "OrderedDict[Any, Any]" = OrderedDict()
+
+
+def compile_filter(filter_dict):
+    """
+    Compile a filter dict into a `doc -> bool` predicate.
+    Compiled filters are kept in a small LRU so repeated searches skip compilation.
+    """
+    if not filter_dict:
+        return lambda doc: True
+    try:
+        key = _freeze(filter_dict)
+    except TypeError:
+        return _compile_filter_uncached(filter_dict)
+    predicate = _filter_cache.get(key)
+    if predicate is not None:
+        _filter_cache.move_to_end(key)
+        return predicate
+    predicate = _compile_filter_uncached(filter_dict)
+    _filter_cache[key] = predicate
+    if len(_filter_cache) > _FILTER_CACHE_SIZE:
+        _filter_cache.popitem(last=False)
+    return predicate
+
+
+def _project_include(doc, tree):
+    projected = {}
+    for key, sub in tree.items():
+        if key not in doc:
+            continue
+        value = doc[key]
+        if sub is True:
+            projected[key] = value
+        elif isinstance(value, dict):
+            projected[key] = _project_include(value, sub)
+        elif isinstance(value, list):
+            projected[key] = [_project_include(v, sub) for v in value if isinstance(v, dict)]
+    return projected
+
+
+def _project_exclude(doc, tree):
+    projected = dict(doc)
+    for key, sub in tree.items():
+        if key not in projected:
+            continue
+        if sub is True:
+            del projected[key]
+        elif isinstance(projected[key], dict):
+            projected[key] = _project_exclude(projected[key], sub)
+        elif isinstance(projected[key], list):
+            projected[key] = [_project_exclude(v, sub) if isinstance(v, dict) else v for v in projected[key]]
+    return projected
+
+
+def compile_projection(projection):
+    """
+    Compile a Mongo projection (`{"field": 1, "a.b": 1}`, `{"file_content": 0}` or a
+    list of field names) into a `doc -> new dict` function, or None for "whole
+    document". Like Mongo, include and exclude can't be mixed except for `_id`, which
+    is included by default. Projected documents are always copies.
+    """
+    if not projection:
+        return None
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    exclude_id = "_id" in projection and not projection["_id"]
+    fields = {field: bool(flag) for field, flag in projection.items() if field != "_id"}
+    modes = set(fields.values())
+    if len(modes) > 1:
+        raise ValueError("Cannot mix inclusion and exclusion in a projection")
+    include = modes == {True} or (not fields and not exclude_id)
+    if include and not exclude_id:
+        fields["_id"] = True
+    elif not include and exclude_id:
+        fields["_id"] = False
+
+    tree: Dict[str, Any] = {}
+    for field in fields:
+        node = tree
+        *parents, leaf = field.split(".")
+        for part in parents:
+            child = node.get(part)
+            if child is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = True
+    if include:
+        return lambda doc: _project_include(doc, tree)
+    return lambda doc: _project_exclude(doc, tree)
+
+
+class HashIndex:
+    """
+    Secondary hash index over one (optionally dotted) field.
+    Maps field value -> insertion-ordered set of document sequence numbers.
+    Missing fields are indexed under None, matching how `_matches` treats them.
+    """
+
+    def __init__(self, field: str, unique: bool = False):
+        self.field = field
+        self.unique = unique
+        self._parts = field.split(".")
+        self._buckets: Dict[Any, Dict[int, None]] = {}
+        # Documents whose value is unhashable (lists, dicts) cannot be bucketed and
+        # are returned as candidates for every lookup.
+        self._unhashable: Dict[int, None] = {}
+
+    def value_of(self, doc):
+        return _resolve_path(doc, self._parts)
+
+    def check_unique(self, doc, seq: Optional[int] = None):
+        if not self.unique:
+            return
+        value = self.value_of(doc)
+        if value is None:
+            return
+        try:
+            bucket = self._buckets.get(value)
+        except TypeError:
+            return
+        if bucket and any(other != seq for other in bucket):
+            raise DuplicateKeyError(f"Duplicate value for unique index '{self.field}': {value!r}")
+
+    def add(self, seq: int, doc):
+        value = self.value_of(doc)
+        try:
+            self._buckets.setdefault(value, {})[seq] = None
+        except TypeError:
+            self._unhashable[seq] = None
+
+    def load(self, seqs, values):
+        """Bulk-add parallel seq/value lists, e.g. straight from a snapshot column."""
+        buckets = self._buckets
+        for seq, value in zip(seqs, values):
+            try:
+                bucket = buckets.get(value)
+            except TypeError:
+                self._unhashable[seq] = None
+                continue
+            if bucket is None:
+                buckets[value] = {seq: None}
+            else:
+                bucket[seq] = None
+
+    def remove(self, seq: int, doc):
+        value = self.value_of(doc)
+        try:
+            bucket = self._buckets.get(value)
+        except TypeError:
+            self._unhashable.pop(seq, None)
+            return
+        if bucket is not None:
+            bucket.pop(seq, None)
+            if not bucket:
+                del self._buckets[value]
+
+    def lookup(self, value):
+        """Return sorted candidate sequence numbers for `value`, or None if the index can't answer."""
+        try:
+            bucket = self._buckets.get(value, {})
+        except TypeError:
+            return None
+        if self._unhashable:
+            return sorted({**bucket, **self._unhashable})
+        return sorted(bucket)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self._buckets.values()) + len(self._unhashable)
+
+    def buckets_where(self, predicate):
+        """Return the buckets whose key satisfies `predicate` (a scan over distinct values only)."""
+        return [bucket for value, bucket in self._buckets.items() if predicate(value)]
+
+    def estimate(self, condition):
+        """
+        Estimate the candidate count an index scan would produce for `condition`
+        (an equality value or an operator dict), or None if this index can't serve it.
+        """
+        buckets = self._buckets_for(condition)
+        if buckets is None:
+            return None
+        return sum(len(b) for b in buckets) + len(self._unhashable)
+
+    def scan(self, condition):
+        """Return sorted candidate sequence numbers for `condition` (see `estimate`)."""
+        buckets = self._buckets_for(condition)
+        if buckets is None:
+            return None
+        seqs = dict(self._unhashable)
+        for bucket in buckets:
+            seqs.update(bucket)
+        return sorted(seqs)
+
+    @property
+    def exact(self):
+        """Whether index results are exact, i.e. the predicate needn't be re-checked."""
+        return not self._unhashable
+
+    def _buckets_for(self, condition):
+        if not isinstance(condition, dict):
+            try:
+                bucket = self._buckets.get(condition)
+            except TypeError:
+                return None
+            return [bucket] if bucket else []
+        if len(condition) == 1 and isinstance(condition.get("$in"), list):
+            buckets = []
+            for value in condition["$in"]:
+                try:
+                    bucket = self._buckets.get(value)
+                except TypeError:
+                    return None
+                if bucket:
+                    buckets.append(bucket)
+            return buckets
+        if set(condition) == {"$exists"}:
+            if condition["$exists"]:
+                return [b for value, b in self._buckets.items() if value is not None]
+            return [self._buckets[None]] if None in self._buckets else []
+        if set(condition) <= {"$regex", "$options"} and str(condition.get("$regex", "")).startswith("^"):
+            # Anchored regexes are evaluated once per distinct value instead of once per document
+            return self.buckets_where(_compile_condition(condition))
+        return None
+
+
+class SortedIndex:
+    """
+    Ordered secondary index over one field, for range queries on the ISO date strings
+    written by `prepare_for_mongo` (`beginn`, `ablauf`, `created_at`, ...).
+    Keeps (value, seq) pairs in a sorted array searched with bisect. Only string values
+    are ordered; other non-None values are kept aside and returned as candidates for
+    every lookup. Writes are buffered and merged into the array on the next lookup.
+    """
+
+    # Up to this many buffered changes are applied one by one; more trigger a re-sort
+    _MERGE_THRESHOLD = 64
+
+    def __init__(self, field: str, unique: bool = False):
+        self.field = field
+        self.unique = unique
+        self._parts = field.split(".")
+        self._entries: List[Any] = []
+        self._pending = set()
+        self._removed = set()
+        self._unordered: Dict[int, None] = {}
+
+    def value_of(self, doc):
+        return _resolve_path(doc, self._parts)
+
+    def __len__(self):
+        self._flush()
+        return len(self._entries) + len(self._unordered)
+
+    def check_unique(self, doc, seq: Optional[int] = None):
+        if not self.unique:
+            return
+        value = self.value_of(doc)
+        if not isinstance(value, str):
+            return
+        if any(other != seq for other in self._range_seqs([(value, True, value, True)])):
+            raise DuplicateKeyError(f"Duplicate value for unique index '{self.field}': {value!r}")
+
+    def add(self, seq: int, doc):
+        value = self.value_of(doc)
+        if value is None:
+            return
+        if not isinstance(value, str):
+            self._unordered[seq] = None
+            return
+        entry = (value, seq)
+        if entry in self._removed:
+            self._removed.discard(entry)
+        else:
+            self._pending.add(entry)
+
+    def load(self, seqs, values):
+        """Bulk-add parallel seq/value lists with a single sort instead of buffered inserts."""
+        self._flush()
+        ordered = []
+        for position, value in enumerate(values):
+            if value.__class__ is str:
+                ordered.append(position)
+            elif value is not None:
+                self._unordered[seqs[position]] = None
+        # Sorting positions by a string key is much cheaper than comparing tuples;
+        # the sort is stable and seqs ascend, so ties stay in (value, seq) order.
+        ordered.sort(key=values.__getitem__)
+        self._entries.extend((values[position], seqs[position]) for position in ordered)
+        self._entries.sort()
+
+    def remove(self, seq: int, doc):
+        value = self.value_of(doc)
+        if value is None:
+            return
+        if not isinstance(value, str):
+            self._unordered.pop(seq, None)
+            return
+        entry = (value, seq)
+        if entry in self._pending:
+            self._pending.discard(entry)
+        else:
+            self._removed.add(entry)
+
+    def _flush(self):
+        if self._removed:
+            if len(self._removed) <= self._MERGE_THRESHOLD:
+                for entry in self._removed:
+                    position = bisect_left(self._entries, entry)
+                    if position < len(self._entries) and self._entries[position] == entry:
+                        del self._entries[position]
+            else:
+                removed = self._removed
+                self._entries = [entry for entry in self._entries if entry not in removed]
+            self._removed = set()
+        if self._pending:
+            if len(self._pending) <= self._MERGE_THRESHOLD:
+                for entry in self._pending:
+                    insort(self._entries, entry)
+            else:
+                # Timsort merges the already sorted array with the sorted batch in ~linear time
+                self._entries.extend(sorted(self._pending))
+                self._entries.sort()
+            self._pending = set()
+
+    def _ranges(self, condition):
+        """
+        Translate `condition` into [(low, low_inclusive, high, high_inclusive), ...] over
+        string values (None bound = open), or None if this index can't serve it.
+        """
+        if not isinstance(condition, dict):
+            if not isinstance(condition, str):
+                return None
+            return [(condition, True, condition, True)]
+        if len(condition) == 1 and isinstance(condition.get("$in"), list):
+            if not all(isinstance(v, str) for v in condition["$in"]):
+                return None
+            return [(v, True, v, True) for v in condition["$in"]]
+        # Only strings are indexed, so "not None" / "exists" add nothing to a range
+        implied = [op for op, bound in condition.items() if (op, bound) in (("$ne", None), ("$exists", True))]
+        if implied and len(implied) < len(condition):
+            condition = {op: bound for op, bound in condition.items() if op not in implied}
+        if not condition or not set(condition) <= set(_RANGE_OPERATORS):
+            return None
+        if not all(isinstance(bound, str) for bound in condition.values()):
+            return None
+        low, low_inclusive, high, high_inclusive = None, True, None, True
+        if "$gte" in condition:
+            low = condition["$gte"]
+        if "$gt" in condition and (low is None or condition["$gt"] >= low):
+            low, low_inclusive = condition["$gt"], False
+        if "$lte" in condition:
+            high = condition["$lte"]
+        if "$lt" in condition and (high is None or condition["$lt"] <= high):
+            high, high_inclusive = condition["$lt"], False
+        return [(low, low_inclusive, high, high_inclusive)]
+
+    def _span(self, low, low_inclusive, high, high_inclusive):
+        entries = self._entries
+        # (value,) sorts before every (value, seq); (value, inf) after every one
+        if low is None:
+            start = 0
+        elif low_inclusive:
+            start = bisect_left(entries, (low,))
+        else:
+            start = bisect_right(entries, (low, float("inf")))
+        if high is None:
+            stop = len(entries)
+        elif high_inclusive:
+            stop = bisect_right(entries, (high, float("inf")))
+        else:
+            stop = bisect_left(entries, (high,))
+        return start, max(start, stop)
+
+    def _range_seqs(self, ranges):
+        self._flush()
+        seqs = dict(self._unordered)
+        for bounds in ranges:
+            start, stop = self._span(*bounds)
+            for _, seq in self._entries[start:stop]:
+                seqs[seq] = None
+        return seqs
+
+    def estimate(self, condition):
+        ranges = self._ranges(condition)
+        if ranges is None:
+            return None
+        self._flush()
+        return sum(stop - start for start, stop in (self._span(*b) for b in ranges)) + len(self._unordered)
+
+    def scan(self, condition):
+        ranges = self._ranges(condition)
+        if ranges is None:
+            return None
+        return sorted(self._range_seqs(ranges))
+
+    def span_size(self, bounds) -> int:
+        self._flush()
+        start, stop = self._span(*bounds)
+        return stop - start
+
+    def ordered(self, bounds, reverse: bool = False):
+        """
+        Yield the seqs within `bounds` in value order (descending when `reverse`),
+        starting at the bisected position, so reading the first k costs O(log n + k).
+        """
+        self._flush()
+        start, stop = self._span(*bounds)
+        entries = self._entries
+        positions = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+        return (entries[position][1] for position in positions)
+
+    @property
+    def exact(self):
+        return not self._unordered
+
+
+_GERMAN_FOLDS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_WORD_PARTS = re.compile(r"[^\W_]+")
+
+
+def normalize_search_text(text) -> str:
+    """Fold text for search: casefold, ä/ö/ü/ß -> ae/oe/ue/ss, other diacritics dropped ("Müller" -> "mueller")."""
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFC", text).casefold().translate(_GERMAN_FOLDS)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def search_terms(text) -> List[str]:
+    """
+    Split a search query into normalized terms, one per word; separators inside a word
+    are dropped ("Hans-Peter Mü" -> ["hanspeter", "mue"], "12-345" -> ["12345"]).
+    """
+    terms = ("".join(_WORD_PARTS.findall(word)) for word in normalize_search_text(text).split())
+    return [term for term in terms if term]
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_tokens(word: str) -> Tuple[str, ...]:
+    # Cached per word: names, streets, places and house numbers repeat a lot
+    parts = _WORD_PARTS.findall(normalize_search_text(word))
+    if len(parts) > 1:
+        parts.append("".join(parts))
+    return tuple(parts)
+
+
+def search_tokens(text: str) -> List[str]:
+    """
+    Index tokens for one field value: the normalized word parts plus, for words with
+    separators, the joined form, so "12-345-678" is also found as "12345678" and
+    "Hans-Peter" as "hanspeter".
+    """
+    tokens = []
+    for word in text.split():
+        tokens.extend(_word_tokens(word))
+    return tokens
+
+
+def text_tokens(doc, fields) -> set:
+    """All index tokens of a document's text fields."""
+    tokens = set()
+    for field in fields:
+        value = doc.get(field)
+        if value is not None:
+            tokens.update(search_tokens(value if isinstance(value, str) else str(value)))
+    return tokens
+
+
+def _contains(seqs, seq: int) -> bool:
+    """Membership test on a sorted seq array."""
+    if not seqs:
+        return False
+    position = bisect_left(seqs, seq)
+    return position < len(seqs) and seqs[position] == seq
+
+
+class SortedKeys:
+    """
+    Sorted view of the keys of a live dict, for prefix lookups via bisect. New keys are
+    buffered and merged on the next lookup; keys deleted from the dict stay until more
+    than half the view is stale, then it is rebuilt.
+    """
+
+    # Up to this many new keys are inserted one by one; more trigger a re-sort
+    _MERGE_THRESHOLD = 64
+
+    def __init__(self, live: dict):
+        self._live = live
+        self._sorted: List[str] = []
+        self._new: set = set()
+        self._stale = 0
+
+    def added(self, key: str):
+        self._new.add(key)
+
+    def removed(self, key: str):
+        if key in self._new:
+            self._new.discard(key)
+        else:
+            self._stale += 1
+
+    def _keys(self) -> List[str]:
+        if self._stale > len(self._sorted) // 2:
+            self._sorted = sorted(self._live)
+            self._new.clear()
+            self._stale = 0
+        elif self._new:
+            if len(self._new) <= self._MERGE_THRESHOLD:
+                for key in self._new:
+                    position = bisect_left(self._sorted, key)
+                    if position == len(self._sorted) or self._sorted[position] != key:
+                        self._sorted.insert(position, key)
+            else:
+                self._sorted = sorted(set(self._sorted).union(self._new))
+            self._new.clear()
+        return self._sorted
+
+    def prefixed(self, prefix: str):
+        """Iterate the live keys starting with `prefix` in order (`prefix` itself first)."""
+        keys = self._keys()
+        live = self._live
+        for position in range(bisect_left(keys, prefix), len(keys)):
+            key = keys[position]
+            if not key.startswith(prefix):
+                break
+            if key in live:
+                yield key
+
+
+def key_trigrams(key: str) -> set:
+    """The distinct three-character substrings of `key` (none for shorter keys)."""
+    return {key[i:i + 3] for i in range(len(key) - 2)}
+
+
+class KeyTrigrams:
+    """
+    Trigram postings over the keys of a live dict, for substring lookups: every added key
+    gets an id, and each of its trigrams lists the ids in an array (4 bytes per posting).
+    A lookup scans the shortest posting list of the needle's trigrams and checks the
+    candidates, so it touches only keys sharing the needle's rarest trigram. Needles of
+    one or two characters have no trigram and walk every key. Deleted keys stay until
+    more than half the ids are stale, then the postings are rebuilt.
+    """
+
+    def __init__(self, live: dict):
+        self._live = live
+        self._keys: List[str] = []
+        self._postings: Dict[str, array.array] = {}
+        self._stale = 0
+
+    def added(self, key: str):
+        key_id = len(self._keys)
+        self._keys.append(key)
+        postings = self._postings
+        for gram in key_trigrams(key):
+            bucket = postings.get(gram)
+            if bucket is None:
+                bucket = postings[gram] = array.array("I")
+            bucket.append(key_id)
+
+    def removed(self, key: str):
+        self._stale += 1
+
+    def containing(self, needle: str):
+        """Iterate the live keys that contain `needle`."""
+        if self._stale > len(self._keys) // 2:
+            self._keys, self._postings, self._stale = [], {}, 0
+            for key in self._live:
+                self.added(key)
+        live = self._live
+        if len(needle) < 3:
+            return (key for key in live if needle in key)
+        shortest = None
+        for gram in key_trigrams(needle):
+            bucket = self._postings.get(gram)
+            if bucket is None:
+                return iter(())
+            if shortest is None or len(bucket) < len(shortest):
+                shortest = bucket
+        keys = self._keys
+        # A key removed and added again has two ids; the set drops the duplicate
+        return iter({keys[key_id] for key_id in shortest if needle in keys[key_id] and keys[key_id] in live})
+
+
+class TextIndex:
+    """
+    Inverted index over several text fields for as-you-type search (`text_search`).
+    Maps normalized token -> sorted array of sequence numbers (8 bytes per posting,
+    kept sorted with bisect); a sorted vocabulary turns every query term into a prefix
+    range. A query matches documents that have, for every term, a token starting with it.
+    """
+
+    # Prefix terms expanding to at most this many tokens are verified via the postings
+    _POSTINGS_CHECK_LIMIT = 64
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._postings: Dict[str, array.array] = {}
+        self._vocab = SortedKeys(self._postings)
+
+    def tokens_of(self, doc) -> set:
+        return text_tokens(doc, self.fields)
+
+    def _add_tokens(self, seq: int, tokens):
+        postings = self._postings
+        for token in tokens:
+            bucket = postings.get(token)
+            if bucket is None:
+                postings[token] = array.array("q", (seq,))
+                self._vocab.added(token)
+            elif bucket[-1] < seq:
+                bucket.append(seq)
+            else:
+                # Re-added by an update
+                position = bisect_left(bucket, seq)
+                if position == len(bucket) or bucket[position] != seq:
+                    bucket.insert(position, seq)
+
+    def add(self, seq: int, doc):
+        self._add_tokens(seq, self.tokens_of(doc))
+
+    def load(self, seqs, values):
+        """Bulk-add one field's column, e.g. straight from a snapshot."""
+        for seq, value in zip(seqs, values):
+            if value is not None:
+                self._add_tokens(seq, search_tokens(value if isinstance(value, str) else str(value)))
+
+    def remove(self, seq: int, doc):
+        postings = self._postings
+        for token in self.tokens_of(doc):
+            bucket = postings.get(token)
+            if bucket is None:
+                continue
+            position = bisect_left(bucket, seq)
+            if position < len(bucket) and bucket[position] == seq:
+                bucket.pop(position)
+            if not bucket:
+                del postings[token]
+                self._vocab.removed(token)
+
+    def expand(self, term: str, budget: Optional[int] = None) -> Tuple[List[str], int, bool]:
+        """
+        Live tokens starting with `term` (the exact token first) and their total posting
+        count. Once the count exceeds `budget` and enough tokens for a postings check are
+        collected, the walk stops early and the result is marked truncated.
+        """
+        postings = self._postings
+        tokens = []
+        size = 0
+        for token in self._vocab.prefixed(term):
+            tokens.append(token)
+            size += len(postings[token])
+            if budget is not None and size > budget and len(tokens) > self._POSTINGS_CHECK_LIMIT:
+                return tokens, size, True
+        return tokens, size, False
+
+    def search(self, query: str, docs, limit: int) -> List[int]:
+        """
+        Sequence numbers of up to `limit` documents matching every term of `query`.
+        The term with the fewest postings drives the scan (its exact token first), the
+        others are checked per candidate; results are ranked by exact-token matches.
+        """
+        terms = list(dict.fromkeys(search_terms(query)))
+        if not terms or limit <= 0:
+            return []
+        postings = self._postings
+        expansions = []
+        driver = None
+        for i, term in enumerate(terms):
+            expansion = self.expand(term, None if driver is None else expansions[driver][1])
+            expansions.append(expansion)
+            if not expansion[2] and (driver is None or expansion[1] < expansions[driver][1]):
+                driver = i
+        driver_tokens, driver_size, _ = expansions[driver]
+        if driver_size == 0:
+            return []
+        driver_term = terms[driver]
+        others = [
+            (terms[i], None if truncated or len(tokens) > self._POSTINGS_CHECK_LIMIT else tokens)
+            for i, (tokens, _, truncated) in enumerate(expansions)
+            if i != driver
+        ]
+
+        scored = []
+        seen = set()
+        for token in driver_tokens:
+            for seq in postings[token]:
+                if seq in seen:
+                    continue
+                seen.add(seq)
+                score = self._score(seq, others, docs)
+                if score is None:
+                    continue
+                scored.append((-(score + (2 if token == driver_term else 1)), len(scored), seq))
+                if len(scored) >= limit:
+                    break
+            if len(scored) >= limit:
+                break
+        scored.sort()
+        return [seq for _, _, seq in scored]
+
+    def _score(self, seq: int, others, docs) -> Optional[int]:
+        """
+        2 per exact token, 1 per prefix match for the non-driving terms; None if one misses.
+        Terms with few prefix tokens are checked in the postings, others against the document.
+        """
+        postings = self._postings
+        score = 0
+        doc_tokens = None
+        for term, tokens in others:
+            if _contains(postings.get(term), seq):
+                score += 2
+                continue
+            if tokens is not None:
+                if not any(_contains(postings[token], seq) for token in tokens):
+                    return None
+            else:
+                if doc_tokens is None:
+                    doc = docs.get(seq)
+                    doc_tokens = self.tokens_of(doc) if doc is not None else ()
+                if not any(token.startswith(term) for token in doc_tokens):
+                    return None
+            score += 1
+        return score
+
+
+def lookup_key(value) -> str:
+    """Normalized key for lookup indexes: search-folded, separators dropped ("B-AB 123" -> "bab123")."""
+    return "".join(_WORD_PARTS.findall(normalize_search_text(value)))
+
+
+class LookupIndex:
+    """
+    Pre-joined reverse index: `lookup_key` of `field` -> counts of the documents' `target`
+    values (e.g. normalized Kennzeichen -> kunde_ids of the contracts carrying it), so
+    "which customers have a contract matching X" needs no document reads. Keys are kept
+    in SortedKeys for prefix lookups and in KeyTrigrams for substring lookups.
+    """
+
+    def __init__(self, field: str, target: str):
+        self.field = field
+        self.target = target
+        self._targets: Dict[str, Dict[Any, int]] = {}
+        self._keys = SortedKeys(self._targets)
+        self._trigrams = KeyTrigrams(self._targets)
+
+    def _add_pair(self, value, target):
+        if value is None or target is None:
+            return
+        key = lookup_key(value)
+        if not key:
+            return
+        counts = self._targets.get(key)
+        if counts is None:
+            counts = self._targets[key] = {}
+            self._keys.added(key)
+            self._trigrams.added(key)
+        counts[target] = counts.get(target, 0) + 1
+
+    def add(self, seq: int, doc):
+        self._add_pair(doc.get(self.field), doc.get(self.target))
+
+    def load(self, values, targets):
+        """Bulk-add parallel field/target columns, e.g. straight from a snapshot."""
+        for value, target in zip(values, targets):
+            self._add_pair(value, target)
+
+    def remove(self, seq: int, doc):
+        value, target = doc.get(self.field), doc.get(self.target)
+        if value is None or target is None:
+            return
+        key = lookup_key(value)
+        counts = self._targets.get(key)
+        if counts is None or target not in counts:
+            return
+        if counts[target] > 1:
+            counts[target] -= 1
+            return
+        del counts[target]
+        if not counts:
+            del self._targets[key]
+            self._keys.removed(key)
+            self._trigrams.removed(key)
+
+    def lookup(self, term, match: str = "prefix") -> set:
+        """
+        Target values whose key equals (`exact`), starts with (`prefix`) or contains
+        (`contains`, via the trigram postings) the normalized `term`.
+        """
+        needle = lookup_key(term)
+        if not needle:
+            return set()
+        if match == "exact":
+            keys = [needle] if needle in self._targets else []
+        elif match == "prefix":
+            keys = self._keys.prefixed(needle)
+        elif match == "contains":
+            keys = self._trigrams.containing(needle)
+        else:
+            raise ValueError(f"Unsupported lookup match: {match!r}")
+        targets = set()
+        for key in keys:
+            targets.update(self._targets[key])
+        return targets
+
+
+def _sort_value(value):
+    """Order values like Mongo does: None/missing first, then numbers, strings, everything else."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (4, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, value)
+
+
+class _MixedSortKey:
+    """Sort key for specs that mix ascending and descending fields (strings can't be negated)."""
+
+    __slots__ = ("values", "directions")
+
+    def __init__(self, values, directions):
+        self.values = values
+        self.directions = directions
+
+    def __lt__(self, other):
+        for mine, theirs, direction in zip(self.values, other.values, self.directions):
+            if mine != theirs:
+                return (mine < theirs) if direction != -1 else (theirs < mine)
+        return False
+
+
+def _sort_key(spec):
+    """
+    Build a key function for a sort spec [(field, direction), ...].
+    Returns (key, reverse) so uniform-direction sorts can use plain tuple keys.
+    """
+    paths = [field.split(".") for field, _ in spec]
+    directions = [-1 if direction == -1 else 1 for _, direction in spec]
+    if len(paths) == 1:
+        parts = paths[0]
+        if len(parts) == 1:
+            field = parts[0]
+            return (lambda d: _sort_value(d.get(field))), directions[0] == -1
+        return (lambda d: _sort_value(_resolve_path(d, parts))), directions[0] == -1
+    if len(set(directions)) == 1:
+        return (lambda d: tuple(_sort_value(_resolve_path(d, p)) for p in paths)), directions[0] == -1
+    return (lambda d: _MixedSortKey([_sort_value(_resolve_path(d, p)) for p in paths], directions)), False
+
+
+class QueryPlan:
+    """
+    Access path for one filter: the stage used to produce candidates and the residual
+    predicates that still have to be checked against each candidate document.
+    """
+
+    def __init__(self, stage: str, seqs=None, field: Optional[str] = None, residual=None, branches=None):
+        self.stage = stage  # "COLLSCAN", "IXSCAN", "OR" or "SORTED_IXSCAN"
+        self.seqs = seqs
+        self.field = field
+        self.residual = residual if residual is not None else {}
+        self.branches = branches or []
+
+    def describe(self):
+        description = {"stage": self.stage}
+        if self.field:
+            description["index"] = self.field
+        if self.seqs is not None:
+            description["candidates"] = len(self.seqs)
+        if self.branches:
+            description["branches"] = [branch.describe() for branch in self.branches]
+        description["residual"] = sorted(self.residual)
+        return description
 
 
 class SimpleQuery:
-    def __init__(self, data_list):
-        self._data = list(data_list)
+    """
+    Lazy cursor, shaped like Motor's. `find()` only records the filter; matching runs when
+    the query is consumed, and skip/limit are applied while scanning so the scan stops
+    after skip + limit matches. The cursor is consumed synchronously inside `to_list`,
+    so no writes can interleave with a running scan.
+    """
+
+    def __init__(self, data_list=None, collection=None, filter_dict=None, projection=None):
+        # data_list wraps already materialized results (e.g. aggregate output)
+        self._data = list(data_list) if data_list is not None else None
+        self._collection = collection
+        self._filter = filter_dict or {}
+        self._projection = compile_projection(projection)
+        self._skip = 0
+        self._limit = None
+        self._sort = None
+        self._plan = None
+        self._scanned = 0
+        self._returned = 0
+
+    def __await__(self):
+        # find() returns the query directly (like Motor's cursor); older call sites
+        # still `await` it, which simply yields the query itself.
+        yield from ()
+        return self
+
+    def explain(self):
+        """Describe the access path chosen for this query and how many documents it touched."""
+        if self._plan is None and self._collection is not None:
+            self._execute()
+        return {
+            "plan": self._plan.describe() if self._plan else {"stage": "COLLSCAN"},
+            "scanned": self._scanned,
+            "returned": self._returned,
+        }
+
+    def skip(self, n: int):
+        self._skip = max(int(n or 0), 0)
+        return self
+
+    def limit(self, n: int):
+        # Like Mongo, a limit of 0 means "no limit" and a negative one counts as its absolute value
+        self._limit = abs(int(n)) if n else None
+        return self
+
+    def sort(self, key_or_list, direction: int = 1):
+        """Accept `sort("field", -1)` or Motor's `sort([("name", 1), ("vorname", 1)])`."""
+        if isinstance(key_or_list, (list, tuple)):
+            self._sort = [(field, dir_) for field, dir_ in key_or_list]
+        else:
+            self._sort = [(key_or_list, direction)]
+        return self
+
+    def _iter_matches(self):
+        if self._collection is None:
+            for doc in self._data:
+                self._scanned += 1
+                yield doc
+            return
+        self._plan = self._collection._plan(self._filter)
+        matches = compile_filter(self._plan.residual) if self._plan.residual else None
+        for doc in self._collection._candidate_docs(self._plan):
+            self._scanned += 1
+            if matches is None or matches(doc):
+                yield doc
+
+    def _iter_sorted(self, plan, seqs):
+        """
+        Yield matches already in sort order by walking the ordered index on the first
+        sort key; ties on that key are sorted by the remaining keys as they complete.
+        """
+        self._plan = plan
+        matches = compile_filter(plan.residual)
+        docs = self._collection._docs
+        if len(self._sort) == 1:
+            for seq in seqs:
+                self._scanned += 1
+                doc = docs.get(seq)
+                if doc is not None and matches(doc):
+                    yield doc
+            return
+        key, reverse = _sort_key(self._sort)
+        parts = plan.field.split(".")
+        group, group_value = [], None
+        for seq in seqs:
+            self._scanned += 1
+            doc = docs.get(seq)
+            if doc is None or not matches(doc):
+                continue
+            value = _resolve_path(doc, parts)
+            if group and value != group_value:
+                yield from sorted(group, key=key, reverse=reverse)
+                group = []
+            group_value = value
+            group.append(doc)
+        yield from sorted(group, key=key, reverse=reverse)
+
+    def _execute(self, length=None):
+        self._scanned = 0
+        end = None if self._limit is None else self._skip + self._limit
+        if length is not None:
+            end = self._skip + length if end is None else min(end, self._skip + length)
+        sorted_plan = None
+        if self._sort and self._collection is not None:
+            sorted_plan = self._collection._plan_sorted(self._filter, self._sort)
+        if sorted_plan is not None:
+            # Index order is sort order: skip/limit stop the walk early (keyset pagination)
+            matches = self._iter_sorted(*sorted_plan)
+        elif self._sort:
+            matches = self._iter_matches()
+            key, reverse = _sort_key(self._sort)
+            if end is not None:
+                # Bounded top-k selection: O(n log k) instead of sorting every match
+                select = heapq.nlargest if reverse else heapq.nsmallest
+                matches = iter(select(end, matches, key=key))
+            else:
+                matches = iter(sorted(matches, key=key, reverse=reverse))
+        else:
+            matches = self._iter_matches()
+        results = list(islice(matches, self._skip, end))
+        self._returned = len(results)
+        # Projection runs last so sorting and filtering can still use excluded fields
+        if self._projection is not None:
+            results = [self._projection(doc) for doc in results]
+        return results
+
+    async def to_list(self, length=None):
+        return self._execute(length)
+
+
+def split_update(update_dict) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Split an update document into (fields to set, fields to remove). `$set` and `$unset`
+    work on top-level keys (a dotted key is one key); a document without operators is
+    merged into the stored one. Other `$` operators raise ValueError instead of ending up
+    as literal keys.
+    """
+    operators = [key for key in update_dict if isinstance(key, str) and key.startswith("$")]
+    if not operators:
+        return update_dict, []
+    unsupported = [key for key in update_dict if key not in ("$set", "$unset")]
+    if unsupported:
+        raise ValueError(f"Unsupported update operator: {unsupported[0]}")
+    changes = update_dict.get("$set", {})
+    removed = update_dict.get("$unset", {})
+    if not isinstance(changes, dict) or not isinstance(removed, dict):
+        raise ValueError("$set and $unset take a document")
+    return changes, list(removed)
+
+
+class CompactDocuments:
+    """
+    Compact, schema-aware storage for `SimpleCollection._docs` (used for `kunden` and
+    `vertraege`). Each document is kept as a tuple `(shape_id, value, ...)` where the
+    shape is the document's key tuple, registered once per distinct layout, so field
+    names aren't repeated per record and absent fields need no placeholder. Values of
+    repetitive fields (`gesellschaft`, `zahlungsweise`, ...) are interned so every record
+    shares one string object. Documents are rebuilt as fresh dicts on every access.
+    """
+
+    def __init__(self, interned_fields=()):
+        self._records: Dict[int, tuple] = {}
+        self._shapes: List[tuple] = []
+        self._shape_ids: Dict[tuple, int] = {}
+        self._interned = frozenset(interned_fields)
+
+    def _pack(self, doc) -> tuple:
+        shape = tuple(doc)
+        shape_id = self._shape_ids.get(shape)
+        if shape_id is None:
+            shape_id = self._shape_ids[shape] = len(self._shapes)
+            self._shapes.append(tuple(sys.intern(key) for key in shape))
+        interned = self._interned
+        if not interned:
+            return (shape_id, *doc.values())
+        return (shape_id, *(
+            sys.intern(value) if value.__class__ is str and key in interned else value
+            for key, value in doc.items()
+        ))
+
+    def _unpack(self, record) -> dict:
+        return dict(zip(self._shapes[record[0]], islice(record, 1, None)))
+
+    def get(self, seq, default=None):
+        record = self._records.get(seq)
+        return self._unpack(record) if record is not None else default
+
+    def __getitem__(self, seq):
+        return self._unpack(self._records[seq])
+
+    def __setitem__(self, seq, doc):
+        self._records[seq] = self._pack(doc)
+
+    def __delitem__(self, seq):
+        del self._records[seq]
+
+    def pop(self, seq, default=None):
+        record = self._records.pop(seq, None)
+        return self._unpack(record) if record is not None else default
+
+    def __contains__(self, seq):
+        return seq in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def items(self):
+        unpack = self._unpack
+        for seq, record in self._records.items():
+            yield seq, unpack(record)
+
+    def values(self):
+        unpack = self._unpack
+        for record in self._records.values():
+            yield unpack(record)
+
+    def copy(self) -> "CompactDocuments":
+        # Records are immutable tuples and shapes are append-only, so a shallow copy is a snapshot
+        clone = CompactDocuments.__new__(CompactDocuments)
+        clone._records = dict(self._records)
+        clone._shapes = self._shapes
+        clone._shape_ids = self._shape_ids
+        clone._interned = self._interned
+        return clone
+
+
+class SimpleCollection:
+    def __init__(self):
+        # Documents keyed by an internal, monotonically increasing sequence number.
+        # dict preserves insertion order, so iteration order matches the old list.
+        self._docs: Dict[int, dict] = {}
+        self._next_seq = 0
+        self._indexes: Dict[str, Any] = {}
+        # Set by DurableStore when DB_DATA_DIR enables durable mode
+        self._wal: Optional["WriteAheadLog"] = None
+        # Interned fields when compact storage is enabled (see use_compact_storage)
+        self._compact_fields: Optional[tuple] = None
+        self._text_index: Optional[TextIndex] = None
+        self._lookup_indexes: Dict[str, LookupIndex] = {}
+        # Incremented on every change, so derived caches (e.g. the VU matcher) can tell they're stale
+        self.version = 0
+
+    def use_compact_storage(self, interned_fields=()):
+        """Switch `_docs` to CompactDocuments, interning the given fields' string values."""
+        compact = CompactDocuments(interned_fields)
+        for seq, d in self._docs.items():
+            compact[seq] = d
+        self._docs = compact
+        self._compact_fields = tuple(interned_fields)
+
+    def _empty_docs(self):
+        if self._compact_fields is not None:
+            return CompactDocuments(self._compact_fields)
+        return {}
+
+    def create_index(self, field: str, unique: bool = False, ordered: bool = False):
+        """
+        Declare a secondary index on `field` and build it from existing documents.
+        Hash indexes serve equality lookups; `ordered=True` builds a sorted index that
+        also serves `$gt`/`$gte`/`$lt`/`$lte` range scans.
+        """
+        index = SortedIndex(field, unique=unique) if ordered else HashIndex(field, unique=unique)
+        for seq, d in self._docs.items():
+            index.check_unique(d)
+            index.add(seq, d)
+        self._indexes[field] = index
+        return field
+
+    def create_text_index(self, fields):
+        """Declare the collection's full-text index over `fields` (see `text_search`)."""
+        index = TextIndex(fields)
+        for seq, d in self._docs.items():
+            index.add(seq, d)
+        self._text_index = index
+
+    async def text_search(self, query: str, limit: int = 20, projection=None):
+        """
+        Documents whose text index fields contain, for every term of `query`, a word
+        starting with it (German-folded, case-insensitive), best matches first.
+        """
+        if self._text_index is None:
+            raise ValueError("Collection has no text index")
+        docs = self._docs
+        results = [docs[seq] for seq in self._text_index.search(query, docs, limit)]
+        project = compile_projection(projection)
+        return [project(doc) for doc in results] if project is not None else results
+
+    def create_lookup_index(self, field: str, target: str):
+        """Declare a LookupIndex from the normalized `field` to `target` values (see `lookup`)."""
+        index = LookupIndex(field, target)
+        for seq, d in self._docs.items():
+            index.add(seq, d)
+        self._lookup_indexes[field] = index
+
+    async def lookup(self, field: str, term, match: str = "prefix") -> set:
+        """Target values of the documents whose `field` matches `term` (see LookupIndex.lookup)."""
+        index = self._lookup_indexes.get(field)
+        if index is None:
+            raise ValueError(f"No lookup index on '{field}'")
+        return index.lookup(term, match)
+
+    def _index_add(self, seq: int, doc):
+        for index in self._indexes.values():
+            index.add(seq, doc)
+        if self._text_index is not None:
+            self._text_index.add(seq, doc)
+        for index in self._lookup_indexes.values():
+            index.add(seq, doc)
+
+    def _index_remove(self, seq: int, doc):
+        for index in self._indexes.values():
+            index.remove(seq, doc)
+        if self._text_index is not None:
+            self._text_index.remove(seq, doc)
+        for index in self._lookup_indexes.values():
+            index.remove(seq, doc)
+
+    def _check_unique(self, doc, seq: Optional[int] = None):
+        for index in self._indexes.values():
+            index.check_unique(doc, seq)
+
+    def _plan(self, filter_dict):
+        """
+        Pick the most selective index for `filter_dict`.
+        Equality, `$in`, `$exists` and `^`-anchored `$regex` on an indexed field can be served
+        from its hash index; an `$or` can be served when every branch can. Everything else
+        stays in the residual filter, which is only evaluated against the candidate set.
+        """
+        filter_dict = filter_dict or {}
+        best = None
+        best_size = None
+        for key, expected in filter_dict.items():
+            if key == "$or" and isinstance(expected, list):
+                branches = [self._plan(sub) for sub in expected]
+                if not branches or any(b.seqs is None for b in branches):
+                    continue
+                seqs = sorted({seq for b in branches for seq in b.seqs})
+                if best_size is None or len(seqs) < best_size:
+                    best = QueryPlan("OR", seqs=seqs, residual=dict(filter_dict), branches=branches)
+                    best_size = len(seqs)
+                continue
+            index = self._indexes.get(key)
+            if index is None:
+                continue
+            size = index.estimate(expected)
+            if size is None or (best_size is not None and size >= best_size):
+                continue
+            residual = dict(filter_dict)
+            if index.exact:
+                residual.pop(key)
+            best = QueryPlan("IXSCAN", field=key, residual=residual)
+            best_size = size
+        if best is None:
+            return QueryPlan("COLLSCAN", residual=dict(filter_dict))
+        if best.stage == "IXSCAN":
+            best.seqs = self._indexes[best.field].scan(filter_dict[best.field])
+        return best
+
+    def _plan_sorted(self, filter_dict, sort):
+        """
+        Plan a sorted query as a walk over the ordered index on the first sort key, so
+        sort + limit stops after `limit` matches instead of ranking every match. Returns
+        (plan, seq iterator), or None when that index can't produce the order (missing,
+        holds non-string values, or documents lack the field) or another index is more
+        selective for the filter.
+        """
+        field, direction = sort[0]
+        index = self._indexes.get(field)
+        if not isinstance(index, SortedIndex) or not index.exact:
+            return None
+        filter_dict = filter_dict or {}
+        if field in filter_dict:
+            ranges = index._ranges(filter_dict[field])
+            if ranges is None or len(ranges) != 1:
+                return None
+            bounds = ranges[0]
+        elif len(index) < len(self._docs):
+            # Documents without the field sort first but aren't in the index
+            return None
+        else:
+            bounds = (None, True, None, True)
+        size = index.span_size(bounds)
+        for key, expected in filter_dict.items():
+            other = self._indexes.get(key)
+            if key == field or other is None:
+                continue
+            other_size = other.estimate(expected)
+            if other_size is not None and other_size < size:
+                return None
+        plan = QueryPlan("SORTED_IXSCAN", field=field, residual=dict(filter_dict))
+        return plan, index.ordered(bounds, reverse=direction == -1)
+
+    def _candidates(self, plan):
+        """
+        Return the (seq, doc) pairs a plan has to examine. A collection scan returns a live
+        view, so callers must stop iterating before they mutate `_docs`.
+        """
+        if plan.seqs is None:
+            return self._docs.items()
+        docs = self._docs
+        return [(seq, docs[seq]) for seq in plan.seqs]
+
+    def _candidate_docs(self, plan):
+        """Iterate the documents a plan has to examine, skipping any deleted since planning."""
+        if plan.seqs is None:
+            yield from self._docs.values()
+            return
+        docs = self._docs
+        for seq in plan.seqs:
+            doc = docs.get(seq)
+            if doc is not None:
+                yield doc
+
+    def explain(self, filter_dict=None):
+        """Return the plan `find(filter_dict)` would use, without running it."""
+        return self._plan(filter_dict).describe()
+
+    def find(self, filter_dict=None, projection=None):
+        return SimpleQuery(collection=self, filter_dict=filter_dict, projection=projection)
+
+    async def scan_batches(self, filter_dict=None, batch_size: int = 1000):
+        """
+        Yield matching documents in lists of up to `batch_size`. Unlike a find() cursor,
+        the caller may await between batches (streaming exports). Without an index plan
+        this is a keyset scan over seq, like the SQLite engine's: each batch resumes after
+        the last seq it looked at, so nothing is captured up front and documents inserted
+        meanwhile are picked up. An index plan walks the plan's own sorted candidate list.
+        Either way every document is re-read and re-checked when its batch runs, so
+        documents deleted in between are skipped and updates are seen.
+        """
+        plan = self._plan(filter_dict)
+        matches = compile_filter(filter_dict)
+        after_seq = -1
+        while True:
+            docs = self._docs
+            if plan.seqs is None:
+                # Seqs are handed out in ascending order; gaps are deleted documents
+                candidates = []
+                seq = after_seq
+                while len(candidates) < batch_size and seq + 1 < self._next_seq:
+                    seq += 1
+                    doc = docs.get(seq)
+                    if doc is not None:
+                        candidates.append(doc)
+            else:
+                start = bisect_right(plan.seqs, after_seq)
+                seqs = plan.seqs[start:start + batch_size]
+                seq = seqs[-1] if seqs else after_seq
+                candidates = [doc for doc in map(docs.get, seqs) if doc is not None]
+            if seq == after_seq:
+                return
+            after_seq = seq
+            batch = [doc for doc in candidates if matches(doc)]
+            if batch:
+                yield batch
+            # Let other requests (and writers) run between batches
+            await asyncio.sleep(0)
+
+    async def find_one(self, filter_dict, projection=None):
+        plan = self._plan(filter_dict)
+        matches = compile_filter(plan.residual)
+        for _, d in self._candidates(plan):
+            if matches(d):
+                project = compile_projection(projection)
+                return project(d) if project is not None else d
+        return None
+
+    def _attach_snapshot(self, snapshot: "ColumnarSnapshot"):
+        """
+        Serve documents lazily from a columnar snapshot. Indexes are rebuilt from the
+        indexed columns only, so no full document is materialized during startup.
+        """
+        self._docs = LazyDocuments(snapshot, overlay=self._empty_docs())
+        self._next_seq = max(self._next_seq, snapshot.header["next_seq"])
+        self.version += 1
+        for field, index in self._indexes.items():
+            top, _, rest = field.partition(".")
+            seqs, values = snapshot.column_values(top, missing=None)
+            if rest:
+                nested = rest.split(".")
+                values = [_resolve_path(value, nested) for value in values]
+            index.load(seqs, values)
+        if self._text_index is not None:
+            for field in self._text_index.fields:
+                self._text_index.load(*snapshot.column_values(field, missing=None))
+        for index in self._lookup_indexes.values():
+            _, values = snapshot.column_values(index.field, missing=None)
+            _, targets = snapshot.column_values(index.target, missing=None)
+            index.load(values, targets)
+
+    # Write primitives shared by the public API and journal replay (no logging here)
+    def _apply_insert(self, seq: int, doc):
+        self._check_unique(doc)
+        self._docs[seq] = doc
+        self._next_seq = max(self._next_seq, seq + 1)
+        self._index_add(seq, doc)
+        self.version += 1
+
+    def _apply_update(self, seq: int, changes, removed=()):
+        d = self._docs[seq]
+        new_doc = {**d, **changes}
+        for field in removed:
+            new_doc.pop(field, None)
+        touched = changes.keys() | set(removed) if removed else changes.keys()
+        # Only indexes over a changed top-level field need maintenance
+        indexes = [index for index in self._indexes.values() if index.field.partition(".")[0] in touched]
+        for index in indexes:
+            index.check_unique(new_doc, seq)
+        text_index = self._text_index
+        if text_index is not None and touched.isdisjoint(text_index.fields):
+            text_index = None
+        lookup_indexes = [
+            index for index in self._lookup_indexes.values() if index.field in touched or index.target in touched
+        ]
+        for index in indexes:
+            index.remove(seq, d)
+        if text_index is not None:
+            text_index.remove(seq, d)
+        for index in lookup_indexes:
+            index.remove(seq, d)
+        self._docs[seq] = new_doc
+        for index in indexes:
+            index.add(seq, new_doc)
+        if text_index is not None:
+            text_index.add(seq, new_doc)
+        for index in lookup_indexes:
+            index.add(seq, new_doc)
+        self.version += 1
+
+    def _apply_delete(self, seq: int):
+        self._index_remove(seq, self._docs[seq])
+        del self._docs[seq]
+        self.version += 1
+
+    async def _journal(self, record):
+        if self._wal is not None:
+            await self._wal.append(record)
+
+    async def _journal_many(self, records):
+        if self._wal is not None and records:
+            await self._wal.append_many(records)
+
+    # Write operations apply to memory synchronously and collect their journal
+    # records; callers journal once per batch so a bulk write pays for one fsync.
+
+    def _insert(self, document_dict, records) -> int:
+        doc = dict(document_dict)
+        seq = self._next_seq
+        self._apply_insert(seq, doc)
+        records.append(["i", seq, doc])
+        return 1
+
+    def _matching_seqs(self, filter_dict, multi: bool) -> List[int]:
+        plan = self._plan(filter_dict)
+        matches = compile_filter(plan.residual)
+        # Materialize first: the candidate view is live and the caller mutates it
+        seqs = []
+        for seq, d in self._candidates(plan):
+            if matches(d):
+                seqs.append(seq)
+                if not multi:
+                    break
+        return seqs
+
+    def _update(self, filter_dict, update_dict, multi: bool, records) -> int:
+        changes, removed = split_update(update_dict)
+        seqs = self._matching_seqs(filter_dict, multi)
+        for seq in seqs:
+            self._apply_update(seq, changes, removed)
+            records.append(["u", seq, changes, removed] if removed else ["u", seq, changes])
+        return len(seqs)
+
+    def _delete(self, filter_dict, multi: bool, records) -> int:
+        seqs = self._matching_seqs(filter_dict, multi)
+        for seq in seqs:
+            self._apply_delete(seq)
+            records.append(["d", seq])
+        return len(seqs)
+
+    async def insert_one(self, document_dict):
+        records = []
+        self._insert(document_dict, records)
+        await self._journal_many(records)
+        return SimpleResult(matched_count=1, modified_count=1, inserted_count=1)
+
+    async def insert_many(self, documents, ordered: bool = True):
+        return await self.bulk_write([{"insert_one": {"document": doc}} for doc in documents], ordered=ordered)
+
+    async def update_one(self, filter_dict, update_dict):
+        records = []
+        count = self._update(filter_dict, update_dict, False, records)
+        await self._journal_many(records)
+        return SimpleResult(matched_count=count, modified_count=count)
+
+    async def update_many(self, filter_dict, update_dict):
+        records = []
+        count = self._update(filter_dict, update_dict, True, records)
+        await self._journal_many(records)
+        return SimpleResult(matched_count=count, modified_count=count)
+
+    async def delete_one(self, filter_dict):
+        records = []
+        count = self._delete(filter_dict, False, records)
+        await self._journal_many(records)
+        return SimpleResult(deleted_count=count)
+
+    async def delete_many(self, filter_dict):
+        records = []
+        count = self._delete(filter_dict, True, records)
+        await self._journal_many(records)
+        return SimpleResult(deleted_count=count)
+
+    async def bulk_write(self, requests, ordered: bool = True):
+        """
+        Run a batch of write operations, each a single-key dict:
+        `{"insert_one": {"document": ...}}`, `{"update_one"|"update_many": {"filter": ..., "update": ...}}`
+        or `{"delete_one"|"delete_many": {"filter": ...}}`.
+
+        Operations are applied in order without yielding to the event loop and
+        journaled with one WAL append. When `ordered`, the batch stops at the first
+        failing operation; otherwise failures are skipped. Like pymongo, successful
+        operations are kept and failures raise BulkWriteError afterwards.
+        """
+        result = SimpleResult()
+        write_errors = []
+        records = []
+        for index, request in enumerate(requests):
+            op = next(iter(request), None) if isinstance(request, dict) and len(request) == 1 else None
+            try:
+                args = request[op] if op else None
+                if op == "insert_one":
+                    result.inserted_count += self._insert(args["document"], records)
+                elif op in ("update_one", "update_many"):
+                    count = self._update(args["filter"], args["update"], op == "update_many", records)
+                    result.matched_count += count
+                    result.modified_count += count
+                elif op in ("delete_one", "delete_many"):
+                    result.deleted_count += self._delete(args["filter"], op == "delete_many", records)
+                else:
+                    raise ValueError(f"Unsupported bulk operation: {request!r}")
+            except (DuplicateKeyError, KeyError, ValueError, TypeError) as exc:
+                write_errors.append({"index": index, "op": op, "errmsg": str(exc)})
+                if ordered:
+                    break
+        await self._journal_many(records)
+        if write_errors:
+            raise BulkWriteError({
+                "writeErrors": write_errors,
+                "nInserted": result.inserted_count,
+                "nMatched": result.matched_count,
+                "nModified": result.modified_count,
+                "nRemoved": result.deleted_count,
+            })
+        return result
+
+    async def count_documents(self, filter_dict):
+        if not filter_dict:
+            return len(self._docs)
+        plan = self._plan(filter_dict)
+        matches = compile_filter(plan.residual)
+        return len([d for _, d in self._candidates(plan) if matches(d)])
+
+    async def aggregate(self, pipeline):
+        # Very limited support: [{"$group": {"_id": "$field", "count": {"$sum": 1}}}]
+        if not pipeline:
+            return []
+        stage = pipeline[0]
+        if "$group" in stage:
+            group = stage["$group"]
+            field_expr = group.get("_id", None)
+            if isinstance(field_expr, str) and field_expr.startswith("$"):
+                field = field_expr[1:]
+            else:
+                field = None
+            buckets = {}
+            for d in self._docs.values():
+                key = d.get(field) if field else None
+                buckets[key] = buckets.get(key, 0) + 1
+            results = [{"_id": k, "count": v} for k, v in buckets.items()]
+            return SimpleQuery(results)
+        return SimpleQuery([])
+
+
+def _json_default(value):
+    """Serialize what prepare_for_mongo leaves behind (e.g. `updated_at` set after it ran)."""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def _dump_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=_json_default)
+
+
+class WriteAheadLog:
+    """
+    Append-only journal for one collection generation (`<name>.wal.<generation>`).
+    Records are JSON lines: ["i", seq, doc], ["u", seq, changes], ["u", seq, changes,
+    removed fields] or ["d", seq].
+    With group commit enabled, writers await the next batched fsync instead of
+    each paying for their own.
+    """
+
+    def __init__(self, path: Path, commit_interval_ms: int = 0):
+        self.path = path
+        self.commit_interval = commit_interval_ms / 1000
+        self._file = open(path, "a", encoding="utf-8")
+        self._waiter: Optional[asyncio.Future] = None
+        self._commit_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.commit_interval > 0 and self._commit_task is None:
+            self._commit_task = asyncio.get_running_loop().create_task(self._commit_loop())
+
+    async def append(self, record):
+        await self.append_many([record])
+
+    async def append_many(self, records):
+        """Append several records; they become durable with the same fsync."""
+        self._file.write("".join(_dump_json(record) + "\n" for record in records))
+        if self._commit_task is None:
+            self._sync()
+            return
+        if self._waiter is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+        await asyncio.shield(self._waiter)
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def _commit_loop(self):
+        while True:
+            await asyncio.sleep(self.commit_interval)
+            await self.commit()
+
+    async def commit(self):
+        """Flush buffered records, fsync once in a worker thread and release all waiters."""
+        waiter, self._waiter = self._waiter, None
+        if waiter is None:
+            return
+        try:
+            self._file.flush()
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+        except Exception as e:
+            waiter.set_exception(e)
+        else:
+            waiter.set_result(None)
+
+    async def close(self):
+        if self._commit_task is not None:
+            self._commit_task.cancel()
+            self._commit_task = None
+        await self.commit()
+        self._sync()
+        self._file.close()
+
+    @staticmethod
+    def replay(path: Path):
+        """Yield (byte offset, record) from a journal file, stopping at a torn final line."""
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    logger.warning(f"Ignoring truncated journal record at {path}:{offset}")
+                    return
+                yield offset, record
+                offset += len(line)
+
+
+_ABSENT = object()
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_DATE_NONE = -(2 ** 31)
+_DATE_ABSENT = _DATE_NONE + 1
+_CODE_NONE = -1
+_CODE_ABSENT = -2
+# Dictionaries up to this size are decoded once when the snapshot is opened
+_EAGER_DICTIONARY_SIZE = 4096
+
+
+def _align(f):
+    padding = -f.tell() % 8
+    if padding:
+        f.write(b"\0" * padding)
+
+
+class ColumnarSnapshot:
+    """
+    Column-wise, memory-mapped snapshot of one collection (`<name>.snapshot.col`).
+
+    Layout: magic, a JSON header (generation, next_seq, row count, column directory),
+    then 8-byte aligned arrays. Each column is one of
+      - "str"/"json": int32 codes into a string dictionary (uint64 offsets + UTF-8 blob);
+        "json" holds serialized nested objects, lists, ints and bools
+      - "f64": float64 values plus a uint8 mask (0 value, 1 None, 2 absent)
+      - "date": int32 day numbers (date.toordinal()) for ISO date strings
+    Nothing is decoded up front: rows are turned into dicts only when accessed.
+    """
+
+    MAGIC = b"DEGCOL1\n"
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if bytes(view[:len(self.MAGIC)]) != self.MAGIC:
+            raise ValueError(f"{path} is not a columnar snapshot")
+        header_start = len(self.MAGIC) + 8
+        header_length = int.from_bytes(view[len(self.MAGIC):header_start], "little")
+        self.header = json.loads(bytes(view[header_start:header_start + header_length]))
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {self.header['byteorder']}-endian machine")
+        self.count = self.header["count"]
+        self.seqs = self._array(view, self.header["seqs"], "q")
+        self.max_seq = self.seqs[self.count - 1] if self.count else -1
+        self.columns = []
+        for column in self.header["columns"]:
+            entry = {"name": column["name"], "kind": column["kind"]}
+            if column["kind"] in ("str", "json"):
+                entry["codes"] = self._array(view, column["codes"], "i")
+                entry["offsets"] = self._array(view, column["offsets"], "Q")
+                entry["blob"] = view[column["blob"][0]:column["blob"][0] + column["blob"][1]]
+                size = len(entry["offsets"]) - 1
+                entry["decoded"] = self._dictionary(entry) if size <= _EAGER_DICTIONARY_SIZE else None
+            elif column["kind"] == "f64":
+                entry["values"] = self._array(view, column["values"], "d")
+                entry["mask"] = self._array(view, column["mask"], "B")
+            else:
+                entry["days"] = self._array(view, column["days"], "i")
+            self.columns.append(entry)
+        self._by_name = {column["name"]: column for column in self.columns}
+        self._readers = [(column["name"], self._reader(column)) for column in self.columns]
+
+    @staticmethod
+    def _array(view, location, fmt):
+        offset, length = location
+        return view[offset:offset + length].cast(fmt)
+
+    @staticmethod
+    def _dictionary(column):
+        """Decode a whole string dictionary at once."""
+        offsets = column["offsets"].tolist()
+        blob = column["blob"]
+        text = bytes(blob).decode("utf-8")
+        if len(text) == len(blob):
+            # Pure ASCII: byte offsets are character offsets, so slice the decoded text
+            entries = [text[start:stop] for start, stop in zip(offsets, offsets[1:])]
+        else:
+            raw = bytes(blob)
+            entries = [raw[start:stop].decode("utf-8") for start, stop in zip(offsets, offsets[1:])]
+        if column["kind"] == "json":
+            entries = [json.loads(entry) for entry in entries]
+        return entries
+
+    @staticmethod
+    def _decode_entry(column, code):
+        offsets = column["offsets"]
+        text = bytes(column["blob"][offsets[code]:offsets[code + 1]]).decode("utf-8")
+        return json.loads(text) if column["kind"] == "json" else text
+
+    def _value(self, column, row):
+        kind = column["kind"]
+        if kind in ("str", "json"):
+            code = column["codes"][row]
+            if code == _CODE_ABSENT:
+                return _ABSENT
+            if code == _CODE_NONE:
+                return None
+            decoded = column["decoded"]
+            return decoded[code] if decoded is not None else self._decode_entry(column, code)
+        if kind == "f64":
+            mask = column["mask"][row]
+            if mask:
+                return None if mask == 1 else _ABSENT
+            return column["values"][row]
+        days = column["days"][row]
+        if days == _DATE_ABSENT:
+            return _ABSENT
+        if days == _DATE_NONE:
+            return None
+        return date.fromordinal(days).isoformat()
+
+    def _reader(self, column):
+        """Build a `row -> value` closure for one column (used when materializing documents)."""
+        kind = column["kind"]
+        if kind in ("str", "json"):
+            codes, decoded = column["codes"], column["decoded"]
+            if decoded is not None:
+                lookup = decoded + [_ABSENT, None]
+                return lambda row: lookup[codes[row]]
+            return lambda row: self._value(column, row)
+        if kind == "f64":
+            values, mask = column["values"], column["mask"]
+            return lambda row: values[row] if not mask[row] else (None if mask[row] == 1 else _ABSENT)
+        days = column["days"]
+        decoded_days = {_DATE_NONE: None, _DATE_ABSENT: _ABSENT}
+
+        def read_day(row):
+            day = days[row]
+            value = decoded_days.get(day)
+            if value is None and day != _DATE_NONE:
+                value = decoded_days[day] = date.fromordinal(day).isoformat()
+            return value
+        return read_day
+
+    def row_of(self, seq: int) -> Optional[int]:
+        row = bisect_left(self.seqs, seq)
+        if row < self.count and self.seqs[row] == seq:
+            return row
+        return None
+
+    def materialize(self, row: int) -> dict:
+        doc = {}
+        for name, read in self._readers:
+            value = read(row)
+            if value is not _ABSENT:
+                doc[name] = value
+        return doc
+
+    def column_values(self, name: str, missing=_ABSENT):
+        """
+        Decode one top-level field for every row. Returns (seqs, values) lists;
+        rows without the field get `missing`.
+        """
+        seqs = self.seqs.tolist()
+        column = self._by_name.get(name)
+        if column is None:
+            return seqs, [missing] * len(seqs)
+        kind = column["kind"]
+        if kind in ("str", "json"):
+            dictionary = column["decoded"]
+            if dictionary is None:
+                dictionary = self._dictionary(column)
+            # Negative codes index from the end: -1 -> None, -2 -> missing
+            lookup = dictionary + [missing, None]
+            values = list(map(lookup.__getitem__, column["codes"].tolist()))
+        elif kind == "f64":
+            values = [
+                value if not mask else (None if mask == 1 else missing)
+                for value, mask in zip(column["values"].tolist(), column["mask"].tolist())
+            ]
+        else:
+            decoded = {_DATE_NONE: None, _DATE_ABSENT: missing}
+
+            def decode_day(days):
+                if days not in decoded:
+                    decoded[days] = date.fromordinal(days).isoformat()
+                return decoded[days]
+            values = list(map(decode_day, column["days"].tolist()))
+        return seqs, values
+
+    def close(self):
+        # Drop exported buffers first; mmap refuses to close while views exist
+        self.columns = []
+        self._by_name = {}
+        self._readers = []
+        self.seqs.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    @staticmethod
+    def _column_kind(values):
+        present = [v for v in values if v is not _ABSENT and v is not None]
+        if present and all(type(v) is float for v in present):
+            return "f64"
+        if present and all(type(v) is str and _ISO_DATE.match(v) for v in present):
+            try:
+                if all(date.fromisoformat(v).isoformat() == v for v in present):
+                    return "date"
+            except ValueError:
+                pass
+        if all(type(v) is str for v in present):
+            return "str"
+        return "json"
+
+    @classmethod
+    def write(cls, path: Path, header, items):
+        """Write `items` ([(seq, doc), ...] in seq order) column-wise to `path`."""
+        names: Dict[str, None] = {}
+        for _, doc in items:
+            for key in doc:
+                names.setdefault(key, None)
+        count = len(items)
+        seqs = array.array("q", (seq for seq, _ in items))
+        columns = []
+        sections = []  # (column directory entry, key, payload bytes)
+        for name in names:
+            values = [doc.get(name, _ABSENT) for _, doc in items]
+            kind = cls._column_kind(values)
+            entry = {"name": name, "kind": kind}
+            if kind in ("str", "json"):
+                dictionary: Dict[str, int] = {}
+                codes = array.array("i")
+                for value in values:
+                    if value is _ABSENT:
+                        codes.append(_CODE_ABSENT)
+                    elif value is None:
+                        codes.append(_CODE_NONE)
+                    else:
+                        text = value if kind == "str" else _dump_json(value)
+                        codes.append(dictionary.setdefault(text, len(dictionary)))
+                encoded = [text.encode("utf-8") for text in dictionary]
+                offsets = array.array("Q", [0])
+                for chunk in encoded:
+                    offsets.append(offsets[-1] + len(chunk))
+                sections += [(entry, "codes", codes.tobytes()), (entry, "offsets", offsets.tobytes()),
+                             (entry, "blob", b"".join(encoded))]
+            elif kind == "f64":
+                mask = array.array("B", (2 if v is _ABSENT else 1 if v is None else 0 for v in values))
+                floats = array.array("d", (v if type(v) is float else 0.0 for v in values))
+                sections += [(entry, "values", floats.tobytes()), (entry, "mask", mask.tobytes())]
+            else:
+                days = array.array("i", (
+                    _DATE_ABSENT if v is _ABSENT else _DATE_NONE if v is None else date.fromisoformat(v).toordinal()
+                    for v in values
+                ))
+                sections.append((entry, "days", days.tobytes()))
+            columns.append(entry)
+
+        # Section offsets depend on the header length, so lay them out relative to the
+        # data start, then fix the header size by padding it to a multiple of 8.
+        relative = 0
+        layout = []
+        for payload in [seqs.tobytes()] + [section[2] for section in sections]:
+            layout.append((relative, len(payload)))
+            relative += len(payload) + (-len(payload) % 8)
+
+        def render(data_start):
+            located = [[data_start + offset, length] for offset, length in layout]
+            for (entry, key, _), location in zip(sections, located[1:]):
+                entry[key] = location
+            full_header = {**header, "byteorder": sys.byteorder, "count": count,
+                           "seqs": located[0], "columns": columns}
+            return json.dumps(full_header, separators=(",", ":")).encode("utf-8")
+
+        prefix = len(cls.MAGIC) + 8
+        header_bytes = render(0)
+        while True:
+            data_start = prefix + len(header_bytes) + (-(prefix + len(header_bytes)) % 8)
+            rendered = render(data_start)
+            if len(rendered) == len(header_bytes):
+                break
+            header_bytes = rendered
+        header_bytes = rendered
+
+        with open(path, "wb") as f:
+            f.write(cls.MAGIC)
+            f.write(len(header_bytes).to_bytes(8, "little"))
+            f.write(header_bytes)
+            _align(f)
+            f.write(seqs.tobytes())
+            _align(f)
+            for _, _, payload in sections:
+                f.write(payload)
+                _align(f)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class LazyDocuments:
+    """
+    Stand-in for `SimpleCollection._docs` backed by a ColumnarSnapshot.
+    Snapshot rows are materialized on every access (nothing is cached, so memory stays
+    at the mmapped file size); inserted or updated documents live in an overlay dict
+    and deleted snapshot rows are remembered as tombstones. Iteration follows seq order.
+    """
+
+    def __init__(self, snapshot: ColumnarSnapshot, overlay=None):
+        self._snapshot = snapshot
+        # A plain dict, or CompactDocuments when the collection uses compact storage
+        self._overlay = overlay if overlay is not None else {}
+        self._deleted = set()
+        self._len = snapshot.count
+
+    def _row(self, seq):
+        if seq in self._deleted:
+            return None
+        return self._snapshot.row_of(seq)
+
+    def get(self, seq, default=None):
+        doc = self._overlay.get(seq)
+        if doc is not None:
+            return doc
+        row = self._row(seq)
+        return self._snapshot.materialize(row) if row is not None else default
+
+    def __getitem__(self, seq):
+        doc = self.get(seq)
+        if doc is None:
+            raise KeyError(seq)
+        return doc
+
+    def __contains__(self, seq):
+        return seq in self._overlay or self._row(seq) is not None
+
+    def __setitem__(self, seq, doc):
+        if seq not in self:
+            self._len += 1
+        self._overlay[seq] = doc
+
+    def __delitem__(self, seq):
+        if seq not in self:
+            raise KeyError(seq)
+        self._overlay.pop(seq, None)
+        if self._snapshot.row_of(seq) is not None:
+            self._deleted.add(seq)
+        self._len -= 1
+
+    def __len__(self):
+        return self._len
+
+    def items(self):
+        snapshot, overlay, deleted = self._snapshot, self._overlay, self._deleted
+        seqs = snapshot.seqs
+        for row in range(snapshot.count):
+            seq = seqs[row]
+            doc = overlay.get(seq)
+            if doc is not None:
+                yield seq, doc
+            elif seq not in deleted:
+                yield seq, snapshot.materialize(row)
+        for seq, doc in list(overlay.items()):
+            if seq > snapshot.max_seq:
+                yield seq, doc
+
+    def copy(self) -> "LazyDocuments":
+        """Point-in-time view sharing the (immutable) snapshot; cheap enough for the event loop."""
+        frozen = LazyDocuments(self._snapshot, overlay=self._overlay.copy())
+        frozen._deleted = set(self._deleted)
+        frozen._len = self._len
+        return frozen
+
+    def values(self):
+        for _, doc in self.items():
+            yield doc
+
+    def __iter__(self):
+        # Sequence numbers only; nothing is materialized
+        overlay, deleted = self._overlay, self._deleted
+        for seq in self._snapshot.seqs:
+            if seq in overlay or seq not in deleted:
+                yield seq
+        for seq in list(overlay):
+            if seq > self._snapshot.max_seq:
+                yield seq
+
+
+class DurableStore:
+    """
+    Optional durable mode for InMemoryDB, enabled by setting DB_DATA_DIR.
+
+    Every write is journaled to `<name>.wal.<generation>`. A background task
+    periodically writes `<name>.snapshot.jsonl` and drops journals the snapshot covers:
+    it rotates to a new journal generation, copies the document references (documents
+    are replaced, never mutated, on update) and serializes them in a worker thread,
+    so writers are not blocked. Startup loads the snapshot, then replays every journal
+    generation at or after the one recorded in the snapshot header.
+    """
+
+    SNAPSHOT_SUFFIXES = {"jsonl": "snapshot.jsonl", "columnar": "snapshot.col"}
+
+    def __init__(self, database: "InMemoryDB", data_dir: Path, commit_interval_ms: int = 10,
+                 snapshot_interval: float = 300, snapshot_format: str = "jsonl"):
+        if snapshot_format not in self.SNAPSHOT_SUFFIXES:
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        self.db = database
+        self.data_dir = Path(data_dir)
+        self.commit_interval_ms = commit_interval_ms
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_format = snapshot_format
+        self._generations: Dict[str, int] = {}
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._snapshot_lock = asyncio.Lock()
+
+    def _collections(self):
+        return self.db.collections().items()
+
+    def _wal_paths(self, name: str):
+        paths = []
+        for path in self.data_dir.glob(f"{name}.wal.*"):
+            suffix = path.name.rsplit(".", 1)[-1]
+            if suffix.isdigit():
+                paths.append((int(suffix), path))
+        return sorted(paths)
+
+    async def open(self):
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        for name, collection in self._collections():
+            generation = self._load(name, collection)
+            self._generations[name] = generation
+            collection._wal = WriteAheadLog(self.data_dir / f"{name}.wal.{generation}", self.commit_interval_ms)
+            collection._wal.start()
+        if self.snapshot_interval > 0:
+            self._snapshot_task = asyncio.get_running_loop().create_task(self._snapshot_loop())
+
+    def _load(self, name: str, collection: "SimpleCollection") -> int:
+        generation = 0
+        columnar_path = self.data_dir / f"{name}.snapshot.col"
+        snapshot_path = self.data_dir / f"{name}.snapshot.jsonl"
+        if columnar_path.exists():
+            snapshot = ColumnarSnapshot(columnar_path)
+            generation = snapshot.header["generation"]
+            collection._attach_snapshot(snapshot)
+        elif snapshot_path.exists():
+            with open(snapshot_path, encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                generation = header["generation"]
+                for line in f:
+                    seq, doc = json.loads(line)
+                    collection._apply_insert(seq, doc)
+                collection._next_seq = max(collection._next_seq, header["next_seq"])
+        replayed = 0
+        for wal_generation, path in self._wal_paths(name):
+            if wal_generation < generation:
+                continue
+            generation = wal_generation
+            for offset, record in WriteAheadLog.replay(path):
+                op, seq = record[0], record[1]
+                try:
+                    if op == "i":
+                        if seq in collection._docs:
+                            collection._apply_delete(seq)
+                        collection._apply_insert(seq, record[2])
+                    elif op == "u" and seq in collection._docs:
+                        collection._apply_update(seq, record[2], record[3] if len(record) > 3 else ())
+                    elif op == "d" and seq in collection._docs:
+                        collection._apply_delete(seq)
+                except DuplicateKeyError as e:
+                    # One conflicting record must not keep the database from starting
+                    logger.error(f"Skipping journal record at {path}:{offset} ({op} seq {seq}): {e}")
+                    continue
+                replayed += 1
+        logger.info(f"Loaded {len(collection._docs)} documents into '{name}' ({replayed} journal records replayed)")
+        return generation
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logger.error(f"Snapshot failed: {e}")
+
+    async def snapshot(self):
+        """Write a snapshot of every collection and truncate the journals it covers."""
+        async with self._snapshot_lock:
+            for name, collection in self._collections():
+                generation = self._generations[name] + 1
+                # Rotate first: everything after this point lands in the new journal
+                old_wal = collection._wal
+                collection._wal = WriteAheadLog(self.data_dir / f"{name}.wal.{generation}", self.commit_interval_ms)
+                collection._wal.start()
+                self._generations[name] = generation
+                docs = collection._docs
+                # Lazily loaded and compact collections are frozen cheaply here (a copy of the
+                # record map) and turned into dicts in the worker thread
+                items = docs.copy() if isinstance(docs, (LazyDocuments, CompactDocuments)) else list(docs.items())
+                header = {"generation": generation, "next_seq": collection._next_seq}
+                await old_wal.close()
+                await asyncio.to_thread(self._write_snapshot, name, header, items)
+                for wal_generation, path in self._wal_paths(name):
+                    if wal_generation < generation:
+                        path.unlink()
+
+    def _write_snapshot(self, name: str, header, items):
+        if isinstance(items, (LazyDocuments, CompactDocuments)):
+            items = list(items.items())
+        path = self.data_dir / f"{name}.{self.SNAPSHOT_SUFFIXES[self.snapshot_format]}"
+        tmp_path = path.with_name(path.name + ".tmp")
+        if self.snapshot_format == "columnar":
+            ColumnarSnapshot.write(tmp_path, header, items)
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(_dump_json(header) + "\n")
+                for item in items:
+                    f.write(_dump_json(item) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        # Only one snapshot format may exist; the columnar one wins on load
+        for other_format, suffix in self.SNAPSHOT_SUFFIXES.items():
+            if other_format != self.snapshot_format:
+                (self.data_dir / f"{name}.{suffix}").unlink(missing_ok=True)
+
+    async def close(self):
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+            self._snapshot_task = None
+        for _, collection in self._collections():
+            if collection._wal is not None:
+                await collection._wal.close()
+                collection._wal = None
+
+
+# Low-cardinality fields whose string values are shared across records
+KUNDE_INTERNED_FIELDS = ("status", "anrede", "titel", "ort", "plz", "betreuer", "betreuer_name", "betreuer_firma", "selektion")
+VERTRAG_INTERNED_FIELDS = (
+    "gesellschaft", "produkt_sparte", "tarif", "zahlungsweise", "vertragsstatus",
+    "vu_id", "vu_internal_id", "kunde_id", "beginn", "ablauf",
+)
+
+
+class QueryCursor(Protocol):
+    """Cursor returned by `find()`: chainable like Motor's, consumed with `await to_list()`."""
+
+    def skip(self, n: int) -> "QueryCursor": ...
+
+    def limit(self, n: int) -> "QueryCursor": ...
+
+    def sort(self, key_or_list, direction: int = 1) -> "QueryCursor": ...
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]: ...
+
+    def explain(self) -> Dict[str, Any]: ...
+
+
+class DocumentCollection(Protocol):
+    """
+    Storage protocol for one collection: the Motor-shaped subset of the API the
+    endpoints use. Implemented by SimpleCollection (in memory) and SQLiteCollection.
+    Filters, updates (`$set` or merge), projections and bulk requests use the Mongo
+    syntax documented on SimpleCollection; unique index violations raise
+    DuplicateKeyError, failed bulk operations BulkWriteError. `version` changes with
+    every write made through this process.
+    """
+
+    version: int
+
+    def create_index(self, field: str, unique: bool = False, ordered: bool = False): ...
+
+    def find(self, filter_dict=None, projection=None) -> QueryCursor: ...
+
+    async def find_one(self, filter_dict, projection=None) -> Optional[Dict[str, Any]]: ...
+
+    async def insert_one(self, document_dict) -> SimpleResult: ...
+
+    async def insert_many(self, documents, ordered: bool = True) -> SimpleResult: ...
+
+    async def update_one(self, filter_dict, update_dict) -> SimpleResult: ...
+
+    async def update_many(self, filter_dict, update_dict) -> SimpleResult: ...
+
+    async def delete_one(self, filter_dict) -> SimpleResult: ...
+
+    async def delete_many(self, filter_dict) -> SimpleResult: ...
+
+    async def bulk_write(self, requests, ordered: bool = True) -> SimpleResult: ...
+
+    async def count_documents(self, filter_dict) -> int: ...
+
+    async def aggregate(self, pipeline) -> QueryCursor: ...
+
+    def scan_batches(self, filter_dict=None, batch_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]: ...
+
+    def create_text_index(self, fields): ...
+
+    async def text_search(self, query: str, limit: int = 20, projection=None) -> List[Dict[str, Any]]: ...
+
+    def create_lookup_index(self, field: str, target: str): ...
+
+    async def lookup(self, field: str, term, match: str = "prefix") -> set: ...
+
+
+class Database(Protocol):
+    """What the endpoints need from `db`: the collections plus lifecycle hooks."""
+
+    kunden: DocumentCollection
+    vertraege: DocumentCollection
+    vus: DocumentCollection
+    documents: DocumentCollection
+    jobs: DocumentCollection
+
+    def collections(self) -> Dict[str, DocumentCollection]: ...
+
+    async def open(self): ...
+
+    async def close(self): ...
+
+
+# Indexes every storage engine creates: (collection, field, options). Hash lookups for
+# the queries the endpoints do most often, plus ordered indexes for date range queries
+# and created_at keyset pagination (ISO strings sort chronologically).
+DEFAULT_INDEXES = [
+    ("kunden", "id", {"unique": True}),
+    ("kunden", "kunde_id", {}),
+    ("vertraege", "id", {"unique": True}),
+    ("vertraege", "kunde_id", {}),
+    ("vertraege", "vu_internal_id", {}),
+    ("vus", "id", {"unique": True}),
+    ("vus", "vu_internal_id", {}),
+    ("documents", "id", {"unique": True}),
+    ("documents", "kunde_id", {}),
+    ("documents", "content_hash", {}),
+    ("kunden", "created_at", {"ordered": True}),
+    ("vertraege", "beginn", {"ordered": True}),
+    ("vertraege", "ablauf", {"ordered": True}),
+    ("vertraege", "created_at", {"ordered": True}),
+    ("vus", "created_at", {"ordered": True}),
+    ("documents", "created_at", {"ordered": True}),
+    ("jobs", "id", {"unique": True}),
+    ("jobs", "created_at", {"ordered": True}),
+]
+
+# Fields behind /kunden/quicksearch
+KUNDE_SEARCH_FIELDS = ("name", "vorname", "strasse", "ort", "plz", "kunde_id")
+
+# Full-text indexes every storage engine creates: (collection, fields)
+DEFAULT_TEXT_INDEXES = [
+    ("kunden", KUNDE_SEARCH_FIELDS),
+]
+
+# Contract -> customer lookup indexes for the contract criteria of /kunden/search:
+# (collection, field, target)
+DEFAULT_LOOKUP_INDEXES = [
+    ("vertraege", "kfz_kennzeichen", "kunde_id"),
+    ("vertraege", "vertragsnummer", "kunde_id"),
+    ("vertraege", "gesellschaft", "kunde_id"),
+]
+
+
+class InMemoryDB:
+    def __init__(self):
+        self.kunden = SimpleCollection()
+        self.vertraege = SimpleCollection()
+        self.vus = SimpleCollection()
+        self.documents = SimpleCollection()
+        self.jobs = SimpleCollection()
+
+        # Tuple-backed records with interned values for the two large collections
+        self.kunden.use_compact_storage(KUNDE_INTERNED_FIELDS)
+        self.vertraege.use_compact_storage(VERTRAG_INTERNED_FIELDS)
+
+        collections = self.collections()
+        for name, field, options in DEFAULT_INDEXES:
+            collections[name].create_index(field, **options)
+        for name, fields in DEFAULT_TEXT_INDEXES:
+            collections[name].create_text_index(fields)
+        for name, field, target in DEFAULT_LOOKUP_INDEXES:
+            collections[name].create_lookup_index(field, target)
+
+        self.persistence: Optional[DurableStore] = None
+
+    def collections(self) -> Dict[str, SimpleCollection]:
+        return {
+            "kunden": self.kunden,
+            "vertraege": self.vertraege,
+            "vus": self.vus,
+            "documents": self.documents,
+            "jobs": self.jobs,
+        }
+
+    async def open(self):
+        """Enable durable mode when DB_DATA_DIR is set; otherwise stay purely in-memory."""
+        data_dir = os.environ.get("DB_DATA_DIR")
+        if not data_dir:
+            return
+        self.persistence = DurableStore(
+            self,
+            Path(data_dir),
+            commit_interval_ms=int(os.environ.get("DB_WAL_COMMIT_MS", "10")),
+            snapshot_interval=float(os.environ.get("DB_SNAPSHOT_INTERVAL", "300")),
+            snapshot_format=os.environ.get("DB_SNAPSHOT_FORMAT", "jsonl"),
+        )
+        await self.persistence.open()
+
+    async def close(self):
+        if self.persistence is not None:
+            await self.persistence.close()
+            self.persistence = None
+
+
+# ------------------------------
+# SQLite storage engine (DB_ENGINE=sqlite)
+# ------------------------------
+
+def _json_path(field: str) -> str:
+    """JSON path for a dotted field: "persoenliche_daten.geburtsdatum" -> '$."persoenliche_daten"."geburtsdatum"'."""
+    return "$." + ".".join('"' + part.replace('"', '\\"') + '"' for part in field.split("."))
+
+
+def _json_key_path(key: str) -> str:
+    """JSON path for one top-level key, dots included (how updates address fields)."""
+    return '$."' + key.replace('"', '\\"') + '"'
+
+
+def _is_unique_violation(error: sqlite3.IntegrityError) -> bool:
+    """Whether an IntegrityError comes from a unique index (other constraints, e.g. CHECK, don't)."""
+    code = getattr(error, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code in (sqlite3.SQLITE_CONSTRAINT_UNIQUE, sqlite3.SQLITE_CONSTRAINT_PRIMARYKEY)
+    return str(error).startswith("UNIQUE constraint failed")
+
+
+@functools.lru_cache(maxsize=256)
+def _sql_regex(pattern: str, options: str):
+    return _compile_regex({"$regex": pattern, "$options": options})
+
+
+def _sql_regexp(pattern, options, value) -> int:
+    """`deg_regexp(pattern, options, value)`: SQL twin of the `$regex` matcher in _compile_condition."""
+    if value is None:
+        value = ""
+    search = _sql_regex(str(pattern), str(options or ""))
+    if search is None:
+        return int(str(pattern).lower() in str(value).lower())
+    return int(search(str(value)) is not None)
+
+
+_SQL_SCALARS = (str, int, float, bool)
+_SQL_RANGE = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+class SQLiteQuery:
+    """SimpleQuery's counterpart for SQLiteCollection; runs on the reader pool when consumed."""
+
+    def __init__(self, collection: "SQLiteCollection", filter_dict=None, projection=None):
+        self._collection = collection
+        self._filter = filter_dict or {}
+        self._projection = compile_projection(projection)
+        self._skip = 0
+        self._limit = None
+        self._sort = None
+
+    def __await__(self):
+        yield from ()
+        return self
+
+    def skip(self, n: int):
+        self._skip = max(int(n or 0), 0)
+        return self
+
+    def limit(self, n: int):
+        self._limit = abs(int(n)) if n else None
+        return self
+
+    def sort(self, key_or_list, direction: int = 1):
+        if isinstance(key_or_list, (list, tuple)):
+            self._sort = [(field, dir_) for field, dir_ in key_or_list]
+        else:
+            self._sort = [(key_or_list, direction)]
+        return self
+
+    def _statement(self, end: Optional[int]):
+        collection = self._collection
+        where, params, residual = collection._translate(self._filter)
+        sql = f"SELECT doc FROM {collection.table}" + (f" WHERE {where}" if where else "")
+        order, order_params = collection._order_by(self._sort)
+        sql += f" ORDER BY {order}"
+        params = params + order_params
+        if not residual:
+            # Everything was translated: let SQLite apply skip/limit
+            sql += " LIMIT ? OFFSET ?"
+            params += [-1 if end is None else end - self._skip, self._skip]
+        return sql, params, residual
+
+    def _end(self, length):
+        end = None if self._limit is None else self._skip + self._limit
+        if length is not None:
+            end = self._skip + length if end is None else min(end, self._skip + length)
+        return end
+
+    def _run(self, connection, end):
+        sql, params, residual = self._statement(end)
+        docs = (json.loads(row[0]) for row in connection.execute(sql, params))
+        if residual:
+            matches = compile_filter(residual)
+            docs = islice((doc for doc in docs if matches(doc)), self._skip, end)
+        results = list(docs)
+        if self._projection is not None:
+            results = [self._projection(doc) for doc in results]
+        return results
+
+    async def to_list(self, length=None):
+        end = self._end(length)
+        return await self._collection._database._read(self._run, end)
+
+    def explain(self):
+        """SQLite's query plan for this cursor, plus the predicates evaluated in Python."""
+        sql, params, residual = self._statement(self._end(None))
+        connection = self._collection._database._connect()
+        try:
+            plan = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        finally:
+            connection.close()
+        return {"plan": {"stage": "SQLITE", "sql": sql, "steps": plan, "residual": sorted(residual)}}
+
 
-    def skip(self, n: int):
-        self._data = self._data[n:]
-        return self
+class SQLiteCollection:
+    """
+    One collection stored as a SQLite table `(seq INTEGER PRIMARY KEY, doc TEXT)` with the
+    document as JSON. Indexed fields become VIRTUAL generated columns
+    (`json_extract(doc, '$."field"')`) with a B-tree index on them. Filters are translated
+    to SQL where the semantics match `compile_filter`; anything else (e.g. equality on
+    lists/objects) is checked in Python on the rows SQLite returns.
+    """
 
-    def limit(self, n: int):
-        self._data = self._data[:n]
-        return self
+    def __init__(self, database: "SQLiteDB", name: str):
+        self._database = database
+        self.name = name
+        self.table = f'"{name}"'
+        self._indexes: Dict[str, bool] = {}  # field -> unique
+        # Fields of the FTS5 table `<name>_text` (see create_text_index)
+        self._text_fields: Optional[tuple] = None
+        self.text_table = f'"{name}_text"'
+        # field -> target of the rows in `<name>_lookup` (see create_lookup_index)
+        self._lookup_fields: Dict[str, str] = {}
+        self.lookup_table = f'"{name}_lookup"'
+        # Trigrams of the distinct lookup keys, for `contains` lookups
+        self.lookup_gram_table = f'"{name}_lookup_gram"'
+        # Bumped after every committed write call from this process
+        self.version = 0
+
+    # --- schema -------------------------------------------------------------
+
+    def create_index(self, field: str, unique: bool = False, ordered: bool = False):
+        # SQLite indexes are B-trees, so every index also serves ordered scans
+        self._indexes[field] = unique
+        if self._database.is_open:
+            self._database._run_write(self._create_index_sync, field, unique)
+
+    @staticmethod
+    def _column_name(field: str) -> str:
+        return '"ix_' + re.sub(r"\W", "_", field) + '"'
+
+    def _create_schema(self, connection):
+        connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} "
+            "(seq INTEGER PRIMARY KEY AUTOINCREMENT, doc TEXT NOT NULL CHECK (json_valid(doc)))"
+        )
+        for field, unique in self._indexes.items():
+            self._create_index_sync(connection, field, unique)
+        if self._text_fields is not None:
+            self._create_text_index_sync(connection)
+        if self._lookup_fields:
+            self._create_lookup_table_sync(connection)
+
+    def _create_index_sync(self, connection, field: str, unique: bool):
+        column = self._column_name(field)
+        existing = {row[1] for row in connection.execute(f"PRAGMA table_xinfo({self.table})")}
+        if column.strip('"') not in existing:
+            path = _json_path(field).replace("'", "''")
+            connection.execute(
+                f"ALTER TABLE {self.table} ADD COLUMN {column} "
+                f"GENERATED ALWAYS AS (json_extract(doc, '{path}')) VIRTUAL"
+            )
+        index_name = f'"{self.name}_{column.strip(chr(34))}"'
+        connection.execute(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {index_name} ON {self.table} ({column})"
+        )
 
-    def sort(self, field: str, direction: int):
-        reverse = True if direction == -1 else False
-        self._data = sorted(self._data, key=lambda d: d.get(field), reverse=reverse)
-        return self
+    def create_text_index(self, fields):
+        """Full-text index as an FTS5 table of the normalized `search_tokens`, rowid = seq."""
+        self._text_fields = tuple(fields)
+        if self._database.is_open:
+            self._database._run_write(self._create_text_index_sync)
+
+    def _create_text_index_sync(self, connection):
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (self.text_table.strip('"'),)
+        ).fetchone()
+        if exists:
+            return
+        # Tokens are already folded; the prefix indexes serve 2- and 3-letter "term*" queries
+        connection.execute(
+            f"CREATE VIRTUAL TABLE {self.text_table} USING fts5(tokens, tokenize='unicode61 remove_diacritics 0', prefix='2 3')"
+        )
+        rows = connection.execute(f"SELECT seq, doc FROM {self.table}").fetchall()
+        connection.executemany(
+            f"INSERT INTO {self.text_table} (rowid, tokens) VALUES (?, ?)",
+            [(seq, self._text_row(json.loads(doc))) for seq, doc in rows],
+        )
 
-    async def to_list(self, length=None):
-        return list(self._data)
+    def _text_row(self, doc) -> str:
+        return " ".join(sorted(text_tokens(doc, self._text_fields)))
 
+    def _reindex_text_sync(self, connection, seq: int):
+        connection.execute(f"DELETE FROM {self.text_table} WHERE rowid = ?", (seq,))
+        row = connection.execute(f"SELECT doc FROM {self.table} WHERE seq = ?", (seq,)).fetchone()
+        if row is not None:
+            connection.execute(
+                f"INSERT INTO {self.text_table} (rowid, tokens) VALUES (?, ?)", (seq, self._text_row(json.loads(row[0])))
+            )
 
-class SimpleCollection:
-    def __init__(self):
-        self._docs = []
-
-    def _match_condition(self, value, condition):
-        if isinstance(condition, dict):
-            # Supported operators: $regex, $options, $exists, $ne, $in
-            if "$regex" in condition:
-                pattern = condition.get("$regex", "")
-                options = condition.get("$options", "")
-                flags = re.IGNORECASE if "i" in str(options) else 0
-                try:
-                    return re.search(pattern, str(value) if value is not None else "", flags) is not None
-                except re.error:
-                    # Fallback to substring check if regex fails
-                    val = str(value) if value is not None else ""
-                    return pattern.lower() in val.lower()
-            if "$exists" in condition:
-                exists = condition["$exists"]
-                has_value = value is not None
-                return (has_value and exists) or ((not has_value) and (not exists))
-            if "$ne" in condition:
-                return value != condition["$ne"]
-            if "$in" in condition and isinstance(condition["$in"], list):
-                return value in condition["$in"]
-        return value == condition
-
-    def _matches(self, doc, filter_dict):
-        if not filter_dict:
-            return True
-        for key, expected in filter_dict.items():
+    def _text_search_sync(self, connection, terms, limit):
+        match = " ".join(f'"{term}"*' for term in terms)
+        rows = connection.execute(
+            f"SELECT c.doc FROM {self.text_table} t JOIN {self.table} c ON c.seq = t.rowid "
+            f"WHERE {self.text_table} MATCH ? ORDER BY t.rank LIMIT ?",
+            (match, limit),
+        )
+        return [json.loads(row[0]) for row in rows]
+
+    async def text_search(self, query: str, limit: int = 20, projection=None):
+        """Same contract as SimpleCollection.text_search; ranked by FTS5's bm25."""
+        if self._text_fields is None:
+            raise ValueError("Collection has no text index")
+        terms = list(dict.fromkeys(search_terms(query)))
+        if not terms or limit <= 0:
+            return []
+        results = await self._database._read(self._text_search_sync, terms, limit)
+        project = compile_projection(projection)
+        return [project(doc) for doc in results] if project is not None else results
+
+    def create_lookup_index(self, field: str, target: str):
+        """Lookup index as rows (field, lookup_key, target, seq) in `<name>_lookup`."""
+        self._lookup_fields[field] = target
+        if self._database.is_open:
+            self._database._run_write(self._create_lookup_table_sync)
+
+    def _create_lookup_table_sync(self, connection):
+        def exists(table):
+            return connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table.strip('"'),)).fetchone()
+
+        if not exists(self.lookup_gram_table):
+            connection.execute(
+                f"CREATE TABLE {self.lookup_gram_table} (field TEXT NOT NULL, gram TEXT NOT NULL, key TEXT NOT NULL, "
+                "PRIMARY KEY (field, gram, key)) WITHOUT ROWID"
+            )
+            if exists(self.lookup_table):
+                # Lookup table from before the trigram table
+                self._add_lookup_grams_sync(connection, connection.execute(
+                    f"SELECT DISTINCT field, key FROM {self.lookup_table}"
+                ).fetchall())
+        if exists(self.lookup_table):
+            return
+        connection.execute(f"CREATE TABLE {self.lookup_table} (field TEXT NOT NULL, key TEXT NOT NULL, target, seq INTEGER NOT NULL)")
+        connection.execute(f'CREATE INDEX "{self.name}_lookup_key" ON {self.lookup_table} (field, key)')
+        connection.execute(f'CREATE INDEX "{self.name}_lookup_seq" ON {self.lookup_table} (seq)')
+        rows = connection.execute(f"SELECT seq, doc FROM {self.table}").fetchall()
+        self._add_lookup_rows_sync(connection, [row for seq, doc in rows for row in self._lookup_rows(seq, json.loads(doc))])
+
+    def _lookup_rows(self, seq: int, doc):
+        rows = []
+        for field, target in self._lookup_fields.items():
+            value, target_value = doc.get(field), doc.get(target)
+            if value is None or target_value is None:
+                continue
+            key = lookup_key(value)
+            if key:
+                rows.append((field, key, target_value, seq))
+        return rows
+
+    def _add_lookup_grams_sync(self, connection, field_keys):
+        connection.executemany(
+            f"INSERT OR IGNORE INTO {self.lookup_gram_table} (field, gram, key) VALUES (?, ?, ?)",
+            [(field, gram, key) for field, key in set(field_keys) for gram in key_trigrams(key)],
+        )
+
+    def _add_lookup_rows_sync(self, connection, rows):
+        connection.executemany(f"INSERT INTO {self.lookup_table} (field, key, target, seq) VALUES (?, ?, ?, ?)", rows)
+        self._add_lookup_grams_sync(connection, [(field, key) for field, key, _, _ in rows])
+
+    def _remove_lookup_rows_sync(self, connection, seqs):
+        removed = set()
+        for seq in seqs:
+            removed.update(connection.execute(f"SELECT field, key FROM {self.lookup_table} WHERE seq = ?", (seq,)))
+        connection.executemany(f"DELETE FROM {self.lookup_table} WHERE seq = ?", [(seq,) for seq in seqs])
+        # Trigrams go with the last row of their key
+        for field, key in removed:
+            if connection.execute(
+                f"SELECT 1 FROM {self.lookup_table} WHERE field = ? AND key = ? LIMIT 1", (field, key)
+            ).fetchone() is None:
+                connection.executemany(
+                    f"DELETE FROM {self.lookup_gram_table} WHERE field = ? AND gram = ? AND key = ?",
+                    [(field, gram, key) for gram in key_trigrams(key)],
+                )
+
+    def _reindex_lookup_sync(self, connection, seq: int, doc):
+        self._remove_lookup_rows_sync(connection, [seq])
+        if doc is not None:
+            self._add_lookup_rows_sync(connection, self._lookup_rows(seq, doc))
+
+    def _lookup_sync(self, connection, field, needle, match):
+        if match == "exact":
+            condition, params = "key = ?", [needle]
+        elif match == "prefix":
+            # chr(0x10FFFF) sorts after every other character in SQLite's BINARY collation
+            condition, params = "key >= ? AND key < ?", [needle, needle + "\U0010ffff"]
+        elif match == "contains":
+            condition, params = "instr(key, ?) > 0", [needle]
+            grams = sorted(key_trigrams(needle))
+            if grams:
+                # Only keys having every trigram of the needle are checked
+                candidates = " INTERSECT ".join(
+                    f"SELECT key FROM {self.lookup_gram_table} WHERE field = ? AND gram = ?" for _ in grams
+                )
+                condition = f"key IN ({candidates}) AND {condition}"
+                params = [value for gram in grams for value in (field, gram)] + params
+        else:
+            raise ValueError(f"Unsupported lookup match: {match!r}")
+        rows = connection.execute(
+            f"SELECT DISTINCT target FROM {self.lookup_table} WHERE field = ? AND {condition}", [field] + params
+        )
+        return {row[0] for row in rows}
+
+    async def lookup(self, field: str, term, match: str = "prefix") -> set:
+        """Same contract as SimpleCollection.lookup."""
+        if field not in self._lookup_fields:
+            raise ValueError(f"No lookup index on '{field}'")
+        needle = lookup_key(term)
+        if not needle:
+            return set()
+        return await self._database._read(self._lookup_sync, field, needle, match)
+
+    # --- filter translation -------------------------------------------------
+
+    def _value_sql(self, field: str, params: list) -> str:
+        if field in self._indexes:
+            return self._column_name(field)
+        params.append(_json_path(field))
+        return "json_extract(doc, ?)"
+
+    def _condition_sql(self, field: str, condition) -> Optional[Tuple[str, list]]:
+        """SQL for one field condition, or None when it has to be checked in Python."""
+        params: list = []
+        if not isinstance(condition, dict):
+            if condition is None:
+                return f"{self._value_sql(field, params)} IS NULL", params
+            if not isinstance(condition, _SQL_SCALARS):
+                return None
+            value = self._value_sql(field, params)
+            params.append(condition)
+            if isinstance(condition, str):
+                # json_extract returns objects/arrays as JSON text too
+                params.append(_json_path(field))
+                return f"{value} = ? AND json_type(doc, ?) = 'text'", params
+            return f"{value} = ?", params
+        # Every operator has to hold, as in _compile_condition
+        parts = []
+        if "$regex" in condition:
+            part_params = [str(condition.get("$regex", "")), str(condition.get("$options", ""))]
+            parts.append((f"deg_regexp(?, ?, {self._value_sql(field, part_params)})", part_params))
+        if "$exists" in condition:
+            part_params = []
+            value = self._value_sql(field, part_params)
+            parts.append((f"{value} IS {'NOT ' if condition['$exists'] else ''}NULL", part_params))
+        if "$ne" in condition:
+            unexpected = condition["$ne"]
+            if unexpected is not None and not isinstance(unexpected, _SQL_SCALARS):
+                return None
+            part_params = []
+            value = self._value_sql(field, part_params)
+            part_params.append(unexpected)
+            parts.append((f"{value} IS NOT ?", part_params))
+        if "$in" in condition and isinstance(condition["$in"], list):
+            choices = condition["$in"]
+            if not all(choice is None or isinstance(choice, _SQL_SCALARS) for choice in choices):
+                return None
+            part_params = []
+            scalars = [choice for choice in choices if choice is not None]
+            alternatives = []
+            if scalars:
+                alternatives.append(f"{self._value_sql(field, part_params)} IN ({', '.join('?' * len(scalars))})")
+                part_params.extend(scalars)
+            if len(scalars) < len(choices):
+                alternatives.append(f"{self._value_sql(field, part_params)} IS NULL")
+            parts.append(((f"({' OR '.join(alternatives)})" if alternatives else "0"), part_params))
+        comparisons = [(op, condition[op]) for op in _SQL_RANGE if op in condition]
+        if comparisons:
+            clauses, part_params = [], []
+            for op, bound in comparisons:
+                if isinstance(bound, bool) or not isinstance(bound, (str, int, float)):
+                    return None
+                # Python raises TypeError (-> no match) across types; SQLite would order them
+                clauses.append(f"{self._value_sql(field, part_params)} {_SQL_RANGE[op]} ?")
+                part_params.append(bound)
+                if isinstance(bound, str):
+                    clauses.append("json_type(doc, ?) = 'text'")
+                    part_params.append(_json_path(field))
+                else:
+                    clauses.append(f"typeof({self._value_sql(field, part_params)}) IN ('integer', 'real')")
+            parts.append((" AND ".join(clauses), part_params))
+        if not parts:
+            return None
+        for _, part_params in parts:
+            params.extend(part_params)
+        return " AND ".join(sql for sql, _ in parts), params
+
+    def _translate(self, filter_dict) -> Tuple[str, list, Dict[str, Any]]:
+        """Split a filter into (SQL WHERE clause, parameters, residual filter for Python)."""
+        clauses, params, residual = [], [], {}
+        for key, expected in (filter_dict or {}).items():
             if key == "$or" and isinstance(expected, list):
-                if any(self._matches(doc, sub) for sub in expected):
-                    return True
-                return False
-            # Nested field support like "persoenliche_daten.geburtsdatum"
-            parts = key.split(".")
-            current = doc
-            for part in parts:
-                if isinstance(current, dict) and part in current:
-                    current = current[part]
+                branches = [self._translate(sub or {}) for sub in expected]
+                if not branches or any(branch[2] for branch in branches):
+                    residual[key] = expected
+                    continue
+                clauses.append("(" + " OR ".join(f"({where or '1'})" for where, _, _ in branches) + ")")
+                for _, branch_params, _ in branches:
+                    params.extend(branch_params)
+                continue
+            if key == "$and" and isinstance(expected, list):
+                # A conjunction splits cleanly: SQL for what translates, the rest stays residual
+                branches = [self._translate(sub or {}) for sub in expected]
+                for where, branch_params, _ in branches:
+                    if where:
+                        clauses.append(f"({where})")
+                        params.extend(branch_params)
+                residuals = [branch[2] for branch in branches if branch[2]]
+                if residuals:
+                    residual[key] = residuals
+                continue
+            translated = self._condition_sql(key, expected)
+            if translated is None:
+                residual[key] = expected
+                continue
+            clauses.append(translated[0])
+            params.extend(translated[1])
+        return " AND ".join(clauses), params, residual
+
+    def _order_by(self, sort) -> Tuple[str, list]:
+        if not sort:
+            return "seq", []
+        params: list = []
+        terms = [f"{self._value_sql(field, params)} {'DESC' if direction == -1 else 'ASC'}" for field, direction in sort]
+        return ", ".join(terms + ["seq"]), params
+
+    # --- reads --------------------------------------------------------------
+
+    def find(self, filter_dict=None, projection=None):
+        return SQLiteQuery(self, filter_dict, projection)
+
+    async def find_one(self, filter_dict, projection=None):
+        results = await self.find(filter_dict, projection).limit(1).to_list(length=None)
+        return results[0] if results else None
+
+    def _count_sync(self, connection, filter_dict):
+        where, params, residual = self._translate(filter_dict)
+        sql_where = f" WHERE {where}" if where else ""
+        if not residual:
+            return connection.execute(f"SELECT count(*) FROM {self.table}{sql_where}", params).fetchone()[0]
+        matches = compile_filter(residual)
+        rows = connection.execute(f"SELECT doc FROM {self.table}{sql_where}", params)
+        return sum(1 for row in rows if matches(json.loads(row[0])))
+
+    async def count_documents(self, filter_dict):
+        return await self._database._read(self._count_sync, filter_dict)
+
+    def _group_count_sync(self, connection, field):
+        params: list = []
+        value = self._value_sql(field, params) if field else "NULL"
+        rows = connection.execute(f"SELECT {value}, count(*) FROM {self.table} GROUP BY 1", params)
+        return [{"_id": key, "count": count} for key, count in rows]
+
+    async def aggregate(self, pipeline):
+        # Same subset as SimpleCollection: [{"$group": {"_id": "$field", "count": {"$sum": 1}}}]
+        if not pipeline or "$group" not in pipeline[0]:
+            return SimpleQuery([])
+        field_expr = pipeline[0]["$group"].get("_id", None)
+        field = field_expr[1:] if isinstance(field_expr, str) and field_expr.startswith("$") else None
+        return SimpleQuery(await self._database._read(self._group_count_sync, field))
+
+    def _batch_sync(self, connection, filter_dict, after_seq, batch_size):
+        where, params, residual = self._translate(filter_dict)
+        sql = f"SELECT seq, doc FROM {self.table} WHERE seq > ?" + (f" AND {where}" if where else "")
+        rows = connection.execute(sql + " ORDER BY seq LIMIT ?", [after_seq] + params + [batch_size]).fetchall()
+        if not rows:
+            return None, []
+        matches = compile_filter(residual)
+        docs = [doc for doc in (json.loads(row[1]) for row in rows) if matches(doc)]
+        return rows[-1][0], docs
+
+    async def scan_batches(self, filter_dict=None, batch_size: int = 1000):
+        """Keyset scan over seq: every batch is one short read transaction."""
+        after_seq = 0
+        while True:
+            after_seq, batch = await self._database._read(self._batch_sync, filter_dict, after_seq, batch_size)
+            if after_seq is None:
+                return
+            if batch:
+                yield batch
+
+    # --- writes (run on the single writer connection, one transaction per call) ----------
+
+    def _insert_sync(self, connection, document_dict) -> int:
+        try:
+            cursor = connection.execute(f"INSERT INTO {self.table} (doc) VALUES (?)", (_dump_json(document_dict),))
+        except sqlite3.IntegrityError as e:
+            if not _is_unique_violation(e):
+                raise
+            raise DuplicateKeyError(str(e)) from e
+        if self._text_fields is not None:
+            connection.execute(
+                f"INSERT INTO {self.text_table} (rowid, tokens) VALUES (?, ?)",
+                (cursor.lastrowid, self._text_row(document_dict)),
+            )
+        if self._lookup_fields:
+            self._add_lookup_rows_sync(connection, self._lookup_rows(cursor.lastrowid, document_dict))
+        return 1
+
+    def _matching_seqs_sync(self, connection, filter_dict, multi: bool) -> List[int]:
+        where, params, residual = self._translate(filter_dict)
+        sql_where = f" WHERE {where}" if where else ""
+        if not residual:
+            limit = "" if multi else " LIMIT 1"
+            return [row[0] for row in connection.execute(f"SELECT seq FROM {self.table}{sql_where} ORDER BY seq{limit}", params)]
+        matches = compile_filter(residual)
+        seqs = []
+        for seq, doc in connection.execute(f"SELECT seq, doc FROM {self.table}{sql_where} ORDER BY seq", params):
+            if matches(json.loads(doc)):
+                seqs.append(seq)
+                if not multi:
+                    break
+        return seqs
+
+    def _update_sync(self, connection, filter_dict, update_dict, multi: bool) -> int:
+        changes, removed = split_update(update_dict)
+        seqs = self._matching_seqs_sync(connection, filter_dict, multi)
+        if not changes and not removed:
+            return len(seqs)
+        # Top-level keys are set literally (a dotted key is one key), as in SimpleCollection
+        doc_sql, params = "doc", []
+        if changes:
+            doc_sql = f"json_set(doc, {', '.join('?, json(?)' for _ in changes)})"
+            for key, value in changes.items():
+                params.extend([_json_key_path(key), _dump_json(value)])
+        if removed:
+            doc_sql = f"json_remove({doc_sql}, {', '.join('?' for _ in removed)})"
+            params.extend(_json_key_path(key) for key in removed)
+        touched = changes.keys() | set(removed)
+        for seq in seqs:
+            try:
+                connection.execute(f"UPDATE {self.table} SET doc = {doc_sql} WHERE seq = ?", params + [seq])
+            except sqlite3.IntegrityError as e:
+                if not _is_unique_violation(e):
+                    raise
+                raise DuplicateKeyError(str(e)) from e
+            if self._text_fields is not None and any(key in touched for key in self._text_fields):
+                self._reindex_text_sync(connection, seq)
+            if any(key in touched for key in self._lookup_fields) or any(
+                target in touched for target in self._lookup_fields.values()
+            ):
+                row = connection.execute(f"SELECT doc FROM {self.table} WHERE seq = ?", (seq,)).fetchone()
+                self._reindex_lookup_sync(connection, seq, json.loads(row[0]) if row else None)
+        return len(seqs)
+
+    def _delete_sync(self, connection, filter_dict, multi: bool) -> int:
+        seqs = self._matching_seqs_sync(connection, filter_dict, multi)
+        connection.executemany(f"DELETE FROM {self.table} WHERE seq = ?", [(seq,) for seq in seqs])
+        if self._text_fields is not None:
+            connection.executemany(f"DELETE FROM {self.text_table} WHERE rowid = ?", [(seq,) for seq in seqs])
+        if self._lookup_fields:
+            self._remove_lookup_rows_sync(connection, seqs)
+        return len(seqs)
+
+    def _bulk_write_sync(self, connection, requests, ordered: bool):
+        result = SimpleResult()
+        write_errors = []
+        for index, request in enumerate(requests):
+            op = next(iter(request), None) if isinstance(request, dict) and len(request) == 1 else None
+            try:
+                args = request[op] if op else None
+                if op == "insert_one":
+                    result.inserted_count += self._insert_sync(connection, args["document"])
+                elif op in ("update_one", "update_many"):
+                    count = self._update_sync(connection, args["filter"], args["update"], op == "update_many")
+                    result.matched_count += count
+                    result.modified_count += count
+                elif op in ("delete_one", "delete_many"):
+                    result.deleted_count += self._delete_sync(connection, args["filter"], op == "delete_many")
                 else:
-                    current = None
+                    raise ValueError(f"Unsupported bulk operation: {request!r}")
+            except (DuplicateKeyError, KeyError, ValueError, TypeError) as exc:
+                write_errors.append({"index": index, "op": op, "errmsg": str(exc)})
+                if ordered:
                     break
-            if isinstance(expected, dict):
-                if not self._match_condition(current, expected):
-                    return False
-            else:
-                if current != expected:
-                    return False
-        return True
-
-    async def find(self, filter_dict=None, projection=None):
-        data = [d for d in self._docs if self._matches(d, filter_dict or {})]
-        return SimpleQuery(data)
+        return result, write_errors
 
-    async def find_one(self, filter_dict):
-        for d in self._docs:
-            if self._matches(d, filter_dict or {}):
-                return d
-        return None
+    async def _write(self, fn, *args):
+        try:
+            return await self._database._write(fn, *args)
+        finally:
+            # Failed calls count too: a spurious bump only costs derived caches a rebuild
+            self.version += 1
 
     async def insert_one(self, document_dict):
-        self._docs.append(dict(document_dict))
-        return SimpleResult(matched_count=1, modified_count=1)
+        await self._write(self._insert_sync, document_dict)
+        return SimpleResult(matched_count=1, modified_count=1, inserted_count=1)
+
+    async def insert_many(self, documents, ordered: bool = True):
+        return await self.bulk_write([{"insert_one": {"document": doc}} for doc in documents], ordered=ordered)
 
     async def update_one(self, filter_dict, update_dict):
-        for idx, d in enumerate(self._docs):
-            if self._matches(d, filter_dict or {}):
-                if "$set" in update_dict and isinstance(update_dict["$set"], dict):
-                    self._docs[idx] = {**d, **update_dict["$set"]}
-                else:
-                    # Full replacement
-                    self._docs[idx] = {**d, **update_dict}
-                return SimpleResult(matched_count=1, modified_count=1)
-        return SimpleResult(matched_count=0, modified_count=0)
+        count = await self._write(self._update_sync, filter_dict, update_dict, False)
+        return SimpleResult(matched_count=count, modified_count=count)
+
+    async def update_many(self, filter_dict, update_dict):
+        count = await self._write(self._update_sync, filter_dict, update_dict, True)
+        return SimpleResult(matched_count=count, modified_count=count)
 
     async def delete_one(self, filter_dict):
-        for idx, d in enumerate(self._docs):
-            if self._matches(d, filter_dict or {}):
-                self._docs.pop(idx)
-                return SimpleResult(deleted_count=1)
-        return SimpleResult(deleted_count=0)
+        return SimpleResult(deleted_count=await self._write(self._delete_sync, filter_dict, False))
+
+    async def delete_many(self, filter_dict):
+        return SimpleResult(deleted_count=await self._write(self._delete_sync, filter_dict, True))
+
+    async def bulk_write(self, requests, ordered: bool = True):
+        """Same contract as SimpleCollection.bulk_write; the batch commits as one transaction."""
+        result, write_errors = await self._write(self._bulk_write_sync, list(requests), ordered)
+        if write_errors:
+            raise BulkWriteError({
+                "writeErrors": write_errors,
+                "nInserted": result.inserted_count,
+                "nMatched": result.matched_count,
+                "nModified": result.modified_count,
+                "nRemoved": result.deleted_count,
+            })
+        return result
+
+
+class SQLiteDB:
+    """
+    Durable single-node engine: one SQLite file in WAL mode. sqlite3 is blocking, so
+    reads run on a small thread pool (one connection per thread, readers don't block
+    the writer in WAL mode) and writes on a single writer thread, each call in its own
+    transaction. Selected with DB_ENGINE=sqlite; the file is DB_SQLITE_PATH.
+    """
 
-    async def count_documents(self, filter_dict):
-        return len([d for d in self._docs if self._matches(d, filter_dict or {})])
+    def __init__(self, path: Path, pool_size: int = 4, synchronous: str = "NORMAL"):
+        self.path = Path(path)
+        self.pool_size = max(pool_size, 1)
+        self.synchronous = synchronous
+        self.kunden = SQLiteCollection(self, "kunden")
+        self.vertraege = SQLiteCollection(self, "vertraege")
+        self.vus = SQLiteCollection(self, "vus")
+        self.documents = SQLiteCollection(self, "documents")
+        self.jobs = SQLiteCollection(self, "jobs")
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        collections = self.collections()
+        for name, field, options in DEFAULT_INDEXES:
+            collections[name].create_index(field, **options)
+        for name, fields in DEFAULT_TEXT_INDEXES:
+            collections[name].create_text_index(fields)
+        for name, field, target in DEFAULT_LOOKUP_INDEXES:
+            collections[name].create_lookup_index(field, target)
+
+    def collections(self) -> Dict[str, SQLiteCollection]:
+        return {
+            "kunden": self.kunden,
+            "vertraege": self.vertraege,
+            "vus": self.vus,
+            "documents": self.documents,
+            "jobs": self.jobs,
+        }
 
-    async def aggregate(self, pipeline):
-        # Very limited support: [{"$group": {"_id": "$field", "count": {"$sum": 1}}}]
-        if not pipeline:
-            return []
-        stage = pipeline[0]
-        if "$group" in stage:
-            group = stage["$group"]
-            field_expr = group.get("_id", None)
-            if isinstance(field_expr, str) and field_expr.startswith("$"):
-                field = field_expr[1:]
-            else:
-                field = None
-            buckets = {}
-            for d in self._docs:
-                key = d.get(field) if field else None
-                buckets[key] = buckets.get(key, 0) + 1
-            results = [{"_id": k, "count": v} for k, v in buckets.items()]
-            return SimpleQuery(results)
-        return SimpleQuery([])
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        connection.execute("PRAGMA busy_timeout=5000")
+        connection.create_function("deg_regexp", 3, _sql_regexp, deterministic=True)
+        return connection
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    def _run_read(self, fn, *args):
+        return fn(self._thread_connection(), *args)
+
+    def _run_write(self, fn, *args):
+        connection = self._thread_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(connection, *args)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def _ensure_open(self):
+        """Create the executors and the schema on first use (open() or the first query)."""
+        with self._connections_lock:
+            if self._writer is not None:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = self._connect()
+            try:
+                for collection in self.collections().values():
+                    collection._create_schema(connection)
+            finally:
+                connection.close()
+            self._readers = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="sqlite-read")
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-write")
+
+    async def _read(self, fn, *args):
+        self._ensure_open()
+        return await asyncio.get_running_loop().run_in_executor(self._readers, self._run_read, fn, *args)
+
+    async def _write(self, fn, *args):
+        self._ensure_open()
+        return await asyncio.get_running_loop().run_in_executor(self._writer, self._run_write, fn, *args)
+
+    async def open(self):
+        await asyncio.to_thread(self._ensure_open)
+        counts = {name: await collection.count_documents({}) for name, collection in self.collections().items()}
+        logger.info(f"Opened SQLite database {self.path}: {counts}")
+
+    async def close(self):
+        if not self.is_open:
+            return
+        readers, writer = self._readers, self._writer
+        self._readers = self._writer = None
+        await asyncio.to_thread(readers.shutdown, True)
+        await asyncio.to_thread(writer.shutdown, True)
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+
+
+def create_database() -> Database:
+    """Build the storage engine selected by DB_ENGINE (`memory`, the default, or `sqlite`)."""
+    engine = os.environ.get("DB_ENGINE", "memory").lower()
+    if engine == "sqlite":
+        return SQLiteDB(
+            sqlite_path(),
+            pool_size=int(os.environ.get("DB_SQLITE_POOL_SIZE", "4")),
+            synchronous=os.environ.get("DB_SQLITE_SYNCHRONOUS", "NORMAL").upper(),
+        )
+    if engine != "memory":
+        raise RuntimeError(f"Unknown DB_ENGINE {engine!r} (expected 'memory' or 'sqlite')")
+    return InMemoryDB()
 
 
-class InMemoryDB:
-    def __init__(self):
-        self.kunden = SimpleCollection()
-        self.vertraege = SimpleCollection()
-        self.vus = SimpleCollection()
-        self.documents = SimpleCollection()
+def sqlite_path() -> Path:
+    if os.environ.get("DB_SQLITE_PATH"):
+        return Path(os.environ["DB_SQLITE_PATH"])
+    return Path(os.environ.get("DB_DATA_DIR") or ROOT_DIR / "data") / "deg-mvp.sqlite3"
+
+
+db: Database = create_database()
+
+
+# ------------------------------
+# Content-addressed blob store for document files
+# ------------------------------
+
+class BlobStore:
+    """
+    Document file bytes on local disk, keyed by their SHA-256 (`<root>/ab/abcdef...`).
+    Identical files uploaded for different customers are stored once; document
+    records only keep the hash, size and mime type.
+
+    Since blobs are shared, storing one and deleting it are serialized per hash: `store`
+    and `store_stream` hold the hash's lock until their block exits, so the referencing
+    record is inserted before a concurrent `release` can count references and unlink.
+    When the block fails (validation, insert), they delete the blob again unless
+    `referenced` reports a reference.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        # content hash -> [lock, number of holders and waiters]
+        self._locks: Dict[str, list] = {}
+
+    def path(self, content_hash: str) -> Path:
+        if not re.fullmatch(r"[0-9a-f]{64}", content_hash or ""):
+            raise ValueError(f"Invalid content hash: {content_hash!r}")
+        return self.root / content_hash[:2] / content_hash
+
+    def exists(self, content_hash: str) -> bool:
+        return self.path(content_hash).exists()
+
+    CHUNK_SIZE = 256 * 1024
+    SNIFF_SIZE = 512
+
+    def _open_tmp(self):
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        return open(tmp_dir / f"{uuid.uuid4().hex}.tmp", "wb")
+
+    def _commit(self, f, content_hash: str):
+        """Fsync and move a finished temp file into place (or drop it if the blob already exists)."""
+        tmp_path = Path(f.name)
+        try:
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+            path = self.path(content_hash)
+            if path.exists():
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+
+    def _write(self, content: bytes, content_hash: str):
+        if self.exists(content_hash):
+            return
+        f = self._open_tmp()
+        f.write(content)
+        self._commit(f, content_hash)
+
+    @asynccontextmanager
+    async def _locked(self, content_hash: str):
+        entry = self._locks.get(content_hash)
+        if entry is None:
+            entry = self._locks[content_hash] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[content_hash]
+
+    async def _discard_unreferenced(self, content_hash: str, referenced):
+        if referenced is not None and not await referenced(content_hash):
+            self.delete(content_hash)
+
+    @asynccontextmanager
+    async def store(self, content: bytes, referenced=None):
+        """Store `content` (deduplicated) and yield its SHA-256 hex digest, holding the hash's lock."""
+        content_hash = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        async with self._locked(content_hash):
+            await asyncio.to_thread(self._write, content, content_hash)
+            try:
+                yield content_hash
+            except Exception:
+                await self._discard_unreferenced(content_hash, referenced)
+                raise
+
+    @asynccontextmanager
+    async def store_stream(self, source, referenced=None):
+        """
+        Copy an UploadFile (anything with `async read(n)`) into the store in
+        CHUNK_SIZE pieces, hashing as it goes, and yield (sha256, size, first bytes
+        for mime sniffing) while holding the hash's lock; memory use does not depend
+        on the file size. For uploads this is a second copy: Starlette has already
+        spooled the multipart part (in memory up to 1 MiB, then to a temp file).
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        head = b""
+        f = await asyncio.to_thread(self._open_tmp)
+        try:
+            while True:
+                chunk = await source.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < self.SNIFF_SIZE:
+                    head += chunk[:self.SNIFF_SIZE - len(head)]
+                hasher.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            f.close()
+            Path(f.name).unlink(missing_ok=True)
+            raise
+        content_hash = hasher.hexdigest()
+        async with self._locked(content_hash):
+            await asyncio.to_thread(self._commit, f, content_hash)
+            try:
+                yield content_hash, size, head
+            except Exception:
+                await self._discard_unreferenced(content_hash, referenced)
+                raise
+
+    async def put(self, content: bytes) -> str:
+        """Store `content` (deduplicated) and return its SHA-256 hex digest."""
+        async with self.store(content) as content_hash:
+            return content_hash
+
+    async def release(self, content_hash: str, referenced) -> bool:
+        """Delete the blob unless `await referenced(content_hash)`; returns whether it was deleted."""
+        async with self._locked(content_hash):
+            if await referenced(content_hash):
+                return False
+            self.delete(content_hash)
+            return True
+
+    def delete(self, content_hash: str):
+        self.path(content_hash).unlink(missing_ok=True)
 
 
-db = InMemoryDB()
+def _default_blob_dir() -> Path:
+    if os.environ.get("BLOB_STORE_DIR"):
+        return Path(os.environ["BLOB_STORE_DIR"])
+    if os.environ.get("DB_DATA_DIR"):
+        return Path(os.environ["DB_DATA_DIR"]) / "blobs"
+    if isinstance(db, SQLiteDB):
+        return sqlite_path().parent / "blobs"
+    # Pure in-memory mode: blobs are as temporary as the records that point at them
+    return Path(tempfile.gettempdir()) / "deg-mvp-blobs"
+
+
+blob_store = BlobStore(_default_blob_dir())
 
 # Enums for specific fields
 class Anrede(str, Enum):
@@ -241,7 +3587,8 @@ class Document(BaseModel):
     mime_type: Optional[str] = None
     description: Optional[str] = None
     tags: List[str] = []
-    file_content: Optional[str] = None  # Base64 encoded file content
+    file_content: Optional[str] = None  # Legacy inline Base64 content; new uploads live in the blob store
+    content_hash: Optional[str] = None  # SHA-256 of the file in the blob store
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -447,6 +3794,35 @@ class VUCreate(BaseModel):
     bemerkung: Optional[str] = None
 
 
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: str  # z.B. "vu_migration"
+    status: JobStatus = JobStatus.QUEUED
+    priority: int = 0  # Höhere Priorität startet zuerst
+    params: Dict[str, Any] = {}
+    progress: Dict[str, Any] = {}
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class JobCreate(BaseModel):
+    type: str
+    params: Dict[str, Any] = {}
+    priority: Optional[int] = None
+
+
 # Helper functions for VU ID generation
 def generate_vu_internal_id():
     """Generate internal VU ID in format VU-XXX (e.g., VU-001, VU-002)"""
@@ -472,44 +3848,292 @@ async def get_next_vu_internal_id():
     return f"VU-{str(next_id).zfill(3)}"
 
 
+# Legal-form suffixes ignored when matching company names, as token sequences
+LEGAL_FORM_SUFFIXES = [
+    ("vvag",), ("v", "v", "a", "g"), ("a", "g"), ("ag",), ("se",), ("kgaa",), ("gmbh",),
+    ("mbh",), ("kg",), ("eg",), ("e", "v"), ("ev",), ("co",), ("aktiengesellschaft",),
+]
+
+
+@functools.lru_cache(maxsize=4096)
+def vu_match_key(name) -> str:
+    """
+    Normalized company name for VU matching: search-folded words, trailing legal forms
+    dropped ("Allianz Versicherungs-AG" -> "allianz versicherungs",
+    "HUK-COBURG VVaG" -> "huk coburg").
+    """
+    if not name:
+        return ""
+    words = _WORD_PARTS.findall(normalize_search_text(name))
+    stripped = True
+    while stripped:
+        stripped = False
+        for suffix in LEGAL_FORM_SUFFIXES:
+            if len(words) > len(suffix) and tuple(words[-len(suffix):]) == suffix:
+                del words[-len(suffix):]
+                stripped = True
+                break
+    return " ".join(words)
+
+
+class AhoCorasick:
+    """Multi-pattern substring search: one pass over the text reports every pattern it contains."""
+
+    def __init__(self, patterns: Dict[str, Any]):
+        # Trie as a list of {char: node}; node 0 is the root
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail = [0]
+        self._out: List[List[Any]] = [[]]
+        for pattern, payload in patterns.items():
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(payload)
+        # Failure links breadth-first: longest proper suffix that is also a trie path
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def search(self, text: str):
+        """Yield the payload of every pattern occurrence in `text`."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                yield from out[node]
+
+
+def trigrams(key: str) -> set:
+    """Trigrams of a normalized name, pg_trgm style: each word padded as "  word "."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    Similarity search over normalized names: trigram -> entry ids. Scores are the
+    weighted Jaccard similarity of the trigram sets, each trigram weighted by its
+    inverse document frequency, so words every insurer has ("versicherung") count
+    little and the distinctive part of a name decides.
+    """
+
+    def __init__(self, entries: List[Tuple[str, Any]]):
+        self._payloads = [payload for _, payload in entries]
+        grams_per_entry = [trigrams(key) for key, _ in entries]
+        self._postings: Dict[str, List[int]] = {}
+        for entry, grams in enumerate(grams_per_entry):
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(entry)
+        count = len(entries)
+        self._weights = {gram: math.log(1 + count / len(posting)) for gram, posting in self._postings.items()}
+        # Trigrams no entry has weigh as much as the rarest possible one
+        self._unseen_weight = math.log(1 + count) if count else 1.0
+        self._totals = [sum(self._weights[gram] for gram in grams) for grams in grams_per_entry]
+
+    def search(self, key: str, threshold: float = 0.0):
+        """Yield (score, payload) with score >= threshold, best first (ties in entry order)."""
+        grams = trigrams(key)
+        if not grams:
+            return
+        weights = self._weights
+        shared: Dict[int, float] = {}
+        total = 0.0
+        for gram in grams:
+            weight = weights.get(gram)
+            if weight is None:
+                total += self._unseen_weight
+                continue
+            total += weight
+            for entry in self._postings[gram]:
+                shared[entry] = shared.get(entry, 0.0) + weight
+        totals = self._totals
+        scored = []
+        for entry, common in shared.items():
+            score = common / (total + totals[entry] - common)
+            if score >= threshold:
+                scored.append((-score, entry))
+        scored.sort()
+        for negative_score, entry in scored:
+            yield -negative_score, self._payloads[entry]
+
+
+# Minimum trigram similarity for the fuzzy fallback of find_matching_vu
+VU_FUZZY_THRESHOLD = float(os.environ.get("VU_FUZZY_THRESHOLD", "0.5"))
+# Distinct Gesellschaft spellings whose resolution VUMatcher remembers
+VU_MATCH_CACHE_SIZE = int(os.environ.get("VU_MATCH_CACHE_SIZE", "10000"))
+
+
+class VUMatcher:
+    """
+    Precompiled matcher for `find_matching_vu` over the normalized names (`vu_match_key`)
+    of all VUs. Rebuilt from the collection when its `version` changes, i.e. after any
+    VU write; between writes a match is a few dict lookups, one `str.find` and one
+    Aho–Corasick pass, with the precedence of the original four queries:
+    exact name, exact Kurzbezeichnung, name contains the input, input contains a
+    name or Kurzbezeichnung. Ties go to the VU that comes first in the collection.
+    The rebuild is full rather than incremental: "first in the collection" positions,
+    the joined names and the Aho–Corasick automaton all depend on every VU, VUs are a
+    small master table (about 20 ms for 1000) and they change rarely, by hand.
+    A trigram index over the same keys ranks fuzzy candidates (`candidates`) and serves
+    as fifth strategy ("fuzzy") above `fuzzy_threshold`.
+
+    Resolutions, including "no match", are memoized per normalized name in an LRU, so a
+    feed with a few hundred spellings resolves each once; the cache is dropped with the
+    compiled structures whenever a VU changes. `cache_stats()` reports hits and misses.
+    """
+
+    def __init__(self, collection: DocumentCollection):
+        self._collection = collection
+        self._version: Optional[int] = None
+        self._vus: List[Dict[str, Any]] = []
+        self._by_name: Dict[str, int] = {}
+        self._by_kurz: Dict[str, int] = {}
+        # Name keys joined by "\n" (never part of a key) with their start offsets
+        self._names = ""
+        self._starts: List[int] = []
+        self._reverse = AhoCorasick({})
+        self._similar = TrigramIndex([])
+        self.fuzzy_threshold = VU_FUZZY_THRESHOLD
+        # normalized name -> (VU position or None, match_type)
+        self._resolved: "OrderedDict[str, Tuple[Optional[int], Optional[str]]]" = OrderedDict()
+        self.cache_size = VU_MATCH_CACHE_SIZE
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    async def _refresh(self):
+        if self._version == self._collection.version:
+            return
+        version = self._collection.version
+        vus = await self._collection.find({}).to_list(length=None)
+        by_name: Dict[str, int] = {}
+        by_kurz: Dict[str, int] = {}
+        # pattern -> (position, kind): name before Kurzbezeichnung within a VU
+        patterns: Dict[str, Tuple[int, int]] = {}
+        name_keys = []
+        for position, vu in enumerate(vus):
+            name_key = vu_match_key(vu.get("name"))
+            kurz_key = vu_match_key(vu.get("kurzbezeichnung"))
+            name_keys.append(name_key)
+            for key, index, kind in ((name_key, by_name, 0), (kurz_key, by_kurz, 1)):
+                if key:
+                    index.setdefault(key, position)
+                    if (position, kind) < patterns.get(key, (len(vus), 0)):
+                        patterns[key] = (position, kind)
+        starts, offset = [], 0
+        for key in name_keys:
+            starts.append(offset)
+            offset += len(key) + 1
+        self._vus, self._by_name, self._by_kurz = vus, by_name, by_kurz
+        self._names, self._starts = "\n".join(name_keys), starts
+        self._reverse = AhoCorasick(patterns)
+        self._similar = TrigramIndex([(key, position) for key, (position, _) in patterns.items()])
+        if self._resolved:
+            self._resolved.clear()
+            self._invalidations += 1
+        self._version = version
+
+    async def match(self, gesellschaft_name: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Return (VU document, match_type) or (None, None)."""
+        key = vu_match_key(gesellschaft_name)
+        if not key:
+            return None, None
+        await self._refresh()
+        resolved = self._resolved.get(key)
+        if resolved is not None:
+            self._hits += 1
+            self._resolved.move_to_end(key)
+        else:
+            self._misses += 1
+            resolved = self._resolve(key)
+            self._resolved[key] = resolved
+            if len(self._resolved) > self.cache_size:
+                self._resolved.popitem(last=False)
+        position, match_type = resolved
+        return (self._vus[position] if position is not None else None), match_type
+
+    def _resolve(self, key: str) -> Tuple[Optional[int], Optional[str]]:
+        position = self._by_name.get(key)
+        if position is not None:
+            return position, "exact_name"
+        position = self._by_kurz.get(key)
+        if position is not None:
+            return position, "kurzbezeichnung"
+        offset = self._names.find(key)
+        if offset >= 0:
+            return bisect_right(self._starts, offset) - 1, "partial_name"
+        best = min(self._reverse.search(key), default=None)
+        if best is not None:
+            position, kind = best
+            return position, "reverse_partial" if kind == 0 else "reverse_kurz"
+        for _, position in self._similar.search(key, self.fuzzy_threshold):
+            return position, "fuzzy"
+        return None, None
+
+    def cache_stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._resolved),
+            "max_entries": self.cache_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+            "invalidations": self._invalidations,
+            "vus_version": self._version,
+        }
+
+    async def candidates(self, gesellschaft_name: str, top_k: int = 5, threshold: float = 0.0):
+        """Up to `top_k` (VU document, similarity) pairs by trigram similarity, best first."""
+        key = vu_match_key(gesellschaft_name)
+        if not key or top_k <= 0:
+            return []
+        await self._refresh()
+        ranked = []
+        seen = set()
+        # A VU can be reached through its name and its Kurzbezeichnung; keep the better score
+        for score, position in self._similar.search(key, threshold):
+            if position in seen:
+                continue
+            seen.add(position)
+            ranked.append((self._vus[position], round(score, 3)))
+            if len(ranked) >= top_k:
+                break
+        return ranked
+
+
+vu_matcher = VUMatcher(db.vus)
+
+
 async def find_matching_vu(gesellschaft_name: str):
     """
-    Find matching VU based on gesellschaft name.
-    Returns (vu_object, match_type) or (None, None) if no match found.
+    Find matching VU based on gesellschaft name (case, umlauts, punctuation and legal
+    form ignored, see VUMatcher). Returns (vu_object, match_type) or (None, None) if no
+    match found.
     """
-    if not gesellschaft_name:
+    vu, match_type = await vu_matcher.match(gesellschaft_name)
+    if vu is None:
         return None, None
-    
-    gesellschaft_lower = gesellschaft_name.lower().strip()
-    
-    # 1. Try exact name match
-    exact_match = await db.vus.find_one({"name": {"$regex": f"^{gesellschaft_name}$", "$options": "i"}})
-    if exact_match:
-        return VU(**parse_from_mongo(exact_match)), "exact_name"
-    
-    # 2. Try kurzbezeichnung match
-    kurz_match = await db.vus.find_one({"kurzbezeichnung": {"$regex": f"^{gesellschaft_name}$", "$options": "i"}})
-    if kurz_match:
-        return VU(**parse_from_mongo(kurz_match)), "kurzbezeichnung"
-    
-    # 3. Try partial name match (contains)
-    partial_matches = await db.vus.find({"name": {"$regex": gesellschaft_name, "$options": "i"}}).to_list(length=None)
-    if partial_matches:
-        # Return first partial match
-        return VU(**parse_from_mongo(partial_matches[0])), "partial_name"
-    
-    # 4. Try reverse partial match (gesellschaft contains VU name)
-    all_vus = await db.vus.find({}).to_list(length=None)
-    for vu in all_vus:
-        vu_name_lower = vu.get('name', '').lower()
-        vu_kurz_lower = vu.get('kurzbezeichnung', '').lower()
-        
-        if vu_name_lower and vu_name_lower in gesellschaft_lower:
-            return VU(**parse_from_mongo(vu)), "reverse_partial"
-        if vu_kurz_lower and vu_kurz_lower in gesellschaft_lower:
-            return VU(**parse_from_mongo(vu)), "reverse_kurz"
-    
-    return None, None
+    return VU(**parse_from_mongo(vu)), match_type
 
 
 async def auto_assign_vu_to_contract(vertrag_data: dict):
@@ -553,6 +4177,10 @@ def prepare_for_mongo(data):
 def parse_from_mongo(item):
     """Parse date strings back to date objects from MongoDB"""
     if isinstance(item, dict):
+        # Work on a deep copy: the in-memory store hands out its own documents, and
+        # rewriting their indexed date strings in place (or a caller changing a nested
+        # value of the result) would corrupt the stored document and its indexes
+        item = dict(item)
         for key, value in item.items():
             if key in ['geburtsdatum', 'beginn', 'ablauf'] and isinstance(value, str):
                 try:
@@ -572,9 +4200,163 @@ def parse_from_mongo(item):
                     item[key] = None
             elif isinstance(value, dict):
                 item[key] = parse_from_mongo(value)
+            elif isinstance(value, list):
+                item[key] = _copy_nested(value)
     return item
 
 
+async def run_bulk_insert(collection: DocumentCollection, items: List[Dict[str, Any]], build, ordered: bool):
+    """
+    Shared implementation of the bulk create endpoints. `build(item)` validates one
+    raw item and returns the document to store, raising ValueError (Pydantic's
+    ValidationError included) for invalid input. Valid documents go to the store in
+    a single insert_many; the response reports a result per processed item. With
+    `ordered`, processing stops at the first failure, like Mongo's ordered bulk writes.
+    """
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    documents, positions = [], []
+    for index, item in enumerate(items):
+        try:
+            documents.append(await build(item))
+            positions.append(index)
+        except ValueError as e:
+            results[index] = {"index": index, "status": "error", "detail": str(e)}
+            if ordered:
+                break
+
+    write_errors = []
+    if documents:
+        try:
+            await collection.insert_many(documents, ordered=ordered)
+        except BulkWriteError as e:
+            write_errors = e.details["writeErrors"]
+    failed = {error["index"]: error["errmsg"] for error in write_errors}
+    # An ordered batch stops at its first failed write; later documents were not stored
+    stop_at = write_errors[0]["index"] if ordered and write_errors else None
+    for position, (index, document) in enumerate(zip(positions, documents)):
+        if position in failed:
+            results[index] = {"index": index, "status": "error", "detail": failed[position]}
+        elif stop_at is None or position < stop_at:
+            results[index] = {"index": index, "status": "created", "id": document["id"]}
+
+    reported = [result for result in results if result is not None]
+    created = sum(1 for result in reported if result["status"] == "created")
+    return {
+        "created": created,
+        "failed": len(reported) - created,
+        "skipped": len(items) - len(reported),
+        "results": reported,
+    }
+
+
+def make_kunde_builder(keep_kunde_id: bool = False):
+    """
+    Item builder for run_bulk_insert on `kunden`. Customer numbers are generated like
+    in create_kunde; imports pass `keep_kunde_id` so a migrated customer keeps its
+    number from the previous system when it is still free.
+    """
+    assigned_ids = set()
+
+    async def build(item):
+        kunde_dict = KundeCreate(**item).dict()
+        if not (kunde_dict.get('name') or kunde_dict.get('vorname')):
+            raise ValueError("Bitte mindestens Vorname oder Name angeben")
+        new_id = kunde_dict.get('kunde_id') if keep_kunde_id else None
+        while not new_id or new_id in assigned_ids or await db.kunden.find_one({"kunde_id": new_id}) is not None:
+            new_id = generate_kunde_id()
+        assigned_ids.add(new_id)
+        kunde_dict['kunde_id'] = new_id
+        return prepare_for_mongo(Kunde(**kunde_dict).dict())
+
+    return build
+
+
+def make_vertrag_builder(link_kunden: bool = False):
+    """
+    Item builder for run_bulk_insert on `vertraege`. VU auto-assignment runs once per
+    distinct `gesellschaft`. With `link_kunden` (imports), `kunde_id` may also be the
+    customer number (`Kunde.kunde_id`) and is resolved to the customer's `id`.
+    """
+    vu_matches: Dict[str, Optional[VU]] = {}
+    kunde_ids: Dict[str, Optional[str]] = {}
+
+    async def build(item):
+        # Dates stay date objects until the final prepare_for_mongo; one conversion per item
+        vertrag_dict = VertragCreate(**item).dict()
+        if not vertrag_dict.get('kunde_id'):
+            raise ValueError("kunde_id ist erforderlich")
+        if link_kunden:
+            reference = vertrag_dict['kunde_id']
+            if reference not in kunde_ids:
+                kunde = (await db.kunden.find_one({"id": reference})
+                         or await db.kunden.find_one({"kunde_id": reference}))
+                kunde_ids[reference] = kunde['id'] if kunde else None
+            if kunde_ids[reference] is None:
+                raise ValueError(f"Kunde {reference} nicht gefunden")
+            vertrag_dict['kunde_id'] = kunde_ids[reference]
+        gesellschaft = vertrag_dict.get('gesellschaft')
+        if not vertrag_dict.get('vu_id') and gesellschaft:
+            if gesellschaft not in vu_matches:
+                vu_matches[gesellschaft], _ = await find_matching_vu(gesellschaft)
+            matching_vu = vu_matches[gesellschaft]
+            if matching_vu:
+                vertrag_dict['vu_id'] = matching_vu.id
+                vertrag_dict['vu_internal_id'] = matching_vu.vu_internal_id
+        return prepare_for_mongo(Vertrag(**vertrag_dict).dict())
+
+    return build
+
+
+# Keyset pagination for the list endpoints: pages are ordered by (created_at, id) and
+# the opaque cursor encodes the last document's key, so the next page seeks the ordered
+# created_at index instead of skipping over everything before it.
+PAGE_SORT = [("created_at", 1), ("id", 1)]
+
+
+def encode_cursor(doc) -> str:
+    raw = _dump_json([doc.get("created_at"), doc.get("id")]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, last_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(last_id, str):
+            raise ValueError(cursor)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=422, detail="Ungültiger Cursor")
+    return created_at, last_id
+
+
+async def find_page(collection: DocumentCollection, query, cursor: str, limit: int, response: Response, projection=None):
+    """
+    One page of `query` after `cursor` ("" = first page). The cursor for the next page
+    is returned in the `X-Next-Cursor` header; it is absent on the last page.
+
+    Pages only contain documents whose `created_at` is a string (the ISO timestamps
+    prepare_for_mongo writes); others can't be ordered against the cursor and are
+    left out of every page, the first included.
+    """
+    if limit <= 0:
+        raise HTTPException(status_code=422, detail="limit muss bei Cursor-Paginierung größer als 0 sein")
+    page = {"created_at": {"$gte": ""}}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        page["created_at"] = {"$gte": created_at}
+        page["$or"] = [{"created_at": {"$gt": created_at}}, {"id": {"$gt": last_id}}]
+    # The page predicate stays top-level for the index; caller conditions on the same
+    # keys are kept alongside it instead of being overwritten
+    conflicts = {key: value for key, value in query.items() if key in page}
+    query = {**{key: value for key, value in query.items() if key not in page}, **page}
+    if conflicts:
+        query["$and"] = [conflicts]
+    documents = await collection.find(query, projection).sort(PAGE_SORT).limit(limit).to_list(length=None)
+    if len(documents) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(documents[-1])
+    return documents
+
+
 # Customer endpoints
 @api_router.post("/kunden", response_model=Kunde)
 async def create_kunde(kunde: KundeCreate):
@@ -596,9 +4378,19 @@ async def create_kunde(kunde: KundeCreate):
     return kunde_obj
 
 
+@api_router.post("/kunden/bulk")
+async def bulk_create_kunden(items: List[Dict[str, Any]] = Body(...), ordered: bool = True):
+    """Create many customers in one request; see run_bulk_insert for the result format."""
+    return await run_bulk_insert(db.kunden, items, make_kunde_builder(), ordered)
+
+
 @api_router.get("/kunden", response_model=List[Kunde])
-async def get_kunden(skip: int = 0, limit: int = 60):
-    kunden = await (await db.kunden.find({})).skip(skip).limit(limit).to_list(length=None)
+async def get_kunden(response: Response, skip: int = 0, limit: int = 60, cursor: Optional[str] = None):
+    """Pass `cursor` (empty for the first page) for keyset pagination instead of `skip`."""
+    if cursor is not None:
+        kunden = await find_page(db.kunden, {}, cursor, limit, response)
+    else:
+        kunden = await db.kunden.find({}).skip(skip).limit(limit).to_list(length=None)
     return [Kunde(**parse_from_mongo(kunde)) for kunde in kunden]
 
 
@@ -616,6 +4408,39 @@ async def search_kunden(
     gesellschaft: Optional[str] = None,
     limit: int = 60
 ):
+    query = await build_kunden_query(
+        vorname=vorname, name=name, strasse=strasse, plz=plz, ort=ort, kunde_id=kunde_id,
+        geburtsdatum=geburtsdatum, kfz_kennzeichen=kfz_kennzeichen,
+        vertragsnummer=vertragsnummer, gesellschaft=gesellschaft,
+    )
+    kunden = await db.kunden.find(query).limit(limit).to_list(length=None)
+    return [Kunde(**parse_from_mongo(kunde)) for kunde in kunden]
+
+
+@api_router.get("/kunden/quicksearch", response_model=List[Kunde])
+async def quicksearch_kunden(q: str = "", limit: int = 20):
+    """
+    As-you-type search over name, vorname, strasse, ort, plz and kunde_id: every word of
+    `q` must start a word in one of them. Umlauts and ß match their spelled-out forms
+    ("Müller" = "Mueller"), case is ignored.
+    """
+    kunden = await db.kunden.text_search(q, limit=max(min(limit, 200), 0))
+    return [Kunde(**parse_from_mongo(kunde)) for kunde in kunden]
+
+
+async def build_kunden_query(
+    vorname: Optional[str] = None,
+    name: Optional[str] = None,
+    strasse: Optional[str] = None,
+    plz: Optional[str] = None,
+    ort: Optional[str] = None,
+    kunde_id: Optional[str] = None,
+    geburtsdatum: Optional[str] = None,
+    kfz_kennzeichen: Optional[str] = None,
+    vertragsnummer: Optional[str] = None,
+    gesellschaft: Optional[str] = None,
+):
+    """Filter for the customer search criteria (shared by /kunden/search and /export/kunden)."""
     query = {}
     
     if vorname:
@@ -633,28 +4458,26 @@ async def search_kunden(
     if geburtsdatum:
         query["persoenliche_daten.geburtsdatum"] = geburtsdatum
     
-    # Search in related contracts: collect matching customer id sets per criterion and intersect if multiple
+    # Search in related contracts via the contract -> customer lookup indexes (case, umlauts,
+    # spaces and dashes ignored): collect matching customer id sets per criterion and
+    # intersect if multiple. Like the regex search they replace, all criteria match
+    # anywhere in the value ("123" finds "K-AB 123").
     contract_kunde_ids_sets = []
     if kfz_kennzeichen:
-        contracts = await db.vertraege.find({"kfz_kennzeichen": {"$regex": kfz_kennzeichen, "$options": "i"}}).to_list(length=None)
-        contract_kunde_ids_sets.append(set([c.get("kunde_id") for c in contracts if c.get("kunde_id")]))
+        contract_kunde_ids_sets.append(await db.vertraege.lookup("kfz_kennzeichen", kfz_kennzeichen, match="contains"))
     if vertragsnummer:
-        contracts = await db.vertraege.find({"vertragsnummer": {"$regex": vertragsnummer, "$options": "i"}}).to_list(length=None)
-        contract_kunde_ids_sets.append(set([c.get("kunde_id") for c in contracts if c.get("kunde_id")]))
+        contract_kunde_ids_sets.append(await db.vertraege.lookup("vertragsnummer", vertragsnummer, match="contains"))
     if gesellschaft:
-        contracts = await db.vertraege.find({"gesellschaft": {"$regex": gesellschaft, "$options": "i"}}).to_list(length=None)
-        contract_kunde_ids_sets.append(set([c.get("kunde_id") for c in contracts if c.get("kunde_id")]))
+        contract_kunde_ids_sets.append(await db.vertraege.lookup("gesellschaft", gesellschaft, match="contains"))
 
     if contract_kunde_ids_sets:
         # Intersect all non-empty sets to satisfy all contract-based filters simultaneously
         intersect_ids = set.intersection(*[s for s in contract_kunde_ids_sets if s]) if any(contract_kunde_ids_sets) else set()
         # If intersection is empty but at least one set exists, fall back to union (for lenient behavior)
         candidate_ids = intersect_ids if intersect_ids else set.union(*contract_kunde_ids_sets)
-        if candidate_ids:
-            query["id"] = {"$in": list(candidate_ids)}
-    
-    kunden = await db.kunden.find(query).limit(limit).to_list(length=None)
-    return [Kunde(**parse_from_mongo(kunde)) for kunde in kunden]
+        # No contract matching any criterion means no customer, not every customer
+        query["id"] = {"$in": list(candidate_ids)}
+    return query
 
 
 @api_router.get("/kunden/{kunde_id}", response_model=Kunde)
@@ -710,9 +4533,66 @@ async def create_vertrag(vertrag: VertragCreate):
     return vertrag_obj
 
 
+@api_router.post("/vertraege/bulk")
+async def bulk_create_vertraege(items: List[Dict[str, Any]] = Body(...), ordered: bool = True):
+    """
+    Create many contracts in one request (portfolio imports). VU auto-assignment
+    runs once per distinct `gesellschaft` instead of once per contract.
+    """
+    return await run_bulk_insert(db.vertraege, items, make_vertrag_builder(), ordered)
+
+
+def build_vertraege_query(
+    vertragsnummer: Optional[str] = None,
+    kunde_id: Optional[str] = None,
+    gesellschaft: Optional[str] = None,
+    kfz_kennzeichen: Optional[str] = None,
+    produkt_sparte: Optional[str] = None,
+    vertragsstatus: Optional[str] = None,
+    vu_internal_id: Optional[str] = None,
+):
+    """Filter for contract criteria, in the style of the customer/VU search (used by /export/vertraege)."""
+    query = {}
+    if vertragsnummer:
+        query["vertragsnummer"] = {"$regex": vertragsnummer, "$options": "i"}
+    if kunde_id:
+        query["kunde_id"] = kunde_id
+    if gesellschaft:
+        query["gesellschaft"] = {"$regex": gesellschaft, "$options": "i"}
+    if kfz_kennzeichen:
+        query["kfz_kennzeichen"] = {"$regex": kfz_kennzeichen, "$options": "i"}
+    if produkt_sparte:
+        query["produkt_sparte"] = {"$regex": produkt_sparte, "$options": "i"}
+    if vertragsstatus:
+        query["vertragsstatus"] = vertragsstatus
+    if vu_internal_id:
+        query["vu_internal_id"] = vu_internal_id
+    return query
+
+
 @api_router.get("/vertraege", response_model=List[Vertrag])
-async def get_vertraege(skip: int = 0, limit: int = 100):
-    vertraege = await (await db.vertraege.find({})).skip(skip).limit(limit).to_list(length=None)
+async def get_vertraege(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Pass `cursor` (empty for the first page) for keyset pagination instead of `skip`."""
+    if cursor is not None:
+        vertraege = await find_page(db.vertraege, {}, cursor, limit, response)
+    else:
+        vertraege = await db.vertraege.find({}).skip(skip).limit(limit).to_list(length=None)
+    return [Vertrag(**parse_from_mongo(vertrag)) for vertrag in vertraege]
+
+
+@api_router.get("/vertraege/expiring", response_model=List[Vertrag])
+async def get_expiring_vertraege(days: int = 90, limit: int = 1000):
+    """
+    Contracts whose `ablauf` falls within the next `days` days, soonest first.
+    Used for renewal campaigns; served from the ordered `ablauf` index.
+    """
+    if days < 0:
+        raise HTTPException(status_code=422, detail="days darf nicht negativ sein")
+    today = date.today()
+    until = today + timedelta(days=days)
+    vertraege = await db.vertraege.find(
+        {"ablauf": {"$gte": today.isoformat(), "$lte": until.isoformat()}}
+    ).sort("ablauf", 1).limit(limit).to_list(length=None)
     return [Vertrag(**parse_from_mongo(vertrag)) for vertrag in vertraege]
 
 
@@ -722,6 +4602,33 @@ async def get_vertraege_by_kunde(kunde_id: str):
     return [Vertrag(**parse_from_mongo(vertrag)) for vertrag in vertraege]
 
 
+# Registered before /vertraege/{vertrag_id}, which would otherwise capture "vu-statistics"
+@api_router.get("/vertraege/vu-statistics")
+async def get_contract_vu_statistics():
+    """
+    Get statistics about VU assignments in contracts.
+    """
+    total_contracts = await db.vertraege.count_documents({})
+    contracts_with_vu = await db.vertraege.count_documents({"vu_internal_id": {"$exists": True, "$ne": None}})
+    contracts_without_vu = total_contracts - contracts_with_vu
+    
+    # Get gesellschaften without VU assignment
+    unassigned_contracts = await (await db.vertraege.find({"vu_internal_id": {"$exists": False}})).to_list(length=None)
+    
+    unique_gesellschaften = list(set([
+        c.get('gesellschaft') for c in unassigned_contracts 
+        if c.get('gesellschaft')
+    ]))
+    
+    return {
+        "total_contracts": total_contracts,
+        "contracts_with_vu": contracts_with_vu,
+        "contracts_without_vu": contracts_without_vu,
+        "assignment_percentage": round((contracts_with_vu / total_contracts * 100) if total_contracts > 0 else 0, 2),
+        "unique_unassigned_gesellschaften": unique_gesellschaften
+    }
+
+
 @api_router.get("/vertraege/{vertrag_id}", response_model=Vertrag)
 async def get_vertrag(vertrag_id: str):
     vertrag = await db.vertraege.find_one({"id": vertrag_id})
@@ -761,9 +4668,29 @@ async def create_vu(vu: VUCreate):
     return vu_obj
 
 
+@api_router.post("/vus/bulk")
+async def bulk_create_vus(items: List[Dict[str, Any]] = Body(...), ordered: bool = True):
+    """Create many VUs in one request; internal IDs are numbered on from the current maximum."""
+    next_number = int((await get_next_vu_internal_id())[3:])
+
+    async def build(item):
+        nonlocal next_number
+        vu_dict = VUCreate(**item).dict()
+        if not vu_dict.get('vu_internal_id'):
+            vu_dict['vu_internal_id'] = f"VU-{str(next_number).zfill(3)}"
+            next_number += 1
+        return prepare_for_mongo(VU(**vu_dict).dict())
+
+    return await run_bulk_insert(db.vus, items, build, ordered)
+
+
 @api_router.get("/vus", response_model=List[VU])
-async def get_vus(skip: int = 0, limit: int = 100):
-    vus = await (await db.vus.find({})).skip(skip).limit(limit).to_list(length=None)
+async def get_vus(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    """Pass `cursor` (empty for the first page) for keyset pagination instead of `skip`."""
+    if cursor is not None:
+        vus = await find_page(db.vus, {}, cursor, limit, response)
+    else:
+        vus = await db.vus.find({}).skip(skip).limit(limit).to_list(length=None)
     return [VU(**parse_from_mongo(vu)) for vu in vus]
 
 
@@ -777,6 +4704,23 @@ async def search_vus(
     email: Optional[str] = None,
     limit: int = 100
 ):
+    query = build_vus_query(
+        name=name, kurzbezeichnung=kurzbezeichnung, status=status.value if status else None,
+        ort=ort, telefon=telefon, email=email,
+    )
+    vus = await db.vus.find(query).limit(limit).to_list(length=None)
+    return [VU(**parse_from_mongo(vu)) for vu in vus]
+
+
+def build_vus_query(
+    name: Optional[str] = None,
+    kurzbezeichnung: Optional[str] = None,
+    status: Optional[str] = None,
+    ort: Optional[str] = None,
+    telefon: Optional[str] = None,
+    email: Optional[str] = None,
+):
+    """Filter for the VU search criteria (shared by /vus/search and /export/vus)."""
     query = {}
     
     if name:
@@ -784,7 +4728,7 @@ async def search_vus(
     if kurzbezeichnung:
         query["kurzbezeichnung"] = {"$regex": kurzbezeichnung, "$options": "i"}
     if status:
-        query["status"] = status.value
+        query["status"] = status
     if ort:
         query["ort"] = {"$regex": ort, "$options": "i"}
     if telefon:
@@ -795,9 +4739,7 @@ async def search_vus(
             {"email_zentrale": {"$regex": email, "$options": "i"}},
             {"email_schaden": {"$regex": email, "$options": "i"}}
         ]
-    
-    vus = await db.vus.find(query).limit(limit).to_list(length=None)
-    return [VU(**parse_from_mongo(vu)) for vu in vus]
+    return query
 
 
 @api_router.get("/vus/{vu_id}", response_model=VU)
@@ -835,107 +4777,340 @@ async def delete_vu(vu_id: str):
 
 # VU Matching and Migration endpoints
 @api_router.post("/vus/match-gesellschaft")
-async def match_gesellschaft_to_vu(gesellschaft: str):
+async def match_gesellschaft_to_vu(gesellschaft: str, top_k: int = 0, threshold: float = 0.0):
     """
     Find matching VU for a given gesellschaft name.
     Used by frontend to check VU assignment before creating contracts.
+    With `top_k` > 0 the response also lists the `top_k` most similar VUs
+    (trigram similarity 0..1, at least `threshold`) as `candidates`.
     """
     if not gesellschaft:
         return {"match": False, "vu": None, "match_type": None}
     
+    candidates = []
+    if top_k > 0:
+        candidates = [
+            {"vu": VU(**parse_from_mongo(vu)).dict(), "score": score}
+            for vu, score in await vu_matcher.candidates(gesellschaft, min(top_k, 50), threshold)
+        ]
+
     matching_vu, match_type = await find_matching_vu(gesellschaft)
     if matching_vu:
-        return {
+        result = {
             "match": True, 
             "vu": matching_vu.dict(), 
             "match_type": match_type,
             "message": f"VU gefunden: {matching_vu.name} (via {match_type})"
         }
-    
-    return {
-        "match": False, 
-        "vu": None, 
-        "match_type": None,
-        "message": f"Keine VU gefunden für: {gesellschaft}"
-    }
+    else:
+        result = {
+            "match": False, 
+            "vu": None, 
+            "match_type": None,
+            "message": f"Keine VU gefunden für: {gesellschaft}"
+        }
+    if top_k > 0:
+        result["candidates"] = candidates
+    return result
 
 
-@api_router.post("/vertraege/migrate-vu-assignments")
-async def migrate_existing_contracts():
+# Jobs run at the same time; further ones wait in priority order
+JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", "2"))
+
+ACTIVE_JOB_STATUSES = [JobStatus.QUEUED.value, JobStatus.RUNNING.value]
+
+
+class JobQueue:
     """
-    Migrate existing contracts to assign VU IDs based on gesellschaft field.
+    In-process background jobs for work that must not run inside a request. A job is a
+    document in `collection` (see `Job`): `submit` stores it as queued and returns at
+    once; at most `concurrency` jobs run at a time, highest `priority` first and in
+    submission order within a priority. Runners are registered per job type with
+    `@job_queue.runner(type)`; a runner gets the job document, reports progress with
+    `update`, and its return value becomes the job's `result` (an exception marks the
+    job failed). For an `exclusive` type, submitting while one is queued or running
+    returns that job instead.
+
+    `cancel` drops a queued job or cancels the task of a running one, then awaits the
+    type's `on_cancel(job)` hook if it has one. Job state is
+    persisted with the data, so `start` re-queues whatever a previous process left
+    queued or running, and `stop` cancels running tasks without touching their state.
     """
-    # Get all contracts without vu_internal_id
-    contracts_without_vu = await (await db.vertraege.find({"vu_internal_id": {"$exists": False}})).to_list(length=None)
-    
-    migration_results = {
-        "total_contracts": len(contracts_without_vu),
-        "matched": 0,
-        "unmatched": 0,
-        "updated": 0,
-        "matches": [],
-        "unmatched_gesellschaften": []
-    }
-    
-    for contract in contracts_without_vu:
-        gesellschaft = contract.get('gesellschaft')
-        if gesellschaft:
-            matching_vu, match_type = await find_matching_vu(gesellschaft)
-            if matching_vu:
-                # Update contract with VU assignment
-                update_result = await db.vertraege.update_one(
-                    {"id": contract["id"]},
-                    {"$set": {
-                        "vu_id": matching_vu.id,
-                        "vu_internal_id": matching_vu.vu_internal_id,
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
-                
-                if update_result.modified_count > 0:
-                    migration_results["updated"] += 1
-                    migration_results["matched"] += 1
-                    migration_results["matches"].append({
-                        "vertrag_id": contract["id"],
-                        "gesellschaft": gesellschaft,
-                        "vu_name": matching_vu.name,
-                        "vu_internal_id": matching_vu.vu_internal_id,
-                        "match_type": match_type
-                    })
-            else:
-                migration_results["unmatched"] += 1
-                if gesellschaft not in migration_results["unmatched_gesellschaften"]:
-                    migration_results["unmatched_gesellschaften"].append(gesellschaft)
-    
-    return migration_results
+
+    def __init__(self, collection: DocumentCollection, concurrency: int = JOB_CONCURRENCY):
+        self._collection = collection
+        self.concurrency = max(concurrency, 1)
+        # job type -> (runner, default priority, exclusive, on_cancel)
+        self._runners: Dict[str, Tuple[Any, int, bool, Any]] = {}
+        # Per job type: makes the exclusive check and the insert one step
+        self._submit_locks: Dict[str, asyncio.Lock] = {}
+        # Heap of (-priority, submission order, job id)
+        self._queue: List[Tuple[int, int, str]] = []
+        self._order = count()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._cancelled: set = set()
+        self._stopped = False
+
+    def runner(self, job_type: str, priority: int = 0, exclusive: bool = False, on_cancel=None):
+        def register(func):
+            self._runners[job_type] = (func, priority, exclusive, on_cancel)
+            return func
+        return register
+
+    @property
+    def job_types(self) -> List[str]:
+        return list(self._runners)
+
+    async def update(self, job_id: str, **changes):
+        changes["updated_at"] = datetime.utcnow()
+        await self._collection.update_one({"id": job_id}, {"$set": prepare_for_mongo(changes)})
+
+    async def submit(self, job_type: str, params: Optional[Dict[str, Any]] = None, priority: Optional[int] = None):
+        """Store a new job and queue it. Raises ValueError for an unknown type."""
+        if job_type not in self._runners:
+            raise ValueError(f"Unknown job type: {job_type}")
+        _, default_priority, exclusive, _ = self._runners[job_type]
+        lock = self._submit_locks.setdefault(job_type, asyncio.Lock())
+        async with lock:
+            if exclusive:
+                active = await self._collection.find_one({"type": job_type, "status": {"$in": ACTIVE_JOB_STATUSES}})
+                if active is not None:
+                    return active
+            job = prepare_for_mongo(Job(
+                type=job_type,
+                params=params or {},
+                priority=default_priority if priority is None else priority,
+            ).dict())
+            await self._collection.insert_one(job)
+        self._enqueue(job)
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; returns its document (None if unknown)."""
+        job = await self._collection.find_one({"id": job_id})
+        if job is None:
+            return None
+        task = self._running.get(job_id)
+        if task is not None:
+            self._cancelled.add(job_id)
+            task.cancel()
+            await asyncio.wait([task])
+        elif job["status"] in ACTIVE_JOB_STATUSES:
+            # Still in the heap: _run skips it once it is no longer queued
+            await self.update(job_id, status=JobStatus.CANCELLED, finished_at=datetime.utcnow())
+        job = await self._collection.find_one({"id": job_id})
+        on_cancel = self._runners.get(job.get("type"), (None, 0, False, None))[3]
+        if on_cancel is not None and job["status"] == JobStatus.CANCELLED:
+            await on_cancel(job)
+        return job
+
+    async def start(self):
+        """Re-queue the jobs a previous process left queued or running."""
+        self._stopped = False
+        cursor = await self._collection.find({"status": {"$in": ACTIVE_JOB_STATUSES}})
+        jobs = await cursor.to_list(length=None)
+        for job in sorted(jobs, key=lambda job: job["created_at"]):
+            if job["id"] not in self._running and job.get("type") in self._runners:
+                logger.info(f"Resuming {job['type']} job {job['id']}")
+                self._enqueue(job)
+
+    async def stop(self):
+        """Cancel running jobs; they stay "running" in the store and resume on the next start."""
+        self._stopped = True
+        self._queue.clear()
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"concurrency": self.concurrency, "running": len(self._running), "queued": len(self._queue)}
+
+    def _enqueue(self, job: Dict[str, Any]):
+        heapq.heappush(self._queue, (-job.get("priority", 0), next(self._order), job["id"]))
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.concurrency and not self._stopped:
+            _, _, job_id = heapq.heappop(self._queue)
+            task = asyncio.get_running_loop().create_task(self._run(job_id))
+            self._running[job_id] = task
+            task.add_done_callback(functools.partial(self._finished, job_id))
+
+    def _finished(self, job_id: str, _task):
+        self._running.pop(job_id, None)
+        self._cancelled.discard(job_id)
+        self._dispatch()
+
+    async def _run(self, job_id: str):
+        try:
+            job = await self._collection.find_one({"id": job_id})
+            if job is None or job["status"] not in ACTIVE_JOB_STATUSES:
+                return
+            await self.update(job_id, status=JobStatus.RUNNING, started_at=job.get("started_at") or datetime.utcnow())
+            result = await self._runners[job["type"]][0](job)
+        except asyncio.CancelledError:
+            if job_id not in self._cancelled:
+                raise
+            await self.update(job_id, status=JobStatus.CANCELLED, finished_at=datetime.utcnow())
+        except Exception as e:
+            logger.exception(f"Job {job_id} failed")
+            await self.update(job_id, status=JobStatus.FAILED, error=str(e), finished_at=datetime.utcnow())
+        else:
+            await self.update(job_id, status=JobStatus.COMPLETED, result=result, finished_at=datetime.utcnow())
+
+
+job_queue = JobQueue(db.jobs)
+
+
+@api_router.post("/jobs", response_model=Job, status_code=202)
+async def submit_job(job: JobCreate):
+    try:
+        return Job(**parse_from_mongo(await job_queue.submit(job.type, job.params, job.priority)))
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unbekannter Job-Typ: {job.type} (verfügbar: {', '.join(job_queue.job_types)})",
+        )
 
 
-@api_router.get("/vertraege/vu-statistics")
-async def get_contract_vu_statistics():
+@api_router.get("/jobs", response_model=List[Job])
+async def get_jobs(status: Optional[JobStatus] = None, type: Optional[str] = None, limit: int = 50):
+    query = {}
+    if status:
+        query["status"] = status.value
+    if type:
+        query["type"] = type
+    cursor = (await db.jobs.find(query)).sort("created_at", -1).limit(min(limit, 500))
+    return [Job(**parse_from_mongo(job)) for job in await cursor.to_list(length=None)]
+
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = await db.jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return Job(**parse_from_mongo(job))
+
+
+@api_router.post("/jobs/{job_id}/cancel", response_model=Job)
+async def cancel_job(job_id: str):
+    job = await db.jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    if job["status"] not in ACTIVE_JOB_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job ist bereits beendet ({job['status']})")
+    return Job(**parse_from_mongo(await job_queue.cancel(job_id)))
+
+
+# Contracts per bulk update of the VU migration; progress is checkpointed after each batch
+VU_MIGRATION_BATCH_SIZE = int(os.environ.get("VU_MIGRATION_BATCH_SIZE", "5000"))
+
+
+@job_queue.runner("vu_migration", exclusive=True)
+async def run_vu_migration(job):
     """
-    Get statistics about VU assignments in contracts.
+    Assign VUs to every contract without `vu_internal_id`, based on its Gesellschaft.
+
+    One pass over the unassigned contracts groups their ids by Gesellschaft and resolves
+    each distinct name once; the matched ids are then written in bulk batches of
+    VU_MIGRATION_BATCH_SIZE. After each batch the `updated` counter is checkpointed in the
+    job document. The contracts themselves are the rest of the checkpoint: assigned ones
+    drop out of the filter, so a job resumed after a restart only scans what is left (a
+    crash between a batch and its checkpoint leaves that batch out of the counter).
+
+    The result's `matches` has one entry per Gesellschaft (`gesellschaft`, `vu_name`,
+    `vu_internal_id`, `match_type`, `contracts` = number assigned) for the contracts this
+    run assigned; after a resume that is only the remainder, while `updated` and
+    `matched` count the whole migration.
     """
-    total_contracts = await db.vertraege.count_documents({})
-    contracts_with_vu = await db.vertraege.count_documents({"vu_internal_id": {"$exists": True, "$ne": None}})
-    contracts_without_vu = total_contracts - contracts_with_vu
-    
-    # Get gesellschaften without VU assignment
-    unassigned_contracts = await (await db.vertraege.find({"vu_internal_id": {"$exists": False}})).to_list(length=None)
-    
-    unique_gesellschaften = list(set([
-        c.get('gesellschaft') for c in unassigned_contracts 
-        if c.get('gesellschaft')
-    ]))
-    
+    job_id = job["id"]
+    checkpoint = job.get("checkpoint") or {}
+    updated = checkpoint.get("updated", 0)
+    matches: Dict[str, Dict[str, Any]] = {}
+    await job_queue.update(job_id, progress={"phase": "scanning", "updated": updated})
+
+    resolved: Dict[str, Tuple[Optional[VU], Optional[str]]] = {}
+    pending: Dict[str, List[str]] = {}  # Gesellschaft -> ids of its unassigned contracts
+    unmatched: Dict[str, int] = {}
+    remaining = 0
+    unassigned = {"vu_internal_id": {"$exists": False}}
+    async for batch in db.vertraege.scan_batches(unassigned, VU_MIGRATION_BATCH_SIZE):
+        for contract in batch:
+            remaining += 1
+            gesellschaft = contract.get("gesellschaft")
+            if not gesellschaft:
+                continue
+            if gesellschaft not in resolved:
+                resolved[gesellschaft] = await find_matching_vu(gesellschaft)
+            if resolved[gesellschaft][0] is None:
+                unmatched[gesellschaft] = unmatched.get(gesellschaft, 0) + 1
+            else:
+                pending.setdefault(gesellschaft, []).append(contract["id"])
+
+    progress = {
+        "phase": "updating",
+        "total_contracts": updated + remaining,
+        "updated": updated,
+        "pending": sum(len(ids) for ids in pending.values()),
+        "unmatched": sum(unmatched.values()),
+    }
+    await job_queue.update(job_id, progress=progress)
+
+    # Contract ids in Gesellschaft order, so a batch usually needs one update per VU
+    assignments = [(gesellschaft, contract_id) for gesellschaft, ids in pending.items() for contract_id in ids]
+    for start in range(0, len(assignments), VU_MIGRATION_BATCH_SIZE):
+        groups: Dict[str, List[str]] = {}
+        for gesellschaft, contract_id in assignments[start:start + VU_MIGRATION_BATCH_SIZE]:
+            groups.setdefault(gesellschaft, []).append(contract_id)
+        for gesellschaft, ids in groups.items():
+            vu, match_type = resolved[gesellschaft]
+            result = await db.vertraege.update_many(
+                # Re-checked per contract: one assigned meanwhile is left alone
+                {"id": {"$in": ids}, **unassigned},
+                {"$set": {
+                    "vu_id": vu.id,
+                    "vu_internal_id": vu.vu_internal_id,
+                    "updated_at": datetime.utcnow()
+                }}
+            )
+            updated += result.modified_count
+            match = matches.setdefault(gesellschaft, {
+                "gesellschaft": gesellschaft,
+                "vu_name": vu.name,
+                "vu_internal_id": vu.vu_internal_id,
+                "match_type": match_type,
+                "contracts": 0,
+            })
+            match["contracts"] += result.modified_count
+        progress["updated"] = updated
+        progress["pending"] -= sum(len(ids) for ids in groups.values())
+        await job_queue.update(job_id, progress=progress, checkpoint={"updated": updated})
+        # The in-memory engine never suspends on writes; let requests run between batches
+        await asyncio.sleep(0)
+
+    await job_queue.update(job_id, progress={**progress, "phase": "done"})
     return {
-        "total_contracts": total_contracts,
-        "contracts_with_vu": contracts_with_vu,
-        "contracts_without_vu": contracts_without_vu,
-        "assignment_percentage": round((contracts_with_vu / total_contracts * 100) if total_contracts > 0 else 0, 2),
-        "unique_unassigned_gesellschaften": unique_gesellschaften
+        "total_contracts": progress["total_contracts"],
+        "matched": updated,
+        "unmatched": progress["unmatched"],
+        "updated": updated,
+        "matches": list(matches.values()),
+        "unmatched_gesellschaften": list(unmatched),
     }
 
 
+@api_router.post("/vertraege/migrate-vu-assignments", status_code=202)
+async def migrate_existing_contracts():
+    """
+    Start the VU migration of existing contracts (assign VU IDs based on the gesellschaft
+    field) as a background job, or return the one already in progress. Poll
+    `GET /jobs/{job_id}`; the summary ends up in its `result`.
+    """
+    job = await job_queue.submit("vu_migration")
+    return {"job_id": job["id"], "status": job["status"]}
+
+
 # Initialize sample VU data
 @api_router.post("/vus/init-sample-data")
 async def init_sample_vu_data():
@@ -1028,21 +5203,105 @@ async def init_sample_vu_data():
 
 
 # Document Management endpoints
+
+# List endpoints return metadata only; file bytes come from /documents/{id}/content
+DOCUMENT_METADATA_PROJECTION = {"file_content": 0}
+
+
+async def with_file_content(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    For `include_content=true`: give blob-backed documents their file as Base64 in
+    `file_content`, like legacy records carry it inline. Returns new dicts; a missing
+    blob leaves `file_content` empty.
+    """
+    results = []
+    for doc in documents:
+        content_hash = doc.get("content_hash")
+        if doc.get("file_content") is None and content_hash:
+            try:
+                data = await asyncio.to_thread(blob_store.path(content_hash).read_bytes)
+            except (FileNotFoundError, ValueError):
+                logger.warning(f"Blob {content_hash} of document {doc.get('id')} not found")
+            else:
+                doc = {**doc, "file_content": base64.b64encode(data).decode("ascii")}
+        results.append(doc)
+    return results
+
+def decode_file_content(file_content: str) -> bytes:
+    """Decode Base64 file content, accepting raw Base64 or a DataURL."""
+    if file_content.startswith('data:'):
+        file_content = file_content.split(',', 1)[-1]
+    try:
+        return base64.b64decode(file_content)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=422, detail="Ungültiger Dateiinhalt (Base64 erwartet)")
+
+
+_MAGIC_NUMBERS = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"),
+)
+
+
+def sniff_mime_type(head: bytes, filename: Optional[str]) -> str:
+    """Determine the mime type from the first bytes of a file, falling back to the file extension."""
+    guessed = mimetypes.guess_type(filename or "")[0]
+    for magic, mime in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            # docx/xlsx are zip containers and doc/xls OLE containers; the extension is more specific
+            if mime in ("application/zip", "application/x-ole-storage") and guessed:
+                return guessed
+            return mime
+    return guessed or "application/octet-stream"
+
+
+async def insert_document(document_dict: Dict[str, Any]) -> Document:
+    document_obj = Document(**document_dict)
+    await db.documents.insert_one(prepare_for_mongo(document_obj.dict()))
+    return document_obj
+
+
+async def blob_referenced(content_hash: str, except_job: Optional[str] = None) -> bool:
+    """Whether a document or an unfinished PDF analysis job (other than `except_job`) needs the blob."""
+    if await db.documents.count_documents({"content_hash": content_hash}) > 0:
+        return True
+    jobs = {"type": "pdf_analysis", "params.content_hash": content_hash, "status": {"$in": ACTIVE_JOB_STATUSES}}
+    if except_job:
+        jobs["id"] = {"$ne": except_job}
+    return await db.jobs.count_documents(jobs) > 0
+
+
 @api_router.post("/documents", response_model=Document)
 async def create_document(document: DocumentCreate):
     document_dict = prepare_for_mongo(document.dict())
-    document_obj = Document(**document_dict)
-    result = await db.documents.insert_one(prepare_for_mongo(document_obj.dict()))
-    return document_obj
+    # Move the file bytes into the blob store; the record only keeps hash, size and mime type
+    file_content = document_dict.pop('file_content', None)
+    if file_content:
+        content = decode_file_content(file_content)
+        document_dict['file_size'] = len(content)
+        if not document_dict.get('mime_type'):
+            document_dict['mime_type'] = sniff_mime_type(content[:BlobStore.SNIFF_SIZE], document_dict['filename'])
+        async with blob_store.store(content, blob_referenced) as content_hash:
+            document_dict['content_hash'] = content_hash
+            return await insert_document(document_dict)
+    return await insert_document(document_dict)
 
 
 @api_router.get("/documents", response_model=List[Document])
 async def get_documents(
+    response: Response,
     kunde_id: Optional[str] = None,
     vertrag_id: Optional[str] = None,
     document_type: Optional[DocumentType] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    include_content: bool = False,
+    cursor: Optional[str] = None
 ):
     query = {}
     if kunde_id:
@@ -1052,13 +5311,19 @@ async def get_documents(
     if document_type:
         query["document_type"] = document_type.value
         
-    documents = await db.documents.find(query).skip(skip).limit(limit).to_list(length=None)
+    projection = None if include_content else DOCUMENT_METADATA_PROJECTION
+    if cursor is not None:
+        documents = await find_page(db.documents, query, cursor, limit, response, projection)
+    else:
+        documents = await db.documents.find(query, projection).skip(skip).limit(limit).to_list(length=None)
+    if include_content:
+        documents = await with_file_content(documents)
     return [Document(**parse_from_mongo(doc)) for doc in documents]
 
 
 # Get document statistics for dashboard
 @api_router.get("/documents/stats")
-async def get_document_stats():
+async def get_document_stats(include_content: bool = False):
     total_docs = await db.documents.count_documents({})
     
     # Count by document type
@@ -1068,7 +5333,10 @@ async def get_document_stats():
     type_counts = await (await db.documents.aggregate(pipeline)).to_list(length=None)
     
     # Recent documents
-    recent_docs = await (await db.documents.find({})).sort("created_at", -1).limit(5).to_list(length=None)
+    projection = None if include_content else DOCUMENT_METADATA_PROJECTION
+    recent_docs = await db.documents.find({}, projection).sort("created_at", -1).limit(5).to_list(length=None)
+    if include_content:
+        recent_docs = await with_file_content(recent_docs)
     
     return {
         "total_documents": total_docs,
@@ -1102,17 +5370,158 @@ async def update_document(document_id: str, document_update: DocumentUpdate):
     return Document(**parse_from_mongo(updated_document))
 
 
+class BlobFileResponse(FileResponse):
+    """
+    FileResponse for a byte range of a blob. Uses the ASGI zero-copy extension
+    (sendfile) when the server offers it, otherwise streams the range in chunks.
+    """
+
+    chunk_size = BlobStore.CHUNK_SIZE
+
+    def __init__(self, path: Path, offset: int, length: int, **kwargs):
+        super().__init__(path, **kwargs)
+        self.offset = offset
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+        else:
+            f = await asyncio.to_thread(open, self.path, "rb")
+            try:
+                f.seek(self.offset)
+                remaining = self.length
+                while remaining:
+                    chunk = await asyncio.to_thread(f.read, min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining:
+                    # File shrank underneath us; close the body instead of hanging the client
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+            finally:
+                f.close()
+        if self.background is not None:
+            await self.background()
+
+
+def parse_range_header(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range into (offset, length). Returns None when the
+    whole file should be sent (no/unsupported/multi-range header) and raises 416
+    when the range lies outside the file.
+    """
+    match = re.fullmatch(r"\s*bytes\s*=\s*(\d*)\s*-\s*(\d*)\s*", range_header or "")
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = min(int(last), size)
+        if length == 0:
+            raise HTTPException(status_code=416, detail="Ungültiger Bereich", headers={"Content-Range": f"bytes */{size}"})
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, detail="Ungültiger Bereich", headers={"Content-Range": f"bytes */{size}"})
+    return start, end - start + 1
+
+
+async def _document_file_response(document_id: str, request: Request, disposition: str):
+    document = await db.documents.find_one({"id": document_id})
+    if document is None:
+        raise HTTPException(status_code=404, detail="Dokument nicht gefunden")
+    media_type = document.get('mime_type') or 'application/octet-stream'
+    content_hash = document.get('content_hash')
+    if not content_hash:
+        if document.get('file_content'):
+            # Documents stored before the blob store kept Base64 inline
+            return Response(decode_file_content(document['file_content']), media_type=media_type)
+        raise HTTPException(status_code=404, detail="Dokument hat keinen Dateiinhalt")
+
+    path = blob_store.path(content_hash)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Dateiinhalt nicht gefunden")
+    size = stat_result.st_size
+    # Blobs are immutable and named by their SHA-256, so the hash is a strong ETag
+    etag = f'"{content_hash}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=0, must-revalidate"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if "range" in request.headers and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_range_header(request.headers["range"], size)
+    if byte_range is None:
+        offset, length, status_code = 0, size, 200
+    else:
+        offset, length = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {offset}-{offset + length - 1}/{size}"
+
+    return BlobFileResponse(
+        path,
+        offset,
+        length,
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+        filename=document.get('filename'),
+        stat_result=stat_result,
+        content_disposition_type=disposition,
+    )
+
+
+@api_router.api_route("/documents/{document_id}/content", methods=["GET", "HEAD"])
+async def get_document_content(document_id: str, request: Request):
+    """Serve the stored file inline (PDF viewer); supports ETag/If-None-Match and Range requests."""
+    return await _document_file_response(document_id, request, "inline")
+
+
+@api_router.api_route("/documents/{document_id}/download", methods=["GET", "HEAD"])
+async def download_document(document_id: str, request: Request):
+    """Same as /content, but as an attachment download."""
+    return await _document_file_response(document_id, request, "attachment")
+
+
 @api_router.delete("/documents/{document_id}")
 async def delete_document(document_id: str):
+    document = await db.documents.find_one({"id": document_id})
     result = await db.documents.delete_one({"id": document_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Dokument nicht gefunden")
+    # Blobs are shared between identical files; drop one only when nothing references it
+    content_hash = document.get('content_hash')
+    if content_hash:
+        await blob_store.release(content_hash, blob_referenced)
     return {"message": "Dokument erfolgreich gelöscht"}
 
 
 @api_router.get("/kunden/{kunde_id}/documents", response_model=List[Document])
-async def get_customer_documents(kunde_id: str):
-    documents = await db.documents.find({"kunde_id": kunde_id}).to_list(length=None)
+async def get_customer_documents(kunde_id: str, include_content: bool = False):
+    projection = None if include_content else DOCUMENT_METADATA_PROJECTION
+    documents = await db.documents.find({"kunde_id": kunde_id}, projection).to_list(length=None)
+    if include_content:
+        documents = await with_file_content(documents)
     return [Document(**parse_from_mongo(doc)) for doc in documents]
 
 
@@ -1123,12 +5532,14 @@ async def upload_document_file(
     title: str = Form("Uploaded Document"),
     description: Optional[str] = Form(None),
     tags: str = Form("") ,  # Comma separated tags
-    file_content: str = Form(""),  # Base64 encoded file (DataURL or raw)
+    file: Optional[UploadFile] = File(None),  # Binary file part, streamed to the blob store
+    file_content: str = Form(""),  # Legacy: Base64 encoded file (DataURL or raw)
     filename: Optional[str] = Form(None),
     mime_type: Optional[str] = Form(None)
 ):
     """
-    Upload a document via multipart form or base64 content
+    Upload a document via multipart form: either a binary `file` part (streamed
+    to disk in chunks) or legacy base64 `file_content`
     """
     try:
         # Determine document type from filename or content
@@ -1157,6 +5568,30 @@ async def upload_document_file(
                 return DocumentType.EMAIL
             return DocumentType.OTHER
 
+        # Parse tags
+        tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
+
+        if file is not None:
+            async with blob_store.store_stream(file, blob_referenced) as (content_hash, file_size, head):
+                filename = filename or file.filename
+                if not mime_type and file.content_type and file.content_type != 'application/octet-stream':
+                    mime_type = file.content_type
+                mime_type = mime_type or sniff_mime_type(head, filename)
+                document_create = DocumentCreate(
+                    kunde_id=kunde_id,
+                    vertrag_id=vertrag_id,
+                    title=title,
+                    filename=filename or f"{title}.pdf",
+                    document_type=guess_type(filename, mime_type),
+                    description=description,
+                    mime_type=mime_type,
+                    file_size=file_size,
+                    tags=tag_list,
+                )
+                document_dict = prepare_for_mongo(document_create.dict())
+                document_dict['content_hash'] = content_hash
+                return await insert_document(document_dict)
+
         # Normalize base64: strip DataURL prefix if present
         normalized_b64 = file_content
         if file_content and file_content.startswith('data:'):
@@ -1167,9 +5602,6 @@ async def upload_document_file(
 
         document_type = guess_type(filename, mime_type)
         
-        # Parse tags
-        tag_list = [tag.strip() for tag in tags.split(",") if tag.strip()]
-        
         # Create document
         document_create = DocumentCreate(
             kunde_id=kunde_id,
@@ -1178,12 +5610,15 @@ async def upload_document_file(
             filename=filename or f"{title}.pdf",
             document_type=document_type,
             description=description,
+            mime_type=mime_type,
             tags=tag_list,
             file_content=normalized_b64
         )
         
         return await create_document(document_create)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Fehler beim Hochladen: {str(e)}")
 
@@ -1191,12 +5626,316 @@ async def upload_document_file(
 
 
 
+# ------------------------------
+# Portfolio import (CSV / NDJSON)
+# ------------------------------
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+_GERMAN_DATE = re.compile(r"(\d{1,2})\.(\d{1,2})\.(\d{4})")
+_AMOUNT_FIELDS = ('beitrag_brutto', 'beitrag_netto')
+_DATE_FIELDS = ('beginn', 'ablauf', 'persoenliche_daten.geburtsdatum')
+
+
+def parse_amount(value: str) -> Optional[float]:
+    """Parse "1.234,56 €", "46,24" or "46.24" into a float (None when empty)."""
+    cleaned = value.replace('€', '').replace('EUR', '').replace(' ', '').replace('\xa0', '')
+    if not cleaned:
+        return None
+    if ',' in cleaned:
+        # German format: '.' groups thousands, ',' is the decimal separator
+        cleaned = cleaned.replace('.', '').replace(',', '.')
+    elif re.fullmatch(r"-?\d{1,3}(\.\d{3})+", cleaned):
+        cleaned = cleaned.replace('.', '')
+    return float(cleaned)
+
+
+def normalize_import_row(row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """
+    Normalize one imported row before validation: trims strings, drops empty
+    values, converts German dates (31.12.2024) in the date fields (`_DATE_FIELDS`)
+    to ISO and currency strings to floats, and expands dotted CSV columns
+    (`bankverbindung.iban`) into nested objects. Other text columns such as
+    Vertragsnummern are kept verbatim even if they look like a date.
+    """
+    normalized: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None:
+            continue  # surplus CSV cells without a header
+        path = prefix + key.strip()
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+            match = _GERMAN_DATE.fullmatch(value) if path in _DATE_FIELDS else None
+            if match:
+                day, month, year = match.groups()
+                value = f"{year}-{int(month):02d}-{int(day):02d}"
+            elif key.rsplit('.', 1)[-1] in _AMOUNT_FIELDS:
+                value = parse_amount(value)
+        elif isinstance(value, dict):
+            value = normalize_import_row(value, path + '.')
+        if value is None:
+            continue
+        *parents, leaf = key.strip().split('.')
+        target = normalized
+        for part in parents:
+            target = target.setdefault(part, {})
+            if not isinstance(target, dict):
+                raise ValueError(f"Spalte {key} widerspricht einer anderen Spalte")
+        target[leaf] = value
+    return normalized
+
+
+def iter_import_rows(source: BinaryIO, file_format: str):
+    """
+    Stream rows from a binary file object as (row number, row dict, error).
+    CSV delimiters (`;`, `,` or tab) are sniffed from the first 64 KiB; rows are
+    read one at a time so memory use is independent of the file size.
+    """
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        if file_format == "ndjson":
+            for line_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise ValueError("JSON-Objekt erwartet")
+                except ValueError as e:
+                    yield line_number, None, f"Ungültige Zeile: {e}"
+                    continue
+                yield line_number, row, None
+            return
+
+        sample = text.read(64 * 1024)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(text, dialect=dialect)
+        for row in reader:
+            yield reader.line_num, row, None
+    finally:
+        # Leave the underlying file open for its owner (UploadFile / CLI)
+        text.detach()
+
+
+def guess_import_format(filename: Optional[str], file_format: Optional[str] = None) -> str:
+    file_format = (file_format or (filename or "").rsplit('.', 1)[-1]).lower()
+    if file_format in ("ndjson", "jsonl"):
+        return "ndjson"
+    if file_format in ("csv", "txt"):
+        return "csv"
+    raise ValueError(f"Unbekanntes Importformat: {file_format or '?'} (csv oder ndjson)")
+
+
+async def import_portfolio(
+    collection_name: str,
+    source: BinaryIO,
+    file_format: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress=None,
+) -> Dict[str, Any]:
+    """
+    Import customers or contracts from a CSV/NDJSON stream. Rows are parsed in a worker
+    thread one batch at a time, normalized, validated against KundeCreate/VertragCreate
+    and written with one insert_many per batch (unordered: bad rows are reported and
+    skipped). `progress(summary)` is called after every batch.
+    """
+    if collection_name == "kunden":
+        collection, build = db.kunden, make_kunde_builder(keep_kunde_id=True)
+    elif collection_name == "vertraege":
+        collection, build = db.vertraege, make_vertrag_builder(link_kunden=True)
+    else:
+        raise ValueError(f"Import für '{collection_name}' nicht unterstützt")
+
+    rows = iter_import_rows(source, file_format)
+    summary = {"collection": collection_name, "processed": 0, "created": 0, "failed": 0, "errors": []}
+
+    def report(row_number: int, detail: str):
+        summary["failed"] += 1
+        if len(summary["errors"]) < IMPORT_MAX_REPORTED_ERRORS:
+            summary["errors"].append({"row": row_number, "detail": detail})
+
+    while True:
+        batch = await asyncio.to_thread(lambda: list(islice(rows, max(batch_size, 1))))
+        if not batch:
+            break
+        items, row_numbers = [], []
+        for row_number, row, error in batch:
+            if error is None:
+                try:
+                    items.append(normalize_import_row(row))
+                    row_numbers.append(row_number)
+                    continue
+                except ValueError as e:
+                    error = str(e)
+            report(row_number, error)
+        result = await run_bulk_insert(collection, items, build, ordered=False)
+        for item_result in result["results"]:
+            if item_result["status"] == "error":
+                report(row_numbers[item_result["index"]], item_result["detail"])
+        summary["processed"] += len(batch)
+        summary["created"] += result["created"]
+        if progress is not None:
+            progress(summary)
+
+    summary["errors_truncated"] = summary["failed"] > len(summary["errors"])
+    return summary
+
+
+@api_router.post("/import/{collection_name}")
+async def import_file(
+    collection_name: str,
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    batch_size: int = Form(IMPORT_BATCH_SIZE),
+):
+    """
+    Import a customer or contract portfolio (`collection_name` = kunden | vertraege)
+    from a CSV or NDJSON upload. The upload is spooled to disk by the multipart parser
+    and read back as a stream. Contracts reference customers via `kunde_id`, which may
+    be the customer's id or customer number.
+    """
+    if collection_name not in ("kunden", "vertraege"):
+        raise HTTPException(status_code=404, detail=f"Import für '{collection_name}' nicht unterstützt")
+    try:
+        file_format = guess_import_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    def log_progress(summary):
+        logger.info(
+            "Import %s: %d rows processed, %d created, %d failed",
+            collection_name, summary["processed"], summary["created"], summary["failed"],
+        )
+
+    return await import_portfolio(collection_name, file.file, file_format, batch_size, progress=log_progress)
+
+
+# ------------------------------
+# Streaming export (NDJSON / CSV)
+# ------------------------------
+
+EXPORT_BATCH_SIZE = 1000
+
+
+def _csv_columns(model) -> List[str]:
+    """CSV header for a model: nested models become dotted columns, the layout the import reads."""
+    columns = []
+    for field_name, field in model.model_fields.items():
+        annotation = field.annotation
+        nested = [arg for arg in getattr(annotation, "__args__", (annotation,))
+                  if isinstance(arg, type) and issubclass(arg, BaseModel)]
+        if nested:
+            columns.extend(f"{field_name}.{sub}" for sub in nested[0].model_fields)
+        else:
+            columns.append(field_name)
+    return columns
+
+
+def _csv_cell(doc, column: str):
+    value = _resolve_path(doc, column.split("."))
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return _dump_json(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+async def stream_export(collection: DocumentCollection, query, file_format: str, columns, compress: bool):
+    """
+    Yield the export body batch by batch. Each batch is scanned and serialized in one
+    step, then handed to the server, so memory stays bounded by the batch size.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31: gzip container
+
+    def encode(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";", lineterminator="\r\n") if file_format == "csv" else None
+    if writer is not None:
+        # BOM + ';' so Excel opens the file with umlauts and columns intact
+        buffer.write("\ufeff")
+        writer.writerow(columns)
+
+    async for batch in collection.scan_batches(query, EXPORT_BATCH_SIZE):
+        if writer is not None:
+            writer.writerows([_csv_cell(doc, column) for column in columns] for doc in batch)
+        else:
+            buffer.write("".join(_dump_json(doc) + "\n" for doc in batch))
+        chunk = encode(buffer.getvalue())
+        buffer.seek(0)
+        buffer.truncate()
+        if chunk:
+            yield chunk
+
+    tail = encode(buffer.getvalue())
+    if compressor is not None:
+        tail += compressor.flush()
+    if tail:
+        yield tail
+
+
+@api_router.get("/export/{collection_name}")
+async def export_collection(collection_name: str, request: Request, format: str = "ndjson", gzip: bool = False):
+    """
+    Stream a full collection (kunden | vertraege | vus) as NDJSON or CSV, optionally
+    gzip-compressed. Any other query parameters are filters with the same meaning as
+    in the search endpoints, e.g. `/export/kunden?format=csv&ort=köln`.
+    """
+    exports = {
+        "kunden": (db.kunden, Kunde, build_kunden_query),
+        "vertraege": (db.vertraege, Vertrag, build_vertraege_query),
+        "vus": (db.vus, VU, build_vus_query),
+    }
+    if collection_name not in exports:
+        raise HTTPException(status_code=404, detail=f"Export für '{collection_name}' nicht unterstützt")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=422, detail="format muss ndjson oder csv sein")
+    collection, model, build_query = exports[collection_name]
+
+    filters = {key: value for key, value in request.query_params.items() if key not in ("format", "gzip")}
+    allowed = set(inspect.signature(build_query).parameters)
+    unknown = sorted(set(filters) - allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unbekannte Filter: {', '.join(unknown)} (erlaubt: {', '.join(sorted(allowed))})",
+        )
+    query = build_query(**filters)
+    if inspect.isawaitable(query):
+        query = await query
+
+    filename = f"{collection_name}-{date.today().isoformat()}.{format}"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    columns = _csv_columns(model) if format == "csv" else None
+    return StreamingResponse(
+        stream_export(collection, query, format, columns, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 # Data cleanup endpoints for development/testing
-@api_router.post("/admin/cleanup-duplicates")
-async def cleanup_duplicate_data():
+CLEANUP_BATCH_SIZE = 1000
+
+
+@job_queue.runner("cleanup_duplicates", exclusive=True)
+async def run_cleanup_duplicates(job):
     """
     Clean up duplicate customers and VUs created during testing.
-    Keep only essential data and remove test duplicates.
+    Keep only essential data and remove test duplicates, one bulk delete per batch.
     """
     cleanup_results = {
         "customers_deleted": 0,
@@ -1217,57 +5956,58 @@ async def cleanup_duplicate_data():
         {"name": "Dialog Versicherung AG", "vu_internal_id": "VU-003"},
         {"name": "Itzehoer Versicherung", "vu_internal_id": "VU-004"}
     ]
-    
-    # Get all customers
-    all_customers = await db.kunden.find().to_list(length=None)
+    keep_customer_names = {(keep['name'], keep['vorname']) for keep in customers_to_keep}
+    keep_vu_names = {keep['name'] for keep in vus_to_keep}
     
     # Delete all customers except Dr. Max Mustermann
-    for customer in all_customers:
-        should_keep = False
-        for keep_customer in customers_to_keep:
-            if (customer.get('name') == keep_customer['name'] and 
-                customer.get('vorname') == keep_customer['vorname']):
-                should_keep = True
+    async for batch in db.kunden.scan_batches(batch_size=CLEANUP_BATCH_SIZE):
+        delete_ids = []
+        for customer in batch:
+            if (customer.get('name'), customer.get('vorname')) in keep_customer_names:
                 cleanup_results["customers_kept"].append({
                     "name": customer.get('name'),
                     "vorname": customer.get('vorname'),
                     "kunde_id": customer.get('kunde_id')
                 })
-                break
-        
-        if not should_keep:
-            await db.kunden.delete_one({"id": customer["id"]})
-            cleanup_results["customers_deleted"] += 1
-    
-    # Get all VUs
-    all_vus = await db.vus.find().to_list(length=None)
+            else:
+                delete_ids.append(customer["id"])
+        if delete_ids:
+            result = await db.kunden.delete_many({"id": {"$in": delete_ids}})
+            cleanup_results["customers_deleted"] += result.deleted_count
+        await job_queue.update(job["id"], progress={"customers_deleted": cleanup_results["customers_deleted"]})
     
-    # Delete duplicate VUs
+    # Delete duplicate VUs: keep the first VU of each name to keep
     kept_vu_names = set()
-    for vu in all_vus:
-        should_keep = False
-        vu_name = vu.get('name', '')
-        
-        # Check if this VU should be kept and hasn't been kept yet
-        for keep_vu in vus_to_keep:
-            if (vu_name == keep_vu['name'] and 
-                vu_name not in kept_vu_names):
-                should_keep = True
+    async for batch in db.vus.scan_batches(batch_size=CLEANUP_BATCH_SIZE):
+        delete_ids = []
+        for vu in batch:
+            vu_name = vu.get('name', '')
+            if vu_name in keep_vu_names and vu_name not in kept_vu_names:
                 kept_vu_names.add(vu_name)
                 cleanup_results["vus_kept"].append({
                     "name": vu.get('name'),
                     "kurzbezeichnung": vu.get('kurzbezeichnung'),
                     "vu_internal_id": vu.get('vu_internal_id')
                 })
-                break
-        
-        if not should_keep:
-            await db.vus.delete_one({"id": vu["id"]})
-            cleanup_results["vus_deleted"] += 1
+            else:
+                delete_ids.append(vu["id"])
+        if delete_ids:
+            result = await db.vus.delete_many({"id": {"$in": delete_ids}})
+            cleanup_results["vus_deleted"] += result.deleted_count
     
     return cleanup_results
 
 
+@api_router.post("/admin/cleanup-duplicates", status_code=202)
+async def cleanup_duplicate_data():
+    """
+    Start the cleanup of duplicate customers and VUs as a background job (or return the
+    running one). Poll `GET /jobs/{job_id}`; the summary ends up in its `result`.
+    """
+    job = await job_queue.submit("cleanup_duplicates")
+    return {"job_id": job["id"], "status": job["status"]}
+
+
 @api_router.get("/admin/data-statistics")
 async def get_data_statistics():
     """
@@ -1290,7 +6030,11 @@ async def get_data_statistics():
             "documents": document_count
         },
         "sample_customers": sample_customers,
-        "sample_vus": sample_vus
+        "sample_vus": sample_vus,
+        "caches": {
+            "vu_resolution": vu_matcher.cache_stats()
+        },
+        "jobs": job_queue.stats()
     }
 
 
@@ -1317,42 +6061,29 @@ class ExtractedContractData(BaseModel):
     confidence: float = 0.0
     raw_analysis: str = ""
 
-@api_router.post("/analyze-contract-pdf", response_model=ExtractedContractData)
-async def analyze_contract_pdf(request: PDFAnalysisRequest):
+async def extract_contract_data(pdf_path: Path) -> ExtractedContractData:
     """
-    Analyze PDF document and extract contract data using AI
+    Analyze a PDF document and extract contract data using AI
     """
-    if not AI_ANALYSIS_AVAILABLE:
-        raise HTTPException(status_code=501, detail="AI analysis not available in this environment")
-    try:
-        # Decode base64 content
-        pdf_content = base64.b64decode(request.file_content)
-        
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(pdf_content)
-            temp_file_path = temp_file.name
-        
-        try:
-            # Initialize LLM chat with Gemini for file support
-            emergent_key = os.environ.get('EMERGENT_LLM_KEY')
-            if not emergent_key:
-                raise HTTPException(status_code=500, detail="AI service not configured")
-            
-            chat = LlmChat(
-                api_key=emergent_key,
-                session_id=f"contract-analysis-{uuid.uuid4()}",
-                system_message="Du bist ein spezialisierter AI-Assistent für die Analyse von Versicherungsverträgen. Extrahiere relevante Vertragsdaten aus PDF-Dokumenten."
-            ).with_model("gemini", "gemini-2.0-flash")
-            
-            # Create file attachment
-            pdf_file = FileContentWithMimeType(
-                file_path=temp_file_path,
-                mime_type="application/pdf"
-            )
-            
-            # Create analysis prompt
-            analysis_prompt = """
+    # Initialize LLM chat with Gemini for file support
+    emergent_key = os.environ.get('EMERGENT_LLM_KEY')
+    if not emergent_key:
+        raise RuntimeError("AI service not configured")
+    
+    chat = LlmChat(
+        api_key=emergent_key,
+        session_id=f"contract-analysis-{uuid.uuid4()}",
+        system_message="Du bist ein spezialisierter AI-Assistent für die Analyse von Versicherungsverträgen. Extrahiere relevante Vertragsdaten aus PDF-Dokumenten."
+    ).with_model("gemini", "gemini-2.0-flash")
+    
+    # Create file attachment
+    pdf_file = FileContentWithMimeType(
+        file_path=str(pdf_path),
+        mime_type="application/pdf"
+    )
+    
+    # Create analysis prompt
+    analysis_prompt = """
 Analysiere dieses PDF-Dokument eines Versicherungsvertrags und extrahiere die folgenden Informationen:
 
 **Vertragsdaten:**
@@ -1398,68 +6129,89 @@ Wenn bestimmte Informationen nicht gefunden werden, setze den Wert auf null.
 Gib bei confidence einen Wert zwischen 0 und 1 an, der deine Sicherheit bei der Extraktion widerspiegelt.
 Verwende für Datumsangaben das Format YYYY-MM-DD.
 """
+    
+    # Send message with file attachment
+    user_message = UserMessage(
+        text=analysis_prompt,
+        file_contents=[pdf_file]
+    )
+    
+    response = await chat.send_message(user_message)
+    
+    # Parse the response (assuming it returns JSON)
+    try:
+        # Try to extract JSON from response
+        response_text = str(response)
+        # Find JSON content in response
+        json_start = response_text.find('{')
+        json_end = response_text.rfind('}') + 1
+        
+        if json_start != -1 and json_end > json_start:
+            json_content = response_text[json_start:json_end]
+            extracted_data = json.loads(json_content)
             
-            # Send message with file attachment
-            user_message = UserMessage(
-                text=analysis_prompt,
-                file_contents=[pdf_file]
+            # Create response with extracted data
+            return ExtractedContractData(
+                vertragsnummer=extracted_data.get('vertragsnummer'),
+                gesellschaft=extracted_data.get('gesellschaft'),
+                produkt_sparte=extracted_data.get('produkt_sparte'),
+                tarif=extracted_data.get('tarif'),
+                zahlungsweise=extracted_data.get('zahlungsweise'),
+                beitrag_brutto=extracted_data.get('beitrag_brutto'),
+                beitrag_netto=extracted_data.get('beitrag_netto'),
+                beginn=extracted_data.get('beginn'),
+                ablauf=extracted_data.get('ablauf'),
+                kunde_name=extracted_data.get('kunde_name'),
+                kunde_vorname=extracted_data.get('kunde_vorname'),
+                kunde_strasse=extracted_data.get('kunde_strasse'),
+                kunde_plz=extracted_data.get('kunde_plz'),
+                kunde_ort=extracted_data.get('kunde_ort'),
+                confidence=extracted_data.get('confidence', 0.5),
+                raw_analysis=response_text
             )
+        else:
+            raise ValueError("No valid JSON found in response")
             
-            response = await chat.send_message(user_message)
-            
-            # Parse the response (assuming it returns JSON)
-            import json
-            try:
-                # Try to extract JSON from response
-                response_text = str(response)
-                # Find JSON content in response
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                
-                if json_start != -1 and json_end > json_start:
-                    json_content = response_text[json_start:json_end]
-                    extracted_data = json.loads(json_content)
-                    
-                    # Create response with extracted data
-                    return ExtractedContractData(
-                        vertragsnummer=extracted_data.get('vertragsnummer'),
-                        gesellschaft=extracted_data.get('gesellschaft'),
-                        produkt_sparte=extracted_data.get('produkt_sparte'),
-                        tarif=extracted_data.get('tarif'),
-                        zahlungsweise=extracted_data.get('zahlungsweise'),
-                        beitrag_brutto=extracted_data.get('beitrag_brutto'),
-                        beitrag_netto=extracted_data.get('beitrag_netto'),
-                        beginn=extracted_data.get('beginn'),
-                        ablauf=extracted_data.get('ablauf'),
-                        kunde_name=extracted_data.get('kunde_name'),
-                        kunde_vorname=extracted_data.get('kunde_vorname'),
-                        kunde_strasse=extracted_data.get('kunde_strasse'),
-                        kunde_plz=extracted_data.get('kunde_plz'),
-                        kunde_ort=extracted_data.get('kunde_ort'),
-                        confidence=extracted_data.get('confidence', 0.5),
-                        raw_analysis=response_text
-                    )
-                else:
-                    raise ValueError("No valid JSON found in response")
-                    
-            except (json.JSONDecodeError, ValueError) as e:
-                # If JSON parsing fails, return raw response with low confidence
-                logger.warning(f"Failed to parse AI response as JSON: {e}")
-                return ExtractedContractData(
-                    confidence=0.1,
-                    raw_analysis=str(response)
-                )
-                
-        finally:
-            # Clean up temporary file
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
-                
-    except Exception as e:
-        logger.error(f"Error analyzing PDF: {e}")
-        raise HTTPException(status_code=500, detail=f"Error analyzing PDF: {str(e)}")
+    except (json.JSONDecodeError, ValueError) as e:
+        # If JSON parsing fails, return raw response with low confidence
+        logger.warning(f"Failed to parse AI response as JSON: {e}")
+        return ExtractedContractData(
+            confidence=0.1,
+            raw_analysis=str(response)
+        )
+
+
+async def release_analysis_pdf(job):
+    # Other analyses of the same PDF, or a document uploaded meanwhile, keep it
+    await blob_store.release(job["params"]["content_hash"], functools.partial(blob_referenced, except_job=job["id"]))
+
+
+@job_queue.runner("pdf_analysis", priority=10, on_cancel=release_analysis_pdf)
+async def run_pdf_analysis(job):
+    """Analyze the PDF stored under `params.content_hash`; the result is an ExtractedContractData."""
+    try:
+        extracted = await extract_contract_data(blob_store.path(job["params"]["content_hash"]))
+    except Exception:
+        await release_analysis_pdf(job)
+        raise
+    await release_analysis_pdf(job)
+    return extracted.dict()
+
+
+@api_router.post("/analyze-contract-pdf", status_code=202)
+async def analyze_contract_pdf(request: PDFAnalysisRequest):
+    """
+    Queue the AI analysis of a PDF document. The PDF is kept in the blob store until the
+    job is done; `GET /jobs/{job_id}` returns the ExtractedContractData as `result`.
+    """
+    if not AI_ANALYSIS_AVAILABLE:
+        raise HTTPException(status_code=501, detail="AI analysis not available in this environment")
+    if not os.environ.get('EMERGENT_LLM_KEY'):
+        raise HTTPException(status_code=500, detail="AI service not configured")
+    # The job is stored under the blob's lock: from then on it counts as a reference
+    async with blob_store.store(decode_file_content(request.file_content), blob_referenced) as content_hash:
+        job = await job_queue.submit("pdf_analysis", {"content_hash": content_hash, "file_name": request.file_name})
+    return {"job_id": job["id"], "status": job["status"]}
 
 # Auto-create contract with PDF data and upload document
 @api_router.post("/create-contract-from-pdf")
@@ -1505,7 +6257,7 @@ async def create_contract_from_pdf(
                 contract_data["vu_internal_id"] = matching_vu.vu_internal_id
         
         # Insert contract
-        await db.vertraege.insert_one(contract_data)
+        await db.vertraege.insert_one(prepare_for_mongo(contract_data))
         
         return {
             "success": True,
@@ -1532,6 +6284,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.get("/health")
@@ -1544,7 +6297,14 @@ async def health_api():
     """Health check under /api (no DB)."""
     return {"status": "ok"}
 
+@app.on_event("startup")
+async def startup_db_client():
+    await db.open()
+    await job_queue.start()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    # No DB to close in in-memory mode
-    return None
\ No newline at end of file
+    await job_queue.stop()
+    # Flushes journals in durable mode; nothing to do in pure in-memory mode
+    await db.close()
\ No newline at end of file
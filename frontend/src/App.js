@@ -13,6 +13,20 @@ import {
 
 const API = `${API_BASE ? API_BASE : ""}/api`;
 
+// Poll a background job until it has finished; resolves with its result
+const waitForJob = async (jobId, intervalMs = 1000) => {
+  for (;;) {
+    const job = (await axios.get(`${API}/jobs/${jobId}`)).data;
+    if (job.status === 'completed') {
+      return job.result;
+    }
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs));
+  }
+};
+
 const App = () => {
   const [currentTime, setCurrentTime] = useState(new Date());
   const appRef = useRef(null);
@@ -348,7 +362,7 @@ const App = () => {
   const migrateExistingContracts = async () => {
     try {
       const response = await axios.post(`${API}/vertraege/migrate-vu-assignments`);
-      const results = response.data;
+      const results = await waitForJob(response.data.job_id);
       
       alert(
         `Migration abgeschlossen:\n` +
@@ -976,27 +990,21 @@ const App = () => {
     }
 
     try {
-      const reader = new FileReader();
-      reader.onload = async (e) => {
-        const base64Content = btoa(e.target.result);
-        
-        const formData = new FormData();
-        formData.append('vertrag_id', contractId);
-        formData.append('title', uploadForm.title || uploadForm.file.name);
-        formData.append('description', uploadForm.description);
-        formData.append('tags', uploadForm.tags);
-        formData.append('file_content', base64Content);
-
-        const response = await axios.post(`${API}/documents/upload`, formData);
-        alert('Vertragsdokument erfolgreich hochgeladen!');
-        
-        // Reset form
-        setUploadForm({ title: '', description: '', tags: '', file: null });
-        
-        // Reload contract documents
-        await loadContractDocuments(contractId);
-      };
-      reader.readAsBinaryString(uploadForm.file);
+      const formData = new FormData();
+      formData.append('vertrag_id', contractId);
+      formData.append('title', uploadForm.title || uploadForm.file.name);
+      formData.append('description', uploadForm.description);
+      formData.append('tags', uploadForm.tags);
+      formData.append('file', uploadForm.file);
+
+      const response = await axios.post(`${API}/documents/upload`, formData);
+      alert('Vertragsdokument erfolgreich hochgeladen!');
+      
+      // Reset form
+      setUploadForm({ title: '', description: '', tags: '', file: null });
+      
+      // Reload contract documents
+      await loadContractDocuments(contractId);
     } catch (error) {
       console.error('Fehler beim Hochladen:', error);
       alert('Fehler beim Hochladen: ' + (error.response?.data?.detail || error.message));
@@ -1059,7 +1067,7 @@ const App = () => {
         file_name: file.name
       });
 
-      const extractedData = response.data;
+      const extractedData = await waitForJob(response.data.job_id);
       setExtractedData(extractedData);
 
       // Pre-fill contract form with extracted data
@@ -1200,27 +1208,21 @@ const App = () => {
     }
 
     try {
-      const reader = new FileReader();
-      reader.onload = async (e) => {
-        const base64Content = btoa(e.target.result);
-        
-        const formData = new FormData();
-        formData.append('kunde_id', kundeId);
-        formData.append('title', uploadForm.title || uploadForm.file.name);
-        formData.append('description', uploadForm.description);
-        formData.append('tags', uploadForm.tags);
-        formData.append('file_content', base64Content);
-
-        const response = await axios.post(`${API}/documents/upload`, formData);
-        alert('Dokument erfolgreich hochgeladen!');
-        
-        // Reset form
-        setUploadForm({ title: '', description: '', tags: '', file: null });
-        
-        // Reload documents
-        await loadCustomerDocuments(kundeId);
-      };
-      reader.readAsBinaryString(uploadForm.file);
+      const formData = new FormData();
+      formData.append('kunde_id', kundeId);
+      formData.append('title', uploadForm.title || uploadForm.file.name);
+      formData.append('description', uploadForm.description);
+      formData.append('tags', uploadForm.tags);
+      formData.append('file', uploadForm.file);
+
+      const response = await axios.post(`${API}/documents/upload`, formData);
+      alert('Dokument erfolgreich hochgeladen!');
+      
+      // Reset form
+      setUploadForm({ title: '', description: '', tags: '', file: null });
+      
+      // Reload documents
+      await loadCustomerDocuments(kundeId);
     } catch (error) {
       console.error('Fehler beim Hochladen:', error);
       alert('Fehler beim Hochladen: ' + (error.response?.data?.detail || error.message));
@@ -0,0 +1,41 @@
+import asyncio
+
+from server import BlobStore
+
+
+def test_release_keeps_blob_stored_concurrently(tmp_path):
+    store = BlobStore(tmp_path)
+    references = set()
+
+    async def referenced(content_hash):
+        # Answer, then take a while to return it, like a count on the SQLite engine
+        found = content_hash in references
+        await asyncio.sleep(0.01)
+        return found
+
+    async def upload():
+        async with store.store(b"%PDF-1.4 shared") as content_hash:
+            references.add(content_hash)
+
+    async def scenario():
+        content_hash = await store.put(b"%PDF-1.4 shared")
+        # The upload of the same bytes must not be lost to the concurrent release
+        await asyncio.gather(store.release(content_hash, referenced), upload())
+        return content_hash
+
+    content_hash = asyncio.run(scenario())
+    assert store.exists(content_hash)
+
+
+def test_release_deletes_unreferenced_blob(tmp_path):
+    store = BlobStore(tmp_path)
+
+    async def unreferenced(content_hash):
+        return False
+
+    async def scenario():
+        content_hash = await store.put(b"orphan")
+        assert await store.release(content_hash, unreferenced)
+        return content_hash
+
+    assert not store.exists(asyncio.run(scenario()))
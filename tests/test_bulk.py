@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+
+
+def make_collection():
+    collection = server.SimpleCollection()
+    collection.create_index("id", unique=True)
+    asyncio.run(collection.insert_many([{"id": i, "gruppe": i % 3} for i in range(10)]))
+    return collection
+
+
+def ids(collection):
+    return sorted(doc["id"] for doc in asyncio.run(collection.find({}).to_list(None)))
+
+
+def test_ordered_insert_stops_at_the_first_error():
+    collection = make_collection()
+    with pytest.raises(server.BulkWriteError) as error:
+        asyncio.run(collection.insert_many([{"id": 20}, {"id": 1}, {"id": 21}]))
+    assert error.value.details["nInserted"] == 1
+    assert [e["index"] for e in error.value.details["writeErrors"]] == [1]
+    assert ids(collection) == list(range(10)) + [20]
+
+
+def test_unordered_insert_skips_failed_documents():
+    collection = make_collection()
+    with pytest.raises(server.BulkWriteError) as error:
+        asyncio.run(collection.insert_many([{"id": 30}, {"id": 1}, {"id": 31}, {"id": 2}], ordered=False))
+    assert error.value.details["nInserted"] == 2
+    assert [e["index"] for e in error.value.details["writeErrors"]] == [1, 3]
+    assert ids(collection) == list(range(10)) + [30, 31]
+
+
+def test_mixed_bulk_write():
+    collection = make_collection()
+    result = asyncio.run(collection.bulk_write([
+        {"update_many": {"filter": {"gruppe": 0}, "update": {"$set": {"markiert": True}}}},
+        {"delete_many": {"filter": {"gruppe": 1}}},
+        {"delete_one": {"filter": {"id": 0}}},
+        {"update_one": {"filter": {"id": 2}, "update": {"$set": {"markiert": True}}}},
+        {"insert_one": {"document": {"id": 1}}},
+    ]))
+    assert (result.matched_count, result.deleted_count, result.inserted_count) == (5, 4, 1)
+    assert ids(collection) == [1, 2, 3, 5, 6, 8, 9]
+    assert asyncio.run(collection.count_documents({"markiert": True})) == 4
+
+
+def test_unsupported_bulk_operation_is_reported():
+    collection = make_collection()
+    with pytest.raises(server.BulkWriteError) as error:
+        asyncio.run(collection.bulk_write([{"replace_one": {}}, {"insert_one": {"document": {"id": 50}}}], ordered=False))
+    assert error.value.details["writeErrors"][0]["index"] == 0
+    assert 50 in ids(collection)
+
+
+def test_bulk_create_kunden():
+    items = [{"name": "A"}, {"ort": "Köln"}, {"vorname": "B"}]
+
+    unordered = client.post("/api/kunden/bulk", json=items, params={"ordered": False}).json()
+    assert (unordered["created"], unordered["failed"], unordered["skipped"]) == (2, 1, 0)
+    assert [result["status"] for result in unordered["results"]] == ["created", "error", "created"]
+    kunde_ids = [client.get(f"/api/kunden/{result['id']}").json()["kunde_id"]
+                 for result in unordered["results"] if result["status"] == "created"]
+    assert len(set(kunde_ids)) == 2
+
+    ordered = client.post("/api/kunden/bulk", json=items).json()
+    assert (ordered["created"], ordered["failed"], ordered["skipped"]) == (1, 1, 1)
+
+
+def test_bulk_create_vertraege_assigns_vus():
+    name = f"Bulktest {uuid.uuid4().hex[:6]}"
+    vu = client.post("/api/vus", json={"name": f"{name} Versicherung AG", "kurzbezeichnung": name}).json()
+    items = [
+        {"kunde_id": "k-bulk", "vertragsnummer": f"B{i}", "gesellschaft": name, "beginn": "2024-01-01"}
+        for i in range(3)
+    ] + [{"vertragsnummer": "ohne-kunde"}]
+
+    result = client.post("/api/vertraege/bulk", json=items, params={"ordered": False}).json()
+    assert (result["created"], result["failed"]) == (3, 1)
+    for created in result["results"][:3]:
+        vertrag = client.get(f"/api/vertraege/{created['id']}").json()
+        assert vertrag["vu_id"] == vu["id"]
+        assert vertrag["vu_internal_id"] == vu["vu_internal_id"]
+
+
+def test_bulk_create_vus_numbers_internal_ids():
+    result = client.post("/api/vus/bulk", json=[{"name": "Bulk VU A"}, {"name": "Bulk VU B"}, {"kurzbezeichnung": "x"}],
+                         params={"ordered": False}).json()
+    assert (result["created"], result["failed"]) == (2, 1)
+    numbers = [int(client.get(f"/api/vus/{r['id']}").json()["vu_internal_id"][3:]) for r in result["results"][:2]]
+    assert numbers[1] == numbers[0] + 1
@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+
+
+def upload(content):
+    response = client.post(
+        "/api/documents/upload",
+        data={"title": "Police"},
+        files={"file": ("police.pdf", content, "application/pdf")},
+    )
+    assert response.status_code == 200, response.text
+    document = response.json()
+    return document, f"/api/documents/{document['id']}/content"
+
+
+def test_content_etag_and_conditional_get():
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode() * 100
+    document, url = upload(content)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["etag"] == f'"{document["content_hash"]}"'
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(content))
+
+    etag = response.headers["etag"]
+    not_modified = client.get(url, headers={"If-None-Match": f'"other", {etag}'})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+    head = client.head(url)
+    assert head.status_code == 200
+    assert head.headers["content-length"] == str(len(content))
+    assert head.content == b""
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-0", 0, 0),
+    ("bytes=10-19", 10, 19),
+    ("bytes=100-", 100, None),
+    ("bytes=-7", -7, None),
+    ("bytes=3000-999999", 3000, None),
+])
+def test_content_range(header, start, end):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode() * 100
+    _, url = upload(content)
+
+    response = client.get(url, headers={"Range": header})
+    expected = content[start:] if end is None else content[start:end + 1]
+    first = start % len(content)
+    assert response.status_code == 206
+    assert response.content == expected
+    assert response.headers["content-range"] == f"bytes {first}-{first + len(expected) - 1}/{len(content)}"
+    assert response.headers["content-length"] == str(len(expected))
+
+
+def test_content_range_outside_the_file():
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    _, url = upload(content)
+
+    for header in (f"bytes={len(content)}-", "bytes=-0"):
+        response = client.get(url, headers={"Range": header})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(content)}"
+
+
+def test_content_range_ignored_for_a_stale_if_range():
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    document, url = upload(content)
+
+    stale = client.get(url, headers={"Range": "bytes=0-3", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == content
+    current = client.get(url, headers={"Range": "bytes=0-3", "If-Range": f'"{document["content_hash"]}"'})
+    assert current.status_code == 206
+    assert current.content == content[:4]
+
+
+def test_document_lists_leave_out_file_content():
+    kunde_id = f"k-{uuid.uuid4().hex[:8]}"
+    # Records from before the blob store keep their bytes inline as Base64
+    asyncio.run(server.db.documents.insert_one({
+        "id": str(uuid.uuid4()), "kunde_id": kunde_id, "title": "Alt", "filename": "alt.pdf",
+        "document_type": "other", "file_content": "JVBERi0xLjQ=", "created_at": "2024-01-01T00:00:00",
+    }))
+
+    listed = client.get("/api/documents", params={"kunde_id": kunde_id}).json()
+    assert [document["file_content"] for document in listed] == [None]
+    listed = client.get(f"/api/kunden/{kunde_id}/documents").json()
+    assert [document["file_content"] for document in listed] == [None]
+    listed = client.get("/api/documents", params={"kunde_id": kunde_id, "include_content": True}).json()
+    assert [document["file_content"] for document in listed] == ["JVBERi0xLjQ="]
+    recent = client.get("/api/documents/stats").json()["recent_documents"]
+    assert all(document["file_content"] is None for document in recent)
+
+
+def test_include_content_reads_blobs():
+    kunde_id = f"k-{uuid.uuid4().hex[:8]}"
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    response = client.post(
+        "/api/documents/upload",
+        data={"title": "Police", "kunde_id": kunde_id},
+        files={"file": ("police.pdf", content, "application/pdf")},
+    )
+    assert response.status_code == 200, response.text
+    encoded = base64.b64encode(content).decode("ascii")
+
+    for url in ("/api/documents", f"/api/kunden/{kunde_id}/documents"):
+        listed = client.get(url, params={"kunde_id": kunde_id, "include_content": True}).json()
+        assert [document["file_content"] for document in listed] == [encoded]
+        listed = client.get(url, params={"kunde_id": kunde_id}).json()
+        assert [document["file_content"] for document in listed] == [None]
+    recent = client.get("/api/documents/stats", params={"include_content": True}).json()["recent_documents"]
+    assert [document["file_content"] for document in recent if document["kunde_id"] == kunde_id] == [encoded]
+    # The stored record stays metadata only
+    stored = asyncio.run(server.db.documents.find_one({"kunde_id": kunde_id}))
+    assert stored.get("file_content") is None
+
+
+def test_failed_upload_leaves_no_blob(monkeypatch):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+
+    async def failing_insert(document_dict):
+        failing_insert.content_hash = document_dict["content_hash"]
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(server, "insert_document", failing_insert)
+    response = client.post(
+        "/api/documents/upload",
+        data={"title": "Police"},
+        files={"file": ("police.pdf", content, "application/pdf")},
+    )
+    assert response.status_code == 400
+    assert not server.blob_store.exists(failing_insert.content_hash)
+
+
+def test_failed_upload_keeps_shared_blob(monkeypatch):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    files = {"file": ("police.pdf", content, "application/pdf")}
+    document = client.post("/api/documents/upload", data={"title": "Police"}, files=files).json()
+
+    async def failing_insert(document_dict):
+        raise RuntimeError("insert failed")
+
+    monkeypatch.setattr(server, "insert_document", failing_insert)
+    assert client.post("/api/documents/upload", data={"title": "Kopie"}, files=files).status_code == 400
+    assert server.blob_store.exists(document["content_hash"])
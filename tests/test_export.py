@@ -0,0 +1,98 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import uuid
+
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+
+
+def test_scan_batches_sees_writes_between_batches():
+    collection = server.SimpleCollection()
+    collection.create_index("gruppe")
+
+    async def run():
+        await collection.insert_many([{"id": i, "gruppe": i % 2} for i in range(10)])
+        batches = []
+        async for batch in collection.scan_batches({"gruppe": 0}, 2):
+            batches.append([doc["id"] for doc in batch])
+            if len(batches) == 1:
+                # Deleted and no longer matching documents are skipped by later batches
+                await collection.delete_one({"id": 4})
+                await collection.update_one({"id": 6}, {"$set": {"gruppe": 1}})
+        return batches
+
+    batches = asyncio.run(run())
+    assert batches[0] == [0, 2]
+    assert [i for batch in batches for i in batch] == [0, 2, 8]
+    assert all(len(batch) <= 2 for batch in batches)
+
+
+def test_scan_batches_without_an_index_resumes_after_the_last_seq():
+    collection = server.SimpleCollection()
+
+    async def run():
+        await collection.insert_many([{"id": i, "gruppe": i % 2} for i in range(10)])
+        await collection.delete_many({"id": {"$in": [1, 2, 3]}})
+        batches = []
+        async for batch in collection.scan_batches({}, 3):
+            batches.append([doc["id"] for doc in batch])
+            if len(batches) == 1:
+                # Documents inserted during the scan come after the keyset position
+                await collection.insert_one({"id": 10, "gruppe": 0})
+                await collection.delete_one({"id": 5})
+        return batches
+
+    assert asyncio.run(run()) == [[0, 4, 5], [6, 7, 8], [9, 10]]
+
+
+def create_kunden(ort, count):
+    items = [{"name": f"Export {i}", "vorname": "Erika", "ort": ort, "bankverbindung": {"iban": f"DE{i:04d}"}}
+             for i in range(count)]
+    assert client.post("/api/kunden/bulk", json=items).json()["created"] == count
+
+
+def test_ndjson_export_with_filter():
+    ort = f"Exportstadt {uuid.uuid4().hex[:6]}"
+    create_kunden(ort, 1500)
+    create_kunden("Anderswo", 3)
+
+    response = client.get("/api/export/kunden", params={"ort": ort})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"].startswith('attachment; filename="kunden-')
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 1500
+    assert {row["ort"] for row in rows} == {ort}
+    assert [row["bankverbindung"]["iban"] for row in rows[:2]] == ["DE0000", "DE0001"]
+
+
+def test_gzip_csv_export_round_trips_through_the_import():
+    ort = f"Exportstadt {uuid.uuid4().hex[:6]}"
+    create_kunden(ort, 5)
+
+    response = client.get("/api/export/kunden", params={"ort": ort, "format": "csv", "gzip": True})
+    assert response.headers["content-type"] == "application/gzip"
+    text = gzip.decompress(response.content).decode("utf-8")
+    assert text.startswith("﻿")
+    rows = list(csv.DictReader(io.StringIO(text.lstrip("﻿")), delimiter=";"))
+    assert sorted(row["bankverbindung.iban"] for row in rows) == [f"DE{i:04d}" for i in range(5)]
+
+    # The CSV layout is the one /api/import reads
+    imported = client.post("/api/import/kunden", files={"file": ("kunden.csv", text.encode("utf-8"))}).json()
+    assert imported["created"] == 5, imported
+    again = client.get("/api/export/kunden", params={"ort": ort}).text.splitlines()
+    assert len(again) == 10
+
+
+def test_export_rejects_unknown_filters_and_collections():
+    assert client.get("/api/export/kunden", params={"foo": "1"}).status_code == 422
+    assert client.get("/api/export/kunden", params={"format": "xml"}).status_code == 422
+    assert client.get("/api/export/nix").status_code == 404
+    header = client.get("/api/export/vus", params={"format": "csv"}).text.splitlines()[0]
+    assert "vu_internal_id" in header
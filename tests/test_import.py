@@ -0,0 +1,31 @@
+from server import normalize_import_row
+
+
+def test_only_date_fields_are_converted():
+    row = normalize_import_row({
+        "vertragsnummer": "01.02.2023",
+        "beginn": "1.2.2023",
+        "ablauf": " 31.12.2030 ",
+        "persoenliche_daten.geburtsdatum": "05.06.1970",
+        "beitrag_brutto": "1.234,56 €",
+    })
+
+    assert row == {
+        "vertragsnummer": "01.02.2023",
+        "beginn": "2023-02-01",
+        "ablauf": "2030-12-31",
+        "persoenliche_daten": {"geburtsdatum": "1970-06-05"},
+        "beitrag_brutto": 1234.56,
+    }
+
+
+def test_nested_ndjson_dates():
+    row = normalize_import_row({
+        "persoenliche_daten": {"geburtsdatum": "05.06.1970", "beruf": "12.03.2001"},
+        "bemerkung": "15.01.2024",
+    })
+
+    assert row == {
+        "persoenliche_daten": {"geburtsdatum": "1970-06-05", "beruf": "12.03.2001"},
+        "bemerkung": "15.01.2024",
+    }
@@ -0,0 +1,125 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+@server.job_queue.runner("test_exclusive", exclusive=True)
+async def run_test_exclusive(job):
+    await asyncio.sleep(0.05)
+    return {"ok": True}
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+
+def wait_for(client, job_id):
+    for _ in range(500):
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] not in server.ACTIVE_JOB_STATUSES:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(job)
+
+
+def test_exclusive_submit_is_atomic(client):
+    async def submit_twice():
+        return await asyncio.gather(*(server.job_queue.submit("test_exclusive") for _ in range(2)))
+
+    first, second = client.portal.call(submit_twice)
+    assert first["id"] == second["id"]
+    assert wait_for(client, first["id"])["status"] == "completed"
+
+
+@pytest.fixture
+def fake_analysis(client, monkeypatch):
+    gates = {}
+
+    async def extract(pdf_path):
+        assert pdf_path.exists()
+        gate = gates.setdefault(pdf_path.name, [])
+        event = asyncio.Event()
+        gate.append(event)
+        await event.wait()
+        return server.ExtractedContractData(confidence=0.9)
+
+    def finish_one(content_hash):
+        # The job may be "running" before its analysis started waiting
+        for _ in range(500):
+            if gates.get(content_hash):
+                return client.portal.call(lambda: _set(gates[content_hash].pop(0)))
+            time.sleep(0.01)
+        raise AssertionError(content_hash)
+
+    monkeypatch.setattr(server, "AI_ANALYSIS_AVAILABLE", True)
+    monkeypatch.setenv("EMERGENT_LLM_KEY", "test")
+    monkeypatch.setattr(server, "extract_contract_data", extract)
+    return finish_one
+
+
+async def _set(event):
+    event.set()
+
+
+def submit_analysis(client, content):
+    body = {"file_content": server.base64.b64encode(content).decode(), "file_name": "police.pdf"}
+    response = client.post("/api/analyze-contract-pdf", json=body)
+    assert response.status_code == 202, response.text
+    return response.json()["job_id"]
+
+
+def wait_running(client, job_id):
+    for _ in range(500):
+        if client.get(f"/api/jobs/{job_id}").json()["status"] == "running":
+            return
+        time.sleep(0.01)
+    raise AssertionError(job_id)
+
+
+def test_analyses_of_the_same_pdf_share_the_blob(client, fake_analysis):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    first, second = submit_analysis(client, content), submit_analysis(client, content)
+    wait_running(client, first)
+    wait_running(client, second)
+    content_hash = client.get(f"/api/jobs/{first}").json()["params"]["content_hash"]
+
+    fake_analysis(content_hash)
+    assert wait_for(client, first)["result"]["confidence"] == 0.9
+    assert server.blob_store.exists(content_hash)
+
+    fake_analysis(content_hash)
+    assert wait_for(client, second)["status"] == "completed"
+    assert not server.blob_store.exists(content_hash)
+
+
+def test_deleting_a_document_keeps_the_pdf_of_a_running_analysis(client, fake_analysis):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    document = client.post(
+        "/api/documents/upload", data={"title": "Police"}, files={"file": ("police.pdf", content, "application/pdf")}
+    ).json()
+    job_id = submit_analysis(client, content)
+    wait_running(client, job_id)
+
+    assert client.delete(f"/api/documents/{document['id']}").status_code == 200
+    assert server.blob_store.exists(document["content_hash"])
+
+    fake_analysis(document["content_hash"])
+    assert wait_for(client, job_id)["status"] == "completed"
+    assert not server.blob_store.exists(document["content_hash"])
+
+
+def test_cancelled_analysis_releases_the_pdf(client, fake_analysis):
+    content = f"%PDF-1.4 {uuid.uuid4()}".encode()
+    job_id = submit_analysis(client, content)
+    wait_running(client, job_id)
+    content_hash = client.get(f"/api/jobs/{job_id}").json()["params"]["content_hash"]
+
+    assert client.post(f"/api/jobs/{job_id}/cancel").json()["status"] == "cancelled"
+    assert not server.blob_store.exists(content_hash)
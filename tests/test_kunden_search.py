@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+
+
+def create_kunde_with_vertrag(**vertrag):
+    kunde = client.post("/api/kunden", json={"vorname": "Erika", "name": f"Test-{uuid.uuid4().hex[:8]}"}).json()
+    response = client.post("/api/vertraege", json={"kunde_id": kunde["id"], **vertrag})
+    assert response.status_code == 200, response.text
+    return kunde
+
+
+def search(**params):
+    response = client.get("/api/kunden/search", params=params)
+    assert response.status_code == 200, response.text
+    return {kunde["id"] for kunde in response.json()}
+
+
+def test_kennzeichen_matches_anywhere():
+    suffix = uuid.uuid4().hex[:6].upper()
+    kunde = create_kunde_with_vertrag(kfz_kennzeichen=f"K-AB {suffix}", gesellschaft="Allianz")
+    create_kunde_with_vertrag(kfz_kennzeichen="M-XY 1", gesellschaft="Allianz")
+
+    assert search(kfz_kennzeichen=suffix) == {kunde["id"]}
+    assert search(kfz_kennzeichen=f"ab {suffix.lower()}") == {kunde["id"]}
+
+
+def test_vertragsnummer_matches_anywhere():
+    nummer = uuid.uuid4().hex[:10].upper()
+    kunde = create_kunde_with_vertrag(vertragsnummer=f"LV-{nummer}", gesellschaft="Allianz")
+
+    assert search(vertragsnummer=nummer[-6:]) == {kunde["id"]}
+
+
+def test_contract_criteria_fall_back_to_any_match():
+    suffix = uuid.uuid4().hex[:8].upper()
+    erste = create_kunde_with_vertrag(kfz_kennzeichen=f"K-{suffix}", vertragsnummer=f"A-{suffix}")
+    zweite = create_kunde_with_vertrag(kfz_kennzeichen=f"M-{suffix}", vertragsnummer=f"B-{suffix}")
+
+    # Criteria matching the same customer narrow the result
+    assert search(kfz_kennzeichen=f"K-{suffix}", vertragsnummer=f"A-{suffix}") == {erste["id"]}
+    # A criterion nothing matches is ignored next to one that matches
+    assert search(kfz_kennzeichen=f"K-{suffix}", vertragsnummer=f"X-{suffix}") == {erste["id"]}
+    # Criteria matching different customers return both (lenient, as before the lookup index)
+    assert search(kfz_kennzeichen=f"K-{suffix}", vertragsnummer=f"B-{suffix}") == {erste["id"], zweite["id"]}
+    # Nothing matches: no customers, not all of them
+    assert search(vertragsnummer=f"X-{suffix}") == set()
+
+
+@pytest.mark.parametrize("engine", ["memory", "sqlite"])
+def test_contains_lookup_matches_a_scan(tmp_path, engine):
+    database = server.InMemoryDB() if engine == "memory" else server.SQLiteDB(tmp_path / "lookup.db")
+    nummern = [f"LV-{i * 7919 % 100000:05d}-{'AB'[i % 2]}" for i in range(300)]
+
+    async def run():
+        await database.vertraege.insert_many([
+            {"id": f"v{i}", "kunde_id": f"k{i % 50}", "vertragsnummer": nummer} for i, nummer in enumerate(nummern)
+        ])
+        # Enough deletes to make the in-memory trigram postings rebuild, then re-adds
+        await database.vertraege.delete_many({"id": {"$in": [f"v{i}" for i in range(0, 300, 2)]}})
+        await database.vertraege.insert_one({"id": "neu", "kunde_id": "k-neu", "vertragsnummer": nummern[0]})
+        await database.vertraege.update_one({"id": "v1"}, {"$set": {"vertragsnummer": "LV-99999-C"}})
+        stored = await database.vertraege.find({}).to_list(None)
+        results = {}
+        for needle in ["9", "99", "999", "lv9", "0-A", "-b", "123", "LV-99999-C", "nichts"]:
+            results[needle] = await database.vertraege.lookup("vertragsnummer", needle, match="contains")
+        await database.close()
+        return stored, results
+
+    stored, results = asyncio.run(run())
+    for needle, found in results.items():
+        key = server.lookup_key(needle)
+        expected = {doc["kunde_id"] for doc in stored if key in server.lookup_key(doc["vertragsnummer"])}
+        assert found == expected, needle
+    assert results["LV-99999-C"] == {"k1"}
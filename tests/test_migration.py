@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = server.InMemoryDB()
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "vu_matcher", server.VUMatcher(db.vus))
+    monkeypatch.setattr(server, "VU_MIGRATION_BATCH_SIZE", 4)
+    queue = server.JobQueue(db.jobs)
+    queue.runner("vu_migration", exclusive=True)(server.run_vu_migration)
+    monkeypatch.setattr(server, "job_queue", queue)
+
+    async def fill():
+        await db.vus.insert_many([
+            {"id": "allianz", "vu_internal_id": "VU-001", "name": "Allianz Versicherungs-AG",
+             "kurzbezeichnung": "Allianz"},
+            {"id": "huk", "vu_internal_id": "VU-002", "name": "HUK-COBURG", "kurzbezeichnung": "HUK"},
+        ])
+        contracts = (
+            [{"gesellschaft": "Allianz"}] * 10
+            + [{"gesellschaft": "HUK-Coburg"}] * 6
+            + [{"gesellschaft": "Unbekannt"}] * 3
+            + [{"gesellschaft": None}]
+            + [{"gesellschaft": "Allianz", "vu_id": "alt", "vu_internal_id": "VU-999"}] * 2
+        )
+        await db.vertraege.insert_many([{"id": f"v{i:02d}", **contract} for i, contract in enumerate(contracts)])
+
+    asyncio.run(fill())
+    return db
+
+
+async def finish(queue):
+    while queue._running:
+        await asyncio.gather(*queue._running.values())
+
+
+def assignments(db):
+    contracts = asyncio.run(db.vertraege.find({}).to_list(None))
+    return {contract["id"]: contract.get("vu_internal_id") for contract in contracts}
+
+
+def check_completed(db, job_id, matches):
+    job = asyncio.run(db.jobs.find_one({"id": job_id}))
+    assert job["status"] == "completed"
+    result = job["result"]
+    assert (result["total_contracts"], result["matched"], result["unmatched"]) == (20, 16, 3)
+    assert result["unmatched_gesellschaften"] == ["Unbekannt"]
+    assert {match["vu_internal_id"]: match["contracts"] for match in result["matches"]} == matches
+
+    assigned = assignments(db)
+    assert [assigned[f"v{i:02d}"] for i in range(10)] == ["VU-001"] * 10
+    assert [assigned[f"v{i:02d}"] for i in range(10, 16)] == ["VU-002"] * 6
+    assert [assigned[f"v{i:02d}"] for i in range(16, 22)] == [None] * 4 + ["VU-999"] * 2
+
+
+def test_migration_assigns_vus(db):
+    async def run():
+        job = await server.job_queue.submit("vu_migration")
+        await finish(server.job_queue)
+        return job["id"]
+
+    check_completed(db, asyncio.run(run()), {"VU-001": 10, "VU-002": 6})
+
+
+def test_migration_resumes_from_its_checkpoint(db, monkeypatch):
+    queue = server.job_queue
+    update_many = db.vertraege.update_many
+    calls = []
+
+    async def hang_on_third_update(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 3:
+            await asyncio.Event().wait()
+        return await update_many(*args, **kwargs)
+
+    monkeypatch.setattr(db.vertraege, "update_many", hang_on_third_update)
+
+    async def run():
+        job = await queue.submit("vu_migration")
+        while len(calls) < 3:
+            await asyncio.sleep(0)
+        # Shutdown in the middle of the third batch
+        await queue.stop()
+        stored = await db.jobs.find_one({"id": job["id"]})
+        # Two batches of four made it and were checkpointed
+        assert stored["status"] == "running" and stored["checkpoint"] == {"updated": 8}
+        assert await db.vertraege.count_documents({"vu_internal_id": {"$exists": True}}) == 10
+
+        monkeypatch.setattr(db.vertraege, "update_many", update_many)
+        await queue.start()
+        await finish(queue)
+        return job["id"]
+
+    job_id = asyncio.run(run())
+    # The resumed run only scans what is left; its counters cover the whole migration,
+    # its matches only the contracts it assigned itself
+    check_completed(db, job_id, {"VU-001": 2, "VU-002": 6})
+    assert asyncio.run(db.jobs.find_one({"id": job_id}))["progress"]["phase"] == "done"
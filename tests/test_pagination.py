@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+from fastapi.testclient import TestClient
+
+import server
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_collection(request, tmp_path):
+    databases = []
+
+    def make():
+        if request.param == "memory":
+            collection = server.SimpleCollection()
+            collection.create_index("id", unique=True)
+            collection.create_index("created_at", ordered=True)
+        else:
+            databases.append(server.SQLiteDB(tmp_path / f"page{len(databases)}.db"))
+            collection = databases[-1].documents
+        fill(collection)
+        return collection
+
+    yield make
+    for database in databases:
+        asyncio.run(database.close())
+
+
+def fill(collection):
+    docs = [
+        # Equal timestamps make the id the tie-breaker
+        {"id": f"d{i:03d}", "created_at": f"2024-01-{1 + i // 3:02d}T00:00:00", "kunde_id": f"k{i % 2}"}
+        for i in range(25)
+    ]
+    docs.append({"id": "no-timestamp", "created_at": None, "kunde_id": "k0"})
+    asyncio.run(collection.insert_many(docs))
+
+
+def all_pages(collection, query, limit):
+    pages, cursor = [], ""
+    while cursor is not None:
+        response = Response()
+        pages.append(asyncio.run(server.find_page(collection, query, cursor, limit, response)))
+        cursor = response.headers.get("X-Next-Cursor")
+    return pages
+
+
+@pytest.mark.parametrize("limit", [1, 4, 7, 25, 100])
+def test_pages_cover_every_document_once(make_collection, limit):
+    collection = make_collection()
+    ids = [doc["id"] for page in all_pages(collection, {}, limit) for doc in page]
+    assert ids == sorted(f"d{i:03d}" for i in range(25))
+
+
+def test_pages_keep_the_callers_filter(make_collection):
+    collection = make_collection()
+    query = {"kunde_id": "k1", "created_at": {"$lt": "2024-01-05"}}
+    ids = [doc["id"] for page in all_pages(collection, query, 3) for doc in page]
+    expected = [f"d{i:03d}" for i in range(12) if i % 2]
+    assert ids == expected
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_cursor_pages_need_a_positive_limit(make_collection, limit):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.find_page(make_collection(), {}, "", limit, Response()))
+    assert error.value.status_code == 422
+
+
+def test_endpoint_pages_survive_concurrent_writes():
+    client = TestClient(server.app)
+    existing = {client.post("/api/kunden", json={"name": f"Seite {i}"}).json()["id"] for i in range(7)}
+    seen, added, cursor = [], set(), ""
+    while cursor is not None:
+        response = client.get("/api/kunden", params={"cursor": cursor, "limit": 40})
+        assert response.status_code == 200, response.text
+        seen += [kunde["id"] for kunde in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        # Writes between pages must not shift the later pages: new records come last,
+        # deleting an already returned one doesn't skip anything
+        added.add(client.post("/api/kunden", json={"name": "Neu"}).json()["id"])
+        assert client.delete(f"/api/kunden/{seen[-1]}").status_code == 200
+    assert len(seen) == len(set(seen))
+    assert existing <= set(seen)
+    assert len(added & set(seen)) == len(added) - 1  # all but the one added after the last page
+
+
+@pytest.mark.parametrize("url", ["/api/kunden", "/api/vertraege/expiring", "/api/documents"])
+def test_list_endpoints_accept_a_negative_limit(url):
+    client = TestClient(server.app)
+    response = client.get(url, params={"limit": -1})
+    assert response.status_code == 200, response.text
+    assert len(response.json()) <= 1
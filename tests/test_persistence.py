@@ -0,0 +1,208 @@
+import asyncio
+import uuid
+
+import pytest
+
+import server
+
+FORMATS = ["jsonl", "columnar"]
+
+
+async def open_db(data_dir, snapshot_format):
+    db = server.InMemoryDB()
+    db.persistence = server.DurableStore(db, data_dir, commit_interval_ms=0, snapshot_interval=0,
+                                         snapshot_format=snapshot_format)
+    await db.persistence.open()
+    return db
+
+
+async def write(db, start, count):
+    for i in range(start, start + count):
+        await db.kunden.insert_one({
+            "id": f"k{i:03d}",
+            "name": f"Kunde {i}",
+            "ort": ["Köln", "Bonn", None][i % 3],
+            "persoenliche_daten": {"geburtsdatum": f"1970-01-{1 + i % 28:02d}", "kinder": i % 3},
+            "tags": ["a", "b"][: i % 3],
+            "created_at": f"2024-02-{1 + i % 28:02d}T10:00:00",
+        })
+        await db.vertraege.insert_one({
+            "id": f"v{i:03d}",
+            "kunde_id": f"k{i:03d}",
+            "beitrag_brutto": i * 10.5,
+            "ablauf": f"2026-{1 + i % 12:02d}-01" if i % 4 else None,
+            **({"beginn": "2020-01-01"} if i % 5 else {}),
+        })
+
+
+async def change(db):
+    await db.kunden.update_one({"id": "k001"}, {"$set": {"ort": "Aachen", "persoenliche_daten": {"kinder": 5}}})
+    await db.kunden.update_one({"id": "k004"}, {"$set": {"status": "inaktiv"}})
+    await db.kunden.delete_one({"id": "k002"})
+    await db.vertraege.delete_one({"kunde_id": "k002"})
+    await db.vertraege.update_one({"id": "v004"}, {"$set": {"ablauf": "2030-01-01"}})
+    await db.vertraege.update_many({"kunde_id": {"$in": ["k005", "k006"]}}, {"$unset": {"ablauf": "", "beginn": ""}})
+
+
+async def contents(db):
+    return {
+        name: sorted(await collection.find({}).to_list(None), key=lambda doc: doc["id"])
+        for name, collection in db.collections().items()
+    }
+
+
+def reopen(data_dir, snapshot_format, scenario):
+    """Run `scenario` against a durable database, close it and return (before, after reopening)."""
+    async def run():
+        db = await open_db(data_dir, snapshot_format)
+        await scenario(db)
+        before = await contents(db)
+        await db.close()
+        db = await open_db(data_dir, snapshot_format)
+        after = await contents(db)
+        # Indexes are rebuilt and new records don't reuse sequence numbers
+        assert [doc["id"] for doc in await db.vertraege.find({"kunde_id": "k001"}).to_list(None)] == ["v001"]
+        await db.kunden.insert_one({"id": uuid.uuid4().hex, "name": "Neu"})
+        assert await db.kunden.count_documents({}) == len(after["kunden"]) + 1
+        await db.close()
+        return before, after
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("snapshot_format", FORMATS)
+def test_journal_replay_restores_data(tmp_path, snapshot_format):
+    async def scenario(db):
+        await write(db, 0, 30)
+        await change(db)
+
+    before, after = reopen(tmp_path, snapshot_format, scenario)
+    assert after == before
+    assert not list(tmp_path.glob("*.snapshot.*"))
+    unset = [doc for doc in after["vertraege"] if doc["id"] in ("v005", "v006")]
+    assert len(unset) == 2 and all("ablauf" not in doc and "beginn" not in doc for doc in unset)
+
+
+@pytest.mark.parametrize("snapshot_format", FORMATS)
+def test_snapshot_and_journal_replay_restore_data(tmp_path, snapshot_format):
+    async def scenario(db):
+        await write(db, 0, 30)
+        await db.persistence.snapshot()
+        # Changes after the snapshot are only in the new journal generation
+        await write(db, 30, 10)
+        await change(db)
+
+    before, after = reopen(tmp_path, snapshot_format, scenario)
+    assert after == before
+    suffix = server.DurableStore.SNAPSHOT_SUFFIXES[snapshot_format]
+    assert (tmp_path / f"kunden.{suffix}").exists()
+    assert [path.name for path in tmp_path.glob("kunden.wal.*")] == ["kunden.wal.1"]
+
+
+@pytest.mark.parametrize("snapshot_format", FORMATS)
+def test_snapshot_of_a_loaded_snapshot(tmp_path, snapshot_format):
+    async def first(db):
+        await write(db, 0, 30)
+        await db.persistence.snapshot()
+
+    async def second(db):
+        # Documents come from the loaded snapshot and are changed before the next one
+        await change(db)
+        await db.persistence.snapshot()
+        await write(db, 30, 5)
+
+    reopen(tmp_path, snapshot_format, first)
+    before, after = reopen(tmp_path, snapshot_format, second)
+    assert after == before
+    assert "k002" not in {doc["id"] for doc in after["kunden"]}
+
+
+def test_torn_journal_record_is_ignored(tmp_path):
+    async def scenario(db):
+        await write(db, 0, 5)
+
+    before, _ = reopen(tmp_path, "jsonl", scenario)
+    with open(tmp_path / "kunden.wal.0", "a", encoding="utf-8") as f:
+        f.write('["i", 999, {"id": "torn"')
+
+    async def check():
+        db = await open_db(tmp_path, "jsonl")
+        ids = {doc["id"] for doc in await db.kunden.find({}).to_list(None)}
+        await db.close()
+        return ids
+
+    ids = asyncio.run(check())
+    # Everything before the torn record survives, including the helper's extra insert
+    assert "torn" not in ids
+    assert {doc["id"] for doc in before["kunden"]} < ids and len(ids) == len(before["kunden"]) + 1
+
+
+@pytest.mark.parametrize("engine", ["memory", "sqlite"])
+def test_update_operators(tmp_path, engine):
+    database = server.InMemoryDB() if engine == "memory" else server.SQLiteDB(tmp_path / "update.db")
+
+    async def run():
+        await write(database, 0, 3)
+        await database.vertraege.update_one({"id": "v001"}, {"$set": {"status": "aktiv"}, "$unset": {"ablauf": 1}})
+        # The index on ablauf has to forget the removed value
+        assert await database.vertraege.find({"ablauf": "2026-02-01"}).to_list(None) == []
+        for update in ({"$inc": {"beitrag_brutto": 1}}, {"$set": {"status": "x"}, "status": "y"}, {"$unset": ["ablauf"]}):
+            with pytest.raises(ValueError):
+                await database.vertraege.update_one({"id": "v002"}, update)
+        docs = {doc["id"]: doc for doc in await database.vertraege.find({}).to_list(None)}
+        await database.close()
+        return docs
+
+    docs = asyncio.run(run())
+    assert docs["v001"]["status"] == "aktiv" and "ablauf" not in docs["v001"]
+    assert not any(key.startswith("$") or key == "status" for key in docs["v002"])
+
+
+def test_conflicting_journal_record_is_skipped(tmp_path, caplog):
+    async def scenario(db):
+        await write(db, 0, 5)
+
+    before, _ = reopen(tmp_path, "jsonl", scenario)
+    wal = tmp_path / "kunden.wal.0"
+    offset = wal.stat().st_size
+    with open(wal, "a", encoding="utf-8") as f:
+        # An insert that violates the unique id index, then one that is fine
+        f.write('["i", 900, {"id": "k001", "name": "Doppelt"}]\n')
+        f.write('["i", 901, {"id": "danach", "name": "Danach"}]\n')
+
+    async def check():
+        db = await open_db(tmp_path, "jsonl")
+        docs = {doc["id"]: doc for doc in await db.kunden.find({}).to_list(None)}
+        await db.close()
+        return docs
+
+    docs = asyncio.run(check())
+    assert docs["k001"]["name"] == "Kunde 1"
+    assert "danach" in docs and len(docs) == len(before["kunden"]) + 2
+    assert f"kunden.wal.0:{offset}" in caplog.text
+
+
+def test_sqlite_reports_only_unique_violations_as_duplicates(tmp_path):
+    database = server.SQLiteDB(tmp_path / "constraints.db")
+
+    def add_trigger(connection):
+        connection.execute(
+            f"CREATE TRIGGER gesperrt BEFORE UPDATE ON {database.kunden.table} "
+            "WHEN json_extract(NEW.doc, '$.name') = 'Gesperrt' BEGIN SELECT RAISE(ABORT, 'gesperrt'); END"
+        )
+
+    async def run():
+        await write(database, 0, 2)
+        with pytest.raises(server.DuplicateKeyError):
+            await database.kunden.insert_one({"id": "k000", "name": "Doppelt"})
+        with pytest.raises(server.DuplicateKeyError):
+            await database.kunden.update_one({"id": "k001"}, {"$set": {"id": "k000"}})
+        # Any other constraint keeps its own error
+        await database._write(add_trigger)
+        with pytest.raises(server.sqlite3.IntegrityError):
+            await database.kunden.update_one({"id": "k001"}, {"$set": {"name": "Gesperrt"}})
+        names = [doc["name"] for doc in await database.kunden.find({}).sort("id", 1).to_list(None)]
+        await database.close()
+        return names
+
+    assert asyncio.run(run()) == ["Kunde 0", "Kunde 1"]
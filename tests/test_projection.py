@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+import server
+
+DOC = {
+    "_id": "x1",
+    "id": "k1",
+    "name": "Muster",
+    "persoenliche_daten": {"geburtsdatum": "1970-01-01", "beruf": "Lehrerin"},
+    "bankverbindungen": [{"iban": "DE01", "bic": "ABC"}, {"iban": "DE02"}],
+    "file_content": "aGFsbG8=",
+}
+
+
+@pytest.mark.parametrize("projection, expected", [
+    ({"name": 1}, {"_id": "x1", "name": "Muster"}),
+    ({"name": 1, "_id": 0}, {"name": "Muster"}),
+    (["id", "persoenliche_daten.beruf"], {"_id": "x1", "id": "k1", "persoenliche_daten": {"beruf": "Lehrerin"}}),
+    ({"bankverbindungen.iban": 1, "_id": 0}, {"bankverbindungen": [{"iban": "DE01"}, {"iban": "DE02"}]}),
+    ({"persoenliche_daten": 1, "persoenliche_daten.beruf": 1, "_id": 0},
+     {"persoenliche_daten": {"geburtsdatum": "1970-01-01", "beruf": "Lehrerin"}}),
+    ({"file_content": 0, "bankverbindungen": 0, "persoenliche_daten.beruf": 0},
+     {"_id": "x1", "id": "k1", "name": "Muster", "persoenliche_daten": {"geburtsdatum": "1970-01-01"}}),
+    ({"_id": 0}, {key: value for key, value in DOC.items() if key != "_id"}),
+    ({"missing": 1}, {"_id": "x1"}),
+])
+def test_projection(projection, expected):
+    assert server.compile_projection(projection)(DOC) == expected
+
+
+def test_mixed_projection_is_rejected():
+    with pytest.raises(ValueError):
+        server.compile_projection({"name": 1, "file_content": 0})
+
+
+def test_find_projects_after_filtering_and_sorting():
+    collection = server.SimpleCollection()
+
+    async def run():
+        for i in range(5):
+            await collection.insert_one({"id": i, "rank": -i, "file_content": "x" * i})
+        found = await collection.find({"file_content": {"$ne": ""}}, {"id": 1, "_id": 0}).sort("rank", 1).limit(2).to_list(None)
+        one = await collection.find_one({"id": 3}, {"file_content": 0})
+        return found, one
+
+    found, one = asyncio.run(run())
+    assert found == [{"id": 4}, {"id": 3}]
+    assert one == {"id": 3, "rank": -3}
+    # Projected documents are copies; the stored one is untouched
+    one["rank"] = 99
+    assert asyncio.run(collection.find_one({"id": 3}))["rank"] == -3
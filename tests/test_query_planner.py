@@ -0,0 +1,214 @@
+import asyncio
+
+import pytest
+
+import server
+
+# Several operators on one field, which all have to hold
+COMBINED = [
+    {"ablauf": {"$ne": None, "$gte": "2025-03-01"}},
+    {"ablauf": {"$exists": True, "$lt": "2025-05-01"}},
+    {"ablauf": {"$ne": "2025-06-15", "$gte": "2025-06-01", "$lte": "2025-07-01"}},
+    {"kunde_id": {"$ne": "k2", "$in": ["k1", "k2", None]}},
+    {"kunde_id": {"$regex": "^k", "$ne": "k1"}},
+    {"beitrag": {"$exists": True, "$lte": 31.5}},
+]
+
+QUERIES = [
+    {},
+    {"kunde_id": "k3"},
+    {"kunde_id": {"$in": ["k1", "k4", "missing"]}},
+    {"kunde_id": {"$exists": False}},
+    {"kunde_id": {"$regex": "^K1", "$options": "i"}},
+    {"kunde_id": {"$ne": "k2"}},
+    {"kunde_id": None},
+    {"kunde_id": "k1", "gesellschaft": "Allianz"},
+    {"ablauf": {"$gte": "2025-03-01", "$lt": "2025-09-01"}},
+    {"ablauf": {"$lte": "2025-02-01"}, "gesellschaft": "Allianz"},
+    {"ablauf": None},
+    {"ablauf": "2025-06-15"},
+    {"beitrag": {"$gt": 30}},
+    *COMBINED,
+    {"created_at": {"$gt": "2024-01-10T00:00:00"}, "kunde_id": "k0"},
+    # Bounds equal to stored values
+    {"created_at": {"$gt": "2024-01-10T00:00:00", "$lte": "2024-01-12T00:00:00"}},
+    {"created_at": {"$gte": "2024-01-03T00:00:00", "$lt": "2024-01-05T00:00:00"}},
+    {"created_at": {"$in": ["2024-01-02T00:00:00", "2024-01-15T00:00:00"]}},
+    {"$or": [{"kunde_id": "k1"}, {"ablauf": {"$gt": "2025-11-01"}}]},
+    {"$or": [{"kunde_id": "k1"}, {"id": "v005"}]},
+    {"$or": [{"kunde_id": "k1"}, {"gesellschaft": "HUK"}]},
+    {"$and": [{"created_at": {"$gte": "2024-01-05T00:00:00"}}, {"created_at": {"$lt": "2024-01-09T00:00:00"}}]},
+    {"$and": [{"kunde_id": "k1"}, {"$or": [{"gesellschaft": "HUK"}, {"ablauf": None}]}]},
+    {"id": "v007"},
+    {"details.sparte": "KFZ"},
+]
+
+SORTS = [
+    [("ablauf", 1)],
+    [("ablauf", -1)],
+    [("beitrag", -1), ("id", 1)],
+    [("gesellschaft", 1), ("id", -1)],
+    [("details.sparte", -1), ("ablauf", 1), ("id", 1)],
+]
+
+
+def make_docs():
+    docs = []
+    for i in range(60):
+        doc = {
+            "id": f"v{i:03d}",
+            "created_at": f"2024-01-{1 + i // 4:02d}T00:00:00",
+            "gesellschaft": ["Allianz", "HUK", "ERGO"][i % 3],
+            "details": {"sparte": "KFZ" if i % 4 == 0 else "Hausrat"},
+        }
+        if i % 5:
+            doc["beitrag"] = (i * 7) % 11 * 10.5
+        if i % 7:
+            doc["kunde_id"] = f"k{i % 5}"
+        if i % 9:
+            doc["ablauf"] = f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}"
+        elif i % 2:
+            doc["ablauf"] = None
+        docs.append(doc)
+    return docs
+
+
+def create_indexes(collection):
+    collection.create_index("id", unique=True)
+    collection.create_index("kunde_id")
+    collection.create_index("ablauf", ordered=True)
+    collection.create_index("created_at", ordered=True)
+
+
+async def fill(collection):
+    for doc in make_docs():
+        await collection.insert_one(doc)
+    # Updates and deletes have to keep the indexes in step with the documents
+    for doc in await collection.find({"gesellschaft": "ERGO"}).to_list(None):
+        await collection.update_one({"id": doc["id"]}, {"$set": {"kunde_id": "k9"}})
+    await collection.update_one({"id": "v010"}, {"$set": {"ablauf": "2025-06-15"}})
+    for doc in await collection.find({"kunde_id": "k4"}).to_list(None):
+        await collection.delete_one({"id": doc["id"]})
+
+
+def make_collection(indexed: bool):
+    collection = server.SimpleCollection()
+    if indexed:
+        create_indexes(collection)
+    asyncio.run(fill(collection))
+    return collection
+
+
+@pytest.fixture(scope="module")
+def collections():
+    return make_collection(indexed=True), make_collection(indexed=False)
+
+
+@pytest.fixture(scope="module")
+def sqlite_collection(tmp_path_factory):
+    database = server.SQLiteDB(tmp_path_factory.mktemp("planner") / "planner.db")
+    asyncio.run(fill(database.vertraege))
+    yield database.vertraege
+    asyncio.run(database.close())
+
+
+def run(collection, query, sort=None, limit=0, skip=0):
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    return asyncio.run(cursor.skip(skip).limit(limit).to_list(None))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_index_plans_match_a_full_scan(collections, query):
+    indexed, plain = collections
+    assert plain.explain(query)["stage"] == "COLLSCAN"
+    expected = sorted(doc["id"] for doc in run(plain, query))
+    assert sorted(doc["id"] for doc in run(indexed, query)) == expected
+    assert asyncio.run(indexed.count_documents(query)) == len(expected)
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_sqlite_translation_matches_a_full_scan(collections, sqlite_collection, query):
+    _, plain = collections
+    expected = sorted(doc["id"] for doc in run(plain, query))
+    assert sorted(doc["id"] for doc in run(sqlite_collection, query)) == expected
+
+
+@pytest.mark.parametrize("query", COMBINED)
+def test_operators_on_one_field_are_combined(collections, sqlite_collection, query):
+    (field, condition), = query.items()
+    # The same as one condition per operator
+    per_operator = [{field: {op: bound}} for op, bound in condition.items()]
+    _, plain = collections
+    expected = sorted(doc["id"] for doc in run(plain, {"$and": per_operator}))
+    assert expected
+    for collection in (*collections, sqlite_collection):
+        assert sorted(doc["id"] for doc in run(collection, query)) == expected
+
+
+def test_indexes_are_used(collections):
+    indexed, _ = collections
+    assert indexed.explain({"kunde_id": "k3"})["stage"] == "IXSCAN"
+    assert indexed.explain({"kunde_id": "k3", "gesellschaft": "HUK"})["residual"] == ["gesellschaft"]
+    assert indexed.explain({"$or": [{"kunde_id": "k1"}, {"id": "v005"}]})["stage"] == "OR"
+    assert indexed.explain({"$or": [{"kunde_id": "k1"}, {"gesellschaft": "HUK"}]})["stage"] == "COLLSCAN"
+    assert indexed.find({"kunde_id": "k3"}).explain()["scanned"] < len(indexed._docs)
+    assert indexed.explain({"ablauf": {"$gte": "2025-03-01"}})["index"] == "ablauf"
+    assert indexed.explain({"created_at": {"$lt": "2024-01-03T00:00:00"}})["residual"] == []
+    plan = indexed.explain({"ablauf": {"$ne": None, "$gte": "2025-03-01"}})
+    assert (plan["index"], plan["residual"]) == ("ablauf", [])
+
+
+@pytest.mark.parametrize("skip, limit", [(0, 1), (0, 5), (3, 4), (40, 30)])
+@pytest.mark.parametrize("sort", SORTS)
+def test_top_k_matches_a_full_sort(collections, sort, skip, limit):
+    indexed, _ = collections
+    # A bounded sort selects with a heap; it has to agree with sorting every match
+    full = [doc["id"] for doc in run(indexed, {}, sort)]
+    assert [doc["id"] for doc in run(indexed, {}, sort, limit, skip)] == full[skip:skip + limit]
+
+
+def test_sort_order_of_mixed_values():
+    collection = server.SimpleCollection()
+    values = ["b", 2, None, "a", 10.5, -1, "B"]
+
+    async def fill():
+        for i, value in enumerate(values):
+            await collection.insert_one({"id": i, "value": value})
+        await collection.insert_one({"id": len(values)})
+
+    asyncio.run(fill())
+    ordered = [doc.get("value") for doc in run(collection, {}, [("value", 1), ("id", 1)])]
+    # Missing and None first, then numbers, then strings
+    assert ordered == [None, None, -1, 2, 10.5, "B", "a", "b"]
+    assert [doc.get("value") for doc in run(collection, {}, [("value", -1)], limit=3)] == ["b", "a", "B"]
+
+
+@pytest.mark.parametrize("engine", ["memory", "sqlite"])
+def test_negative_limit_counts_as_its_absolute_value(tmp_path, engine):
+    database = server.InMemoryDB() if engine == "memory" else server.SQLiteDB(tmp_path / "limit.db")
+
+    async def run_queries():
+        await database.vertraege.insert_many(make_docs())
+        cursor = database.vertraege.find({"gesellschaft": "HUK"}).sort("id", 1)
+        negative = await cursor.skip(2).limit(-3).to_list(None)
+        positive = await database.vertraege.find({"gesellschaft": "HUK"}).sort("id", 1).skip(2).limit(3).to_list(None)
+        await database.close()
+        return negative, positive
+
+    negative, positive = asyncio.run(run_queries())
+    assert [doc["id"] for doc in negative] == [doc["id"] for doc in positive] == ["v007", "v010", "v013"]
+
+
+def test_cached_filter_keeps_its_own_values():
+    docs = [{"id": 1, "kunde_id": "k1", "tags": ["a"]}, {"id": 2, "kunde_id": "k2", "tags": ["b"]}]
+    choices, tags = ["k1"], ["a"]
+    in_filter = server.compile_filter({"kunde_id": {"$in": choices}})
+    eq_filter = server.compile_filter({"tags": tags})
+    # Changing the caller's lists afterwards must not change the cached predicates
+    choices.append("k2")
+    tags[0] = "b"
+    assert [doc["id"] for doc in docs if in_filter(doc)] == [1]
+    assert [doc["id"] for doc in docs if eq_filter(doc)] == [1]
+    assert server.compile_filter({"kunde_id": {"$in": ["k1", "k2"]}}) is not in_filter
@@ -0,0 +1,78 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+KUNDEN = {
+    "mueller": {"name": "Müller", "vorname": "Hans-Peter", "ort": "München", "strasse": "Hauptstraße 5",
+                "plz": "80331", "kunde_id": "12-345-678"},
+    "mueller2": {"name": "Mueller", "vorname": "Eva", "ort": "Köln", "kunde_id": "98-765-432"},
+    "schmidt": {"name": "Schmidt", "vorname": "Hans", "ort": "Berlin", "kunde_id": "55-555-555"},
+    "weiss": {"name": "Weiß", "vorname": "Zoë", "ort": "Düsseldorf"},
+    "hansen": {"name": "Hansen", "vorname": "Ute", "ort": "Kiel"},
+}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def kunden(request, tmp_path):
+    database = server.InMemoryDB() if request.param == "memory" else server.SQLiteDB(tmp_path / "search.db")
+    collection = database.kunden
+    asyncio.run(collection.insert_many([{"id": key, **fields} for key, fields in KUNDEN.items()]))
+    yield collection
+    asyncio.run(database.close())
+
+
+def search(collection, query, limit=20):
+    return [doc["id"] for doc in asyncio.run(collection.text_search(query, limit=limit))]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("müller", {"mueller", "mueller2"}),
+    ("MUELL", {"mueller", "mueller2"}),
+    ("Mül", {"mueller", "mueller2"}),
+    ("hans mü", {"mueller"}),
+    ("hans", {"mueller", "schmidt", "hansen"}),
+    ("hanspeter", {"mueller"}),
+    ("peter", {"mueller"}),
+    ("hauptstrasse 5", {"mueller"}),
+    ("803", {"mueller"}),
+    ("12345678", {"mueller"}),
+    ("12-345", {"mueller"}),
+    ("weiss zoe", {"weiss"}),
+    ("dusseldorf", set()),
+    ("duesseldorf", {"weiss"}),
+    ("", set()),
+    ("xyz", set()),
+])
+def test_quicksearch_matching(kunden, query, expected):
+    assert set(search(kunden, query)) == expected
+
+
+def test_exact_words_rank_before_prefixes(kunden):
+    if isinstance(kunden, server.SQLiteCollection):
+        pytest.skip("SQLite ranks by FTS5's bm25")
+    assert search(kunden, "hans")[-1] == "hansen"
+    assert set(search(kunden, "hans", limit=2)) == {"mueller", "schmidt"}
+
+
+def test_index_follows_updates_and_deletes(kunden):
+    asyncio.run(kunden.update_one({"id": "schmidt"}, {"$set": {"name": "Schulz"}}))
+    asyncio.run(kunden.delete_one({"id": "mueller2"}))
+    assert search(kunden, "schmidt") == []
+    assert search(kunden, "schulz") == ["schmidt"]
+    assert search(kunden, "mueller") == ["mueller"]
+
+
+def test_quicksearch_endpoint():
+    client = TestClient(server.app)
+    tag = uuid.uuid4().hex[:8]
+    kunde = client.post("/api/kunden", json={"name": f"Jäger {tag}", "vorname": "Jörg"}).json()
+
+    found = client.get("/api/kunden/quicksearch", params={"q": f"jaeger {tag}"}).json()
+    assert [k["id"] for k in found] == [kunde["id"]]
+    found = client.get("/api/kunden/quicksearch", params={"q": f"{tag} jö"}).json()
+    assert [k["id"] for k in found] == [kunde["id"]]
+    assert client.get("/api/kunden/quicksearch", params={"q": "j", "limit": 1}).status_code == 200
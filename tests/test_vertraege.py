@@ -0,0 +1,67 @@
+import asyncio
+import uuid
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+
+import server
+
+client = TestClient(server.app)
+
+
+def create_vertrag(**fields):
+    response = client.post("/api/vertraege", json={"kunde_id": f"k-{uuid.uuid4().hex[:8]}", **fields})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_expiring_contracts_soonest_first():
+    today = date.today()
+    later = create_vertrag(ablauf=(today + timedelta(days=30)).isoformat())
+    sooner = create_vertrag(ablauf=(today + timedelta(days=3)).isoformat())
+    outside = create_vertrag(ablauf=(today + timedelta(days=200)).isoformat())
+    past = create_vertrag(ablauf=(today - timedelta(days=1)).isoformat())
+
+    response = client.get("/api/vertraege/expiring", params={"days": 60})
+    assert response.status_code == 200
+    ids = [vertrag["id"] for vertrag in response.json()]
+    assert ids.index(sooner["id"]) < ids.index(later["id"])
+    assert outside["id"] not in ids and past["id"] not in ids
+    ablauf = [vertrag["ablauf"] for vertrag in response.json()]
+    assert ablauf == sorted(ablauf)
+    assert client.get("/api/vertraege/expiring", params={"days": -1}).status_code == 422
+
+
+def test_reading_contracts_keeps_the_ablauf_index_intact():
+    today = date.today()
+    vertrag = create_vertrag(ablauf=(today + timedelta(days=10)).isoformat())
+    # Responses parse dates; the stored document must keep the string the index holds
+    assert client.get(f"/api/vertraege/{vertrag['id']}").status_code == 200
+    assert client.get("/api/vertraege", params={"limit": 0}).status_code == 200
+    moved = (today + timedelta(days=500)).isoformat()
+    assert client.put(f"/api/vertraege/{vertrag['id']}", json={"ablauf": moved}).status_code == 200
+
+    expiring = {v["id"] for v in client.get("/api/vertraege/expiring", params={"days": 60}).json()}
+    assert vertrag["id"] not in expiring
+    expiring = {v["id"] for v in client.get("/api/vertraege/expiring", params={"days": 600}).json()}
+    assert vertrag["id"] in expiring
+
+
+def test_parsed_documents_share_nothing_with_the_store():
+    collection = server.SimpleCollection()
+    asyncio.run(collection.insert_one({
+        "id": "k1",
+        "persoenliche_daten": {"geburtsdatum": "1970-01-01", "kinder": [{"name": "Anna"}]},
+        "tags": ["a", {"b": 1}],
+    }))
+    parsed = server.parse_from_mongo(asyncio.run(collection.find_one({"id": "k1"})))
+    assert parsed["persoenliche_daten"]["geburtsdatum"] == date(1970, 1, 1)
+    parsed["persoenliche_daten"]["kinder"][0]["name"] = "Geändert"
+    parsed["tags"].append("c")
+    parsed["tags"][1]["b"] = 2
+
+    assert asyncio.run(collection.find_one({"id": "k1"})) == {
+        "id": "k1",
+        "persoenliche_daten": {"geburtsdatum": "1970-01-01", "kinder": [{"name": "Anna"}]},
+        "tags": ["a", {"b": 1}],
+    }
@@ -0,0 +1,177 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+VUS = [
+    {"id": "allianz", "name": "Allianz Versicherungs-AG", "kurzbezeichnung": "Allianz"},
+    {"id": "allianz-leben", "name": "Allianz Lebensversicherungs-AG", "kurzbezeichnung": "Allianz Leben"},
+    {"id": "huk", "name": "HUK-COBURG Haftpflicht-Unterstützungs-Kasse VVaG", "kurzbezeichnung": "HUK"},
+    {"id": "rv", "name": "R+V Allgemeine Versicherung AG", "kurzbezeichnung": "R+V"},
+    {"id": "alte-leipziger", "name": "Alte Leipziger Lebensversicherung a.G.", "kurzbezeichnung": "ALH"},
+    {"id": "ohne-kurz", "name": "Dialog Versicherung AG", "kurzbezeichnung": None},
+    {"id": "huk-zwei", "name": "HUK24 AG", "kurzbezeichnung": "HUK"},
+]
+
+
+@pytest.fixture
+def matcher():
+    collection = server.SimpleCollection()
+    asyncio.run(collection.insert_many([dict(vu) for vu in VUS]))
+    return server.VUMatcher(collection)
+
+
+def match(matcher, name):
+    vu, match_type = asyncio.run(matcher.match(name))
+    return (vu["id"] if vu else None), match_type
+
+
+@pytest.mark.parametrize("name, expected", [
+    # Exact name, ignoring case, umlauts, punctuation and the legal form
+    ("allianz versicherungs ag", ("allianz", "exact_name")),
+    ("HUK-Coburg Haftpflicht-Unterstuetzungs-Kasse", ("huk", "exact_name")),
+    ("Alte Leipziger Lebensversicherung", ("alte-leipziger", "exact_name")),
+    # Exact Kurzbezeichnung; ties go to the first VU
+    ("Allianz Leben", ("allianz-leben", "kurzbezeichnung")),
+    ("HUK", ("huk", "kurzbezeichnung")),
+    ("r+v", ("rv", "kurzbezeichnung")),
+    # A VU name contains the input
+    ("Leipziger", ("alte-leipziger", "partial_name")),
+    ("Lebensversicherungs", ("allianz-leben", "partial_name")),
+    # The input contains a VU name or Kurzbezeichnung
+    ("Dialog Versicherung AG Niederlassung Augsburg", ("ohne-kurz", "reverse_partial")),
+    ("Allianz Sachversicherung", ("allianz", "reverse_kurz")),
+    # Regex metacharacters are plain text
+    ("(AG)", (None, None)),
+    ("R+V (Wiesbaden)", ("rv", "reverse_kurz")),
+    ("", (None, None)),
+    ("Unbekannte Versicherung", (None, None)),
+])
+def test_match_precedence(matcher, name, expected):
+    assert match(matcher, name) == expected
+
+
+@pytest.mark.parametrize("name, expected", [
+    # Typos and abbreviations no earlier strategy catches
+    ("Alianz Versicherung", "allianz"),
+    ("Alte Leipzig Lebensvers.", "alte-leipziger"),
+    ("Dialgo Versicherung", "ohne-kurz"),
+])
+def test_fuzzy_match_above_the_threshold(matcher, name, expected):
+    assert match(matcher, name) == (expected, "fuzzy")
+
+
+def test_fuzzy_threshold_is_configurable(matcher):
+    assert match(matcher, "Wuerttembergische Vers.") == (None, None)
+    matcher.fuzzy_threshold = 0.95
+    assert match(matcher, "Alianz Versicherung") == (None, None)
+    # Earlier strategies don't depend on the threshold
+    assert match(matcher, "Allianz Leben") == ("allianz-leben", "kurzbezeichnung")
+
+
+def test_candidates_are_ranked_by_score(matcher):
+    candidates = asyncio.run(matcher.candidates("Alianz Versicherung", 3))
+    assert [vu["id"] for vu, _ in candidates] == ["allianz", "allianz-leben", "ohne-kurz"]
+    scores = [score for _, score in candidates]
+    assert scores == sorted(scores, reverse=True) and 0 < scores[-1] and scores[0] <= 1
+
+    candidates = asyncio.run(matcher.candidates("Alianz Versicherung", 3, threshold=0.5))
+    assert [vu["id"] for vu, _ in candidates] == ["allianz"]
+
+
+def test_match_endpoint_lists_candidates():
+    client = TestClient(server.app)
+    kurz = f"Kandidat{uuid.uuid4().hex[:6]}"
+    vu = client.post("/api/vus", json={"name": f"{kurz} Versicherung AG", "kurzbezeichnung": kurz}).json()
+
+    response = client.post("/api/vus/match-gesellschaft",
+                           params={"gesellschaft": f"{kurz[:-1]}x Versicherung", "top_k": 3})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["match"] is True and body["match_type"] == "fuzzy" and body["vu"]["id"] == vu["id"]
+    assert body["candidates"][0]["vu"]["id"] == vu["id"]
+    assert len(body["candidates"]) <= 3
+
+    body = client.post("/api/vus/match-gesellschaft", params={"gesellschaft": kurz}).json()
+    assert body["match_type"] == "kurzbezeichnung" and "candidates" not in body
+
+
+def test_matcher_follows_vu_writes(matcher):
+    collection = matcher._collection
+    assert match(matcher, "Neue Leben") == (None, None)
+
+    asyncio.run(collection.insert_one({"id": "neue-leben", "name": "Neue Leben Lebensversicherung AG",
+                                       "kurzbezeichnung": "Neue Leben"}))
+    assert match(matcher, "Neue Leben") == ("neue-leben", "kurzbezeichnung")
+
+    asyncio.run(collection.update_one({"id": "neue-leben"}, {"$set": {"kurzbezeichnung": "NL"}}))
+    assert match(matcher, "Neue Leben") == ("neue-leben", "partial_name")
+
+    asyncio.run(collection.delete_one({"id": "neue-leben"}))
+    assert match(matcher, "Neue Leben") == (None, None)
+
+
+def test_contracts_use_the_current_vus():
+    client = TestClient(server.app)
+    kurz = f"Testvers{uuid.uuid4().hex[:6]}"
+    vu = client.post("/api/vus", json={"name": f"{kurz} Versicherung AG", "kurzbezeichnung": kurz}).json()
+
+    def assigned_vu():
+        vertrag = client.post("/api/vertraege", json={"kunde_id": "k-match", "gesellschaft": f"{kurz} Vers."}).json()
+        return vertrag.get("vu_id")
+
+    assert assigned_vu() == vu["id"]
+    response = client.put(f"/api/vus/{vu['id']}", json={"name": "Umbenannt AG", "kurzbezeichnung": "Umb"})
+    assert response.status_code == 200
+    assert assigned_vu() is None
+
+
+def test_resolutions_are_cached(matcher):
+    for _ in range(3):
+        assert match(matcher, "HUK")[0] == "huk"
+        # Spellings with the same normalized key share an entry, misses are cached too
+        assert match(matcher, "Allianz Versicherungs-AG")[0] == "allianz"
+        assert match(matcher, "allianz versicherungs ag")[0] == "allianz"
+        assert match(matcher, "Unbekannte Versicherung") == (None, None)
+    stats = matcher.cache_stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (3, 9, 3)
+    assert stats["hit_rate"] == 0.75
+
+
+def test_cache_is_bounded(matcher):
+    matcher.cache_size = 2
+    for name in ["HUK", "R+V", "HUK", "Allianz Leben", "R+V"]:
+        match(matcher, name)
+    # "R+V" was the least recently used entry when "Allianz Leben" came in
+    assert list(matcher._resolved) == [server.vu_match_key("Allianz Leben"), server.vu_match_key("R+V")]
+    assert matcher.cache_stats()["misses"] == 4
+
+
+def test_cache_is_dropped_on_vu_writes(matcher):
+    collection = matcher._collection
+    assert match(matcher, "Neue Leben") == (None, None)
+    assert match(matcher, "Neue Leben") == (None, None)
+    asyncio.run(collection.insert_one({"id": "neue-leben", "name": "Neue Leben Lebensversicherung AG",
+                                       "kurzbezeichnung": "Neue Leben"}))
+    # The cached miss must not hide the new VU
+    assert match(matcher, "Neue Leben") == ("neue-leben", "kurzbezeichnung")
+    stats = matcher.cache_stats()
+    assert (stats["entries"], stats["invalidations"]) == (1, 1)
+
+    # Writes to other collections leave the cache alone
+    other = server.SimpleCollection()
+    asyncio.run(other.insert_one({"id": "k1"}))
+    match(matcher, "Neue Leben")
+    assert matcher.cache_stats()["invalidations"] == 1
+
+
+def test_data_statistics_report_the_cache():
+    client = TestClient(server.app)
+    client.post("/api/vus/match-gesellschaft", params={"gesellschaft": "Cache Test Versicherung"})
+    client.post("/api/vus/match-gesellschaft", params={"gesellschaft": "Cache Test Versicherung"})
+    stats = client.get("/api/admin/data-statistics").json()["caches"]["vu_resolution"]
+    assert stats["hits"] >= 1 and stats["entries"] >= 1
+    assert stats["vus_version"] == server.db.vus.version